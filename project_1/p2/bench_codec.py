@@ -0,0 +1,53 @@
+import argparse
+import random
+import struct
+import timeit
+from collections.abc import Callable
+from functools import partial
+
+from p2 import codec
+
+# Micro-benchmark of the frame decoders
+# Run from project_1: python -m p2.bench_codec --readings 10000
+
+
+def make_buffer(readings: int, *, int16: bool) -> bytes:
+    fmt = codec.pair_format(int16=int16)
+    values = [(random.randint(-5000, 12000), random.randint(0, 10000)) for _ in range(readings)]  # noqa: S311
+    return b"".join(struct.pack(fmt, t, h) for t, h in values)
+
+
+def bench(name: str, decode: Callable[..., object], buf: bytes, *, int16: bool, repeat: int) -> float:
+    readings = len(buf) // struct.calcsize(codec.pair_format(int16=int16))
+    number = max(1, 200_000 // readings)
+    best = min(timeit.repeat(partial(decode, buf, int16=int16), number=number, repeat=repeat)) / number
+    print(f"{name:<24} {best * 1e3:9.3f} ms  {readings / best / 1e6:8.2f} M readings/s")  # noqa: T201
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare scalar and bulk frame decoding")
+    parser.add_argument("--readings", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for int16 in (False, True):
+        buf = make_buffer(args.readings, int16=int16)
+        print(f"\n{codec.pair_format(int16=int16)} x {args.readings}")  # noqa: T201
+
+        # all paths must agree before their timings mean anything
+        expected = codec.decode_scalar(buf, int16=int16)
+        for decode in (codec.decode_iter, codec.decode_pairs):
+            t, h = decode(buf, int16=int16)
+            assert list(t) == expected[0], decode.__name__  # noqa: S101
+            assert list(h) == expected[1], decode.__name__  # noqa: S101
+
+        bulk_name = "numpy.frombuffer" if codec.np is not None else "array.frombytes"
+        scalar = bench("scalar (struct.unpack)", codec.decode_scalar, buf, int16=int16, repeat=args.repeat)
+        bench("struct.iter_unpack", codec.decode_iter, buf, int16=int16, repeat=args.repeat)
+        bulk = bench(bulk_name, codec.decode_pairs, buf, int16=int16, repeat=args.repeat)
+        print(f"{'speedup':<24} {scalar / bulk:9.1f} x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
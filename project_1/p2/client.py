@@ -1,26 +1,107 @@
-import base64
+import argparse
 import random
 import socket
-import struct
 import time
+import uuid
 
-BASE64_SIZE = 12
+from p2.protocol import OK, encode_frame, encode_legacy
 
-while True:
+# Run from project_1: python -m p2.client
+
+HOST = "127.0.0.1"  # The remote host
+PORT = 50007  # The same port as used by the server
+REPLY_SIZE = 64
+
+# Negotiation
+# - "auto" sends version 1 frames and falls back to legacy base64 frames for the
+#   rest of the session if the server doesn't answer the first one with Ok
+#   (an old server reads the first 12 bytes as base64 and replies with an error)
+# - version 1 frames reuse one connection, legacy frames open one per reading
+#   since the old server closes the connection after every frame
+
+
+def read_sensor() -> tuple[int, int]:
     # generate random temperature and humidity
     rand_tem = random.randint(-5000, 12000)  # noqa: S311
     rand_hum = random.randint(0, 10000)  # noqa: S311
-    print(f"\n** Sending **\nTemperature: {rand_tem / 100} C\nHumidity: {rand_hum / 100} %")
-    packed = struct.pack("<ii", rand_tem, rand_hum)
-    encoded = base64.b64encode(packed)
-
-    HOST = "127.0.0.1"  # The remote host
-    PORT = 50007  # The same port as used by the server
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((HOST, PORT))
-        s.sendall(encoded)
-        data = s.recv(BASE64_SIZE)
-
-    if repr(data) != "b'Ok'":
-        print("Received", repr(data))
-    time.sleep(10)
+    print(f"\n** Sending **\nTemperature: {rand_tem / 100} C\nHumidity: {rand_hum / 100} %")  # noqa: T201
+    return rand_tem, rand_hum
+
+
+def send_legacy(host: str, port: int, readings: list[tuple[int, int]]) -> None:
+    for tem, hum in readings:
+        with socket.create_connection((host, port)) as s:
+            s.sendall(encode_legacy(tem, hum))
+            data = s.recv(REPLY_SIZE)
+        if data != OK:
+            print("Received", repr(data))  # noqa: T201
+
+
+class Client:
+    def __init__(self, host: str, port: int, protocol: str, sensor_id: uuid.UUID | None) -> None:
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.sensor_id = sensor_id
+        self.conn: socket.socket | None = None
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def send(self, readings: list[tuple[int, int]], timestamps: list[int]) -> None:
+        if self.protocol == "legacy":
+            send_legacy(self.host, self.port, readings)
+            return
+
+        if self.conn is None:
+            self.conn = socket.create_connection((self.host, self.port))
+
+        try:
+            self.conn.sendall(encode_frame(readings, sensor_id=self.sensor_id, timestamps=timestamps))
+            data = self.conn.recv(REPLY_SIZE)
+        except OSError:
+            self.close()
+            raise
+
+        if data == OK:
+            # the server speaks version 1, stop probing
+            self.protocol = "v1"
+            return
+
+        print("Received", repr(data))  # noqa: T201
+        self.close()
+        if self.protocol == "auto":
+            print("Server doesn't support version 1 frames, falling back to legacy")  # noqa: T201
+            self.protocol = "legacy"
+            send_legacy(self.host, self.port, readings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send temperature/humidity readings over TCP")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--protocol", choices=("auto", "v1", "legacy"), default="auto")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between readings")
+    parser.add_argument("--batch", type=int, default=1, help="readings per version 1 frame")
+    parser.add_argument("--sensor-id", type=uuid.UUID, default=None)
+    args = parser.parse_args()
+
+    client = Client(args.host, args.port, args.protocol, args.sensor_id)
+    readings: list[tuple[int, int]] = []
+    timestamps: list[int] = []
+    try:
+        while True:
+            readings.append(read_sensor())
+            timestamps.append(int(time.time()))
+            if len(readings) >= args.batch:
+                client.send(readings, timestamps)
+                readings, timestamps = [], []
+            time.sleep(args.interval)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
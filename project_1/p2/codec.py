@@ -0,0 +1,69 @@
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the array module fallback is used instead
+    np = None
+
+BASE = 10
+EXPONENT = -2
+SCALE = BASE**EXPONENT
+
+# Decoding packed (temperature, humidity) pairs
+# The wire carries scaled integers: value = significand * 10^-2
+# - decode_scalar is the original path: one struct.unpack and one float per call
+# - decode_pairs handles a whole buffer at once
+#   numpy:    frombuffer is a zero copy view, scaling is one vectorized multiply
+#   fallback: array.frombytes copies the buffer in C, only the scaling is per item
+
+
+def s_to_f(significand: int) -> float:
+    return round(significand * SCALE, 2)
+
+
+def pair_format(*, int16: bool = False) -> str:
+    return "<hh" if int16 else "<ii"
+
+
+def decode_scalar(buf: bytes | memoryview, *, int16: bool = False) -> tuple[list[float], list[float]]:
+    fmt = pair_format(int16=int16)
+    size = struct.calcsize(fmt)
+    temperatures: list[float] = []
+    humidities: list[float] = []
+    for offset in range(0, len(buf), size):
+        t, h = struct.unpack_from(fmt, buf, offset)
+        temperatures.append(s_to_f(t))
+        humidities.append(s_to_f(h))
+    return temperatures, humidities
+
+
+def decode_iter(buf: bytes | memoryview, *, int16: bool = False) -> tuple[list[float], list[float]]:
+    # struct.iter_unpack walks the buffer in C, still one tuple per pair
+    values = struct.iter_unpack(pair_format(int16=int16), buf)
+    temperatures, humidities = zip(*values, strict=True) if len(buf) else ((), ())
+    return [s_to_f(v) for v in temperatures], [s_to_f(v) for v in humidities]
+
+
+def decode_pairs(buf: bytes | memoryview, *, int16: bool = False) -> tuple[Sequence[float], Sequence[float]]:
+    """
+    Decode a buffer of N little-endian (temperature, humidity) pairs.
+    Returns two numpy float64 arrays when numpy is installed, otherwise two array('d').
+    """
+    size = struct.calcsize(pair_format(int16=int16))
+    if len(buf) % size:
+        msg = f"Buffer length {len(buf)} is not a multiple of {size}"
+        raise ValueError(msg)
+
+    if np is not None:
+        pairs = np.frombuffer(buf, dtype="<i2" if int16 else "<i4").reshape(-1, 2)
+        scaled = np.round(pairs * SCALE, 2)
+        return scaled[:, 0], scaled[:, 1]
+
+    values = array("h" if int16 else "i")
+    values.frombytes(buf)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return array("d", map(s_to_f, values[0::2])), array("d", map(s_to_f, values[1::2]))
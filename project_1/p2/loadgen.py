@@ -0,0 +1,384 @@
+import argparse
+import asyncio
+import csv
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from p2.protocol import HEADER, MAGIC, OK, encode_frame, encode_legacy
+
+# Load generator for the ingest pipeline
+# Run from project_1: python -m p2.loadgen --target http --sensors 200 --rate 1000 --duration 60
+#
+# - open loop: a scheduler issues sends at the requested rate whether or not
+#   earlier ones have finished, N virtual sensors (one connection each) take
+#   them from a queue. Latency is measured from when a send was due, so a
+#   slow server shows up as latency instead of silently lowering the rate
+# - rate patterns: steady, burst (rate x burst-factor for burst-length seconds
+#   every burst-every seconds) and ramp (0 up to rate over the run)
+# - payload mix, weighted:
+#     http: single (POST /api/data/), batch (POST /api/data/batch/), invalid
+#     tcp:  v1 (one reading per frame), batch (batch-size readings per frame), legacy, invalid
+# - sensor ids from a fleet export (manage.py export_fleet) so the ingest
+#   identity check accepts them, otherwise a random id pair per virtual sensor
+#   (run the server with INGEST_VALIDATE_IDENTITY=False), so per-sensor rate
+#   limits apply to each virtual sensor and not to all of them together
+# - prints a JSON report (latency percentiles, throughput, errors per payload kind)
+#   to compare runs
+
+REPLY_SIZE = 64
+TIMEOUT = 10  # seconds before a send counts as an error
+HTTP_KINDS = ("single", "batch", "invalid")
+TCP_KINDS = ("v1", "batch", "legacy", "invalid")
+
+
+@dataclass(frozen=True)
+class Sensor:
+    sensor_id: str
+    location_id: str
+
+
+@dataclass
+class Job:
+    kind: str
+    due: float  # monotonic time the send was scheduled for
+
+
+@dataclass
+class KindStats:
+    sent: int = 0
+    readings: int = 0
+    latencies: list[float] = field(default_factory=list)
+    outcomes: Counter = field(default_factory=Counter)
+
+    @property
+    def errors(self) -> int:
+        return sum(n for outcome, n in self.outcomes.items() if outcome not in ("ok", "rejected"))
+
+
+def percentile(ordered: list[float], p: float) -> float | None:
+    # nearest rank on sorted values
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float | None]:
+    ordered = sorted(latencies)
+    summary: dict[str, float | None] = {f"p{p}": percentile(ordered, p) for p in (50, 95, 99)}
+    summary["max"] = ordered[-1] if ordered else None
+    summary["mean"] = sum(ordered) / len(ordered) if ordered else None
+    return {k: None if v is None else round(v * 1000, 3) for k, v in summary.items()}
+
+
+def parse_mix(text: str, kinds: tuple[str, ...]) -> dict[str, float]:
+    """'single=0.8,batch=0.2' -> weights, kinds not listed get no traffic."""
+    mix: dict[str, float] = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in kinds:
+            msg = f"Unknown payload kind '{kind}', choose from {', '.join(kinds)}"
+            raise argparse.ArgumentTypeError(msg)
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def load_fleet(path: str) -> list[Sensor]:
+    with Path(path).open(newline="", encoding="utf-8") as f:
+        return [Sensor(r["sensor_id"], r["location_id"]) for r in csv.DictReader(f) if r.get("sensor_id")]
+
+
+def rate_at(elapsed: float, args: argparse.Namespace) -> float:
+    if args.pattern == "ramp":
+        return max(args.rate * elapsed / args.duration, 1.0)
+    if args.pattern == "burst" and elapsed % args.burst_every < args.burst_length:
+        return args.rate * args.burst_factor
+    return args.rate
+
+
+def reading(sensor: Sensor) -> dict:
+    return {
+        "time": datetime.now(UTC).isoformat(),
+        "sensor_id": sensor.sensor_id,
+        "location_id": sensor.location_id,
+        "temperature": round(random.uniform(-20.0, 40.0), 2),  # noqa: S311
+    }
+
+
+def scaled_reading() -> tuple[int, int]:
+    return random.randint(-5000, 12000), random.randint(0, 10000)  # noqa: S311
+
+
+class HttpTarget:
+    """Keep-alive HTTP/1.1 client on asyncio streams, one per virtual sensor."""
+
+    def __init__(self, url: str, batch_size: int) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self.path = parts.path or "/api/data/"
+        self.batch_path = self.path.rstrip("/") + "/batch/"
+        self.batch_size = batch_size
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def _request(self, path: str, body: bytes) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        )
+        self.writer.write(head.encode() + body)
+        await self.writer.drain()
+        status, keep_alive = await self._read_response()
+        if not keep_alive:
+            await self.close()
+        return status
+
+    async def _read_response(self) -> tuple[int, bool]:
+        assert self.reader is not None  # noqa: S101
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            while size := int((await self.reader.readline()).split(b";")[0], 16):
+                await self.reader.readexactly(size + 2)
+            await self.reader.readline()
+        else:
+            # no length, the body ends with the connection
+            await self.reader.read()
+            return status, False
+        return status, headers.get("connection") != "close"
+
+    async def send(self, kind: str, sensor: Sensor) -> tuple[str, int]:
+        if kind == "single":
+            status = await self._request(self.path, json.dumps(reading(sensor)).encode())
+            readings = 1
+        elif kind == "batch":
+            items = [reading(sensor) for _ in range(self.batch_size)]
+            status = await self._request(self.batch_path, json.dumps(items).encode())
+            readings = self.batch_size
+        else:
+            status = await self._request(self.path, b'{"sensor_id": "not a reading"}')
+            readings = 0
+        if status < 300:  # noqa: PLR2004
+            return "ok", readings
+        # 4xx for an invalid payload is the server doing its job
+        return ("rejected" if kind == "invalid" and status < 500 else f"http_{status}"), 0  # noqa: PLR2004
+
+
+class TcpTarget:
+    """Persistent connection to the p2 server, legacy frames on a fresh connection each."""
+
+    def __init__(self, host: str, port: int, batch_size: int) -> None:
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def _exchange(self, frame: bytes, *, persistent: bool = True) -> bytes:
+        if not persistent:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                writer.write(frame)
+                await writer.drain()
+                return await reader.read(REPLY_SIZE)
+            finally:
+                writer.close()
+
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        assert self.reader is not None  # noqa: S101
+        self.writer.write(frame)
+        await self.writer.drain()
+        reply = await self.reader.read(REPLY_SIZE)
+        if reply != OK:
+            # the server closes the connection after an error
+            await self.close()
+        return reply
+
+    async def send(self, kind: str, sensor: Sensor) -> tuple[str, int]:
+        sensor_id = uuid.UUID(sensor.sensor_id)
+        now = int(time.time())
+        if kind == "legacy":
+            reply = await self._exchange(encode_legacy(*scaled_reading()), persistent=False)
+            readings = 1
+        elif kind == "invalid":
+            # a version the server doesn't support, answered with an error reply
+            reply = await self._exchange(HEADER.pack(MAGIC, 0xFE, 0, 0, 0), persistent=False)
+            return ("rejected" if reply and reply != OK else "unexpected_ok"), 0
+        else:
+            count = self.batch_size if kind == "batch" else 1
+            values = [scaled_reading() for _ in range(count)]
+            reply = await self._exchange(encode_frame(values, sensor_id=sensor_id, timestamps=[now] * count))
+            readings = count
+        if reply == OK:
+            return "ok", readings
+        return ("closed" if not reply else "reply_error"), 0
+
+
+async def schedule(queue: asyncio.Queue, args: argparse.Namespace, mix: dict[str, float], start: float) -> int:
+    """Put one job on the queue whenever one is due, returns the number of jobs issued."""
+    kinds, weights = list(mix), list(mix.values())
+    issued = 0
+    due = start
+    while (elapsed := due - start) < args.duration:
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        queue.put_nowait(Job(random.choices(kinds, weights)[0], due))  # noqa: S311
+        issued += 1
+        due += 1 / rate_at(elapsed, args)
+    return issued
+
+
+async def virtual_sensor(
+    target: HttpTarget | TcpTarget, sensor: Sensor, queue: asyncio.Queue, stats: dict[str, KindStats]
+) -> None:
+    try:
+        while True:
+            job = await queue.get()
+            kind = stats[job.kind]
+            kind.sent += 1
+            try:
+                async with asyncio.timeout(TIMEOUT):
+                    outcome, readings = await target.send(job.kind, sensor)
+            except TimeoutError:
+                outcome, readings = "timeout", 0
+                await target.close()
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                outcome, readings = type(e).__name__, 0
+                await target.close()
+            kind.outcomes[outcome] += 1
+            kind.readings += readings
+            kind.latencies.append(time.monotonic() - job.due)
+            queue.task_done()
+    finally:
+        await target.close()
+
+
+def report(args: argparse.Namespace, stats: dict[str, KindStats], elapsed: float, issued: int) -> dict:
+    all_latencies = [latency for s in stats.values() for latency in s.latencies]
+    sent = sum(s.sent for s in stats.values())
+    errors = sum(s.errors for s in stats.values())
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("fleet", "output") and not isinstance(v, dict)},
+        "mix": args.mix,
+        "elapsed_s": round(elapsed, 3),
+        "issued": issued,
+        "sent": sent,
+        "readings": sum(s.readings for s in stats.values()),
+        "throughput": {
+            "requests_per_s": round(sent / elapsed, 1),
+            "readings_per_s": round(sum(s.readings for s in stats.values()) / elapsed, 1),
+        },
+        "errors": {"count": errors, "rate": round(errors / sent, 5) if sent else 0.0},
+        "latency_ms": latency_summary(all_latencies),
+        "by_kind": {
+            name: {
+                "sent": s.sent,
+                "readings": s.readings,
+                "outcomes": dict(s.outcomes),
+                "latency_ms": latency_summary(s.latencies),
+            }
+            for name, s in stats.items()
+            if s.sent
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    fleet = load_fleet(args.fleet) if args.fleet else []
+    if not fleet:
+        fleet = [Sensor(str(uuid.uuid4()), str(uuid.uuid4())) for _ in range(args.sensors)]
+
+    queue: asyncio.Queue[Job] = asyncio.Queue()
+    stats = {kind: KindStats() for kind in args.mix}
+    sensors = []
+    for i in range(args.sensors):
+        target = (
+            HttpTarget(args.url, args.batch_size)
+            if args.target == "http"
+            else TcpTarget(args.host, args.port, args.batch_size)
+        )
+        sensors.append(asyncio.create_task(virtual_sensor(target, fleet[i % len(fleet)], queue, stats)))
+
+    start = time.monotonic()
+    issued = await schedule(queue, args, args.mix, start)
+    # let the sends still queued or in flight finish, but not forever
+    try:
+        async with asyncio.timeout(TIMEOUT):
+            await queue.join()
+    except TimeoutError:
+        pass
+    elapsed = time.monotonic() - start
+    for task in sensors:
+        task.cancel()
+    await asyncio.gather(*sensors, return_exceptions=True)
+    return report(args, stats, elapsed, issued)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate many sensors against the HTTP API or the TCP server")
+    parser.add_argument("--target", choices=("http", "tcp"), default="http")
+    parser.add_argument("--url", default="http://localhost:8000/api/data/", help="http target")
+    parser.add_argument("--host", default="127.0.0.1", help="tcp target")
+    parser.add_argument("--port", type=int, default=50007, help="tcp target")
+    parser.add_argument("--sensors", type=int, default=100, help="virtual sensors, one connection each")
+    parser.add_argument("--rate", type=float, default=100, help="sends per second (requests or frames)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--pattern", choices=("steady", "burst", "ramp"), default="steady")
+    parser.add_argument("--burst-factor", type=float, default=5)
+    parser.add_argument("--burst-every", type=float, default=10, help="seconds between bursts")
+    parser.add_argument("--burst-length", type=float, default=1, help="seconds")
+    parser.add_argument("--mix", default=None, help="payload kinds and weights, e.g. single=0.9,batch=0.1")
+    parser.add_argument("--batch-size", type=int, default=50, help="readings per batch payload")
+    parser.add_argument("--fleet", help="CSV from manage.py export_fleet, real sensor ids")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    kinds = HTTP_KINDS if args.target == "http" else TCP_KINDS
+    try:
+        args.mix = parse_mix(args.mix or kinds[0], kinds)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    result = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        Path(args.output).write_text(result + "\n", encoding="utf-8")
+    else:
+        sys.stdout.write(result + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import base64
+import struct
+import uuid
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from p2.codec import decode_pairs, s_to_f
+
+# Legacy frame
+# 2 little-endian int32 (temperature, humidity) encoded as base64
+# -> always 12 bytes on the wire, one reading per frame
+PACKET_SIZE = 8
+BASE64_SIZE = 12
+
+# Version 1 frame
+# Fixed 10 byte header followed by a raw (not base64) body
+#
+#   magic    2 bytes  b"\xffH" - 0xff is never part of base64 text, so the first
+#                     byte tells a v1 frame apart from a legacy frame
+#   version  uint8
+#   flags    uint8    see FLAG_*
+#   count    uint16   number of readings in the body
+#   length   uint32   body length in bytes
+#
+# Body (columnar so each part is one contiguous array)
+#   sensor id   16 bytes UUID                  if FLAG_SENSOR_ID
+#   timestamps  count * uint32 unix seconds    if FLAG_TIMESTAMP
+#   values      count * (temperature, humidity) as int32 pairs, int16 if FLAG_INT16
+#
+# Values keep the legacy scaling: significand * 10^-2
+MAGIC = b"\xffH"
+VERSION = 1
+SUPPORTED_VERSIONS = (1,)
+HEADER = struct.Struct("<2sBBHI")
+
+FLAG_INT16 = 0x01
+FLAG_SENSOR_ID = 0x02
+FLAG_TIMESTAMP = 0x04
+
+INT16_MIN, INT16_MAX = -32768, 32767
+MAX_READINGS = 0xFFFF  # count is an uint16
+
+OK = b"Ok"
+UNSUPPORTED_VERSION = b"Unsupported version"
+
+
+class FrameError(ValueError):
+    """Raised when a frame can't be decoded, carries the reply sent back to the client."""
+
+    def __init__(self, reply: bytes) -> None:
+        super().__init__(reply.decode())
+        self.reply = reply
+
+
+@dataclass(frozen=True)
+class Header:
+    version: int
+    flags: int
+    count: int
+    length: int
+
+
+@dataclass
+class Frame:
+    temperatures: Sequence[float]
+    humidities: Sequence[float]
+    sensor_id: uuid.UUID | None = None
+    timestamps: list[int] = field(default_factory=list)
+
+
+# Legacy protocol
+
+
+def encode_legacy(temperature: int, humidity: int) -> bytes:
+    return base64.b64encode(struct.pack("<ii", temperature, humidity))
+
+
+def decode_legacy(data: bytes) -> tuple[float, float]:
+    # decode the data from base64
+    try:
+        raw = base64.b64decode(data)
+    except ValueError as e:
+        raise FrameError(f"Error: {e}".encode()) from e
+
+    # check package length
+    if len(raw) != PACKET_SIZE:
+        msg = b"Wrong package length"
+        raise FrameError(msg)
+
+    # unpack 2 little-endian 4-byte signed integer
+    try:
+        v1, v2 = struct.unpack("<ii", raw)
+    except struct.error as e:
+        raise FrameError(f"Invalid struct: {e}".encode()) from e
+
+    return s_to_f(v1), s_to_f(v2)
+
+
+# Version 1 protocol
+
+
+def body_length(flags: int, count: int) -> int:
+    size = 16 if flags & FLAG_SENSOR_ID else 0
+    if flags & FLAG_TIMESTAMP:
+        size += 4 * count
+    return size + count * (4 if flags & FLAG_INT16 else 8)
+
+
+def encode_frame(
+    readings: Sequence[tuple[int, int]],
+    *,
+    sensor_id: uuid.UUID | None = None,
+    timestamps: Sequence[int] | None = None,
+) -> bytes:
+    """Pack scaled (temperature, humidity) integers into a version 1 frame."""
+    count = len(readings)
+    if count > MAX_READINGS:
+        msg = f"At most {MAX_READINGS} readings fit in one frame"
+        raise ValueError(msg)
+    if timestamps is not None and len(timestamps) != count:
+        msg = "Expected one timestamp per reading"
+        raise ValueError(msg)
+
+    # use int16 when every value fits, halving the body size
+    values = [v for reading in readings for v in reading]
+    flags = FLAG_INT16 if all(INT16_MIN <= v <= INT16_MAX for v in values) else 0
+
+    body = b""
+    if sensor_id is not None:
+        flags |= FLAG_SENSOR_ID
+        body += sensor_id.bytes
+    if timestamps is not None:
+        flags |= FLAG_TIMESTAMP
+        body += struct.pack(f"<{count}I", *timestamps)
+    body += struct.pack(f"<{len(values)}{'h' if flags & FLAG_INT16 else 'i'}", *values)
+
+    return HEADER.pack(MAGIC, VERSION, flags, count, len(body)) + body
+
+
+def decode_header(data: bytes) -> Header:
+    magic, version, flags, count, length = HEADER.unpack(data)
+    if magic != MAGIC:
+        msg = b"Bad magic"
+        raise FrameError(msg)
+
+    if version not in SUPPORTED_VERSIONS:
+        raise FrameError(UNSUPPORTED_VERSION)
+    if length != body_length(flags, count):
+        msg = b"Wrong package length"
+        raise FrameError(msg)
+    return Header(version, flags, count, length)
+
+
+def decode_body(header: Header, body: bytes) -> Frame:
+    if len(body) != header.length:
+        msg = b"Wrong package length"
+        raise FrameError(msg)
+
+    view = memoryview(body)
+    offset = 0
+    sensor_id = None
+    timestamps: list[int] = []
+
+    if header.flags & FLAG_SENSOR_ID:
+        sensor_id = uuid.UUID(bytes=bytes(view[:16]))
+        offset = 16
+    if header.flags & FLAG_TIMESTAMP:
+        timestamps = list(struct.unpack_from(f"<{header.count}I", view, offset))
+        offset += 4 * header.count
+
+    # the values block is decoded in one go instead of one reading at a time
+    temperatures, humidities = decode_pairs(view[offset:], int16=bool(header.flags & FLAG_INT16))
+
+    return Frame(
+        temperatures=temperatures,
+        humidities=humidities,
+        sensor_id=sensor_id,
+        timestamps=timestamps,
+    )
@@ -1,14 +1,30 @@
-import base64
+import argparse
+import asyncio
 import socket
-import struct
 import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from p2.protocol import (
+    BASE64_SIZE,
+    HEADER,
+    MAGIC,
+    OK,
+    FrameError,
+    decode_body,
+    decode_header,
+    decode_legacy,
+)
+
+# Run from project_1: python -m p2.server
 
 HOST = "127.0.0.1"  # Symbolic name meaning all available interfaces
 PORT = 50007  # Arbitrary non-privileged port
-PACKET_SIZE = 8
-BASE64_SIZE = 12
-BASE = 10
-EXPONENT = -2
+BACKLOG = 4096  # pending connections the kernel queues before refusing new ones
+MAX_CONNECTIONS = 50_000  # open connections served at once in async mode
+IDLE_TIMEOUT = 60  # seconds a persistent connection may stay silent
+STATS_INTERVAL = 5  # seconds between throughput reports
 
 # Endianness
 # Different architectures interpret data differently
@@ -26,6 +42,7 @@ EXPONENT = -2
 # -> Use int16 (2 bytes)
 # Another optimization would be to send raw bytes instead of ASCII
 # since ASCII inflates data size by 33% in this case (12 bytes for ASCII vs 8 raw bytes)
+# -> both are used by the version 1 frame in protocol.py
 
 # Why aren't we just sending the data in a human readable format?
 # Sending text characters would use more space!
@@ -35,50 +52,196 @@ EXPONENT = -2
 # Sending arbitrary amount of data
 # - establish protocol to send length first then receive data
 #   -> first header with data length always same size, then data
+#   -> this is the version 1 frame in protocol.py, legacy base64 frames are still accepted
 # - using a delimiter; parse chunks of data and split using agreed upon delimiter
 
 
+def show(addr: tuple[str, int], readings: list[tuple[float, float]]) -> None:
+    for t, h in readings:
+        print(f"\n** Received from {addr[0]} **\nTemperature: {t} C\nHumidity: {h} %")  # noqa: T201
+
+
+def recv_exactly(rfile: BinaryIO, size: int) -> bytes:
+    data = rfile.read(size)
+    if len(data) != size:
+        raise EOFError(data)
+    return data
+
+
+# read one legacy or version 1 frame, the first 2 bytes tell them apart
+def recv_frame(rfile: BinaryIO) -> list[tuple[float, float]]:
+    start = recv_exactly(rfile, len(MAGIC))
+    if start != MAGIC:
+        return [decode_legacy(start + recv_exactly(rfile, BASE64_SIZE - len(MAGIC)))]
+
+    header = decode_header(start + recv_exactly(rfile, HEADER.size - len(MAGIC)))
+    frame = decode_body(header, recv_exactly(rfile, header.length))
+    return list(zip(frame.temperatures, frame.humidities, strict=True))
+
+
 def client(conn: socket.socket, addr: tuple[str, int]) -> None:
-    with conn:
-        data = conn.recv(BASE64_SIZE)
-        if not data:
-            conn.sendall(b"No data received")
-            return
+    with conn, conn.makefile("rb") as rfile:
+        first = True
+        while True:
+            try:
+                readings = recv_frame(rfile)
+            except EOFError as e:
+                if first and not e.args[0]:
+                    conn.sendall(b"No data received")
+                elif e.args[0]:
+                    conn.sendall(b"Wrong package length")
+                return
+            except FrameError as e:
+                # framing can't be trusted after a bad frame, so drop the connection
+                conn.sendall(e.reply)
+                return
+
+            first = False
+            show(addr, readings)
+            conn.sendall(OK)
+
+
+def serve_threaded(host: str, port: int) -> None:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # force reuse port
+        s.bind((host, port))
+        s.listen(1)
+
+        # add simple multi-threading
+        while True:
+            conn, addr = s.accept()
+            threading.Thread(target=client, args=(conn, addr), daemon=True).start()
+
+
+# Asyncio mode
+# One thread multiplexes every connection, so the cost per device is a small
+# coroutine instead of a thread with its own stack.
+# - connections stay open and carry any number of frames
+# - backpressure: the next frame is only read after the reply has been flushed
+#   (writer.drain), so a slow client can't make us buffer unbounded replies
+# - a semaphore caps open connections: at the cap we stop accepting, so further
+#   connections wait in the kernel's listen backlog instead of holding an fd here
 
-        # decode the data from base64
+
+@dataclass
+class Stats:
+    connections: int = 0  # accepted since the last report
+    frames: int = 0  # decoded since the last report
+    readings: int = 0  # readings in those frames
+    errors: int = 0  # rejected since the last report
+    open: int = 0  # currently open connections
+
+
+async def read_frame(reader: asyncio.StreamReader) -> list[tuple[float, float]]:
+    start = await reader.readexactly(len(MAGIC))
+    if start != MAGIC:
+        return [decode_legacy(start + await reader.readexactly(BASE64_SIZE - len(MAGIC)))]
+
+    # one read for the header and one for the whole body, however many readings it carries
+    header = decode_header(start + await reader.readexactly(HEADER.size - len(MAGIC)))
+    frame = decode_body(header, await reader.readexactly(header.length))
+    return list(zip(frame.temperatures, frame.humidities, strict=True))
+
+
+async def handle_connection(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    stats: Stats,
+    *,
+    verbose: bool = False,
+) -> None:
+    addr = writer.get_extra_info("peername")
+    stats.connections += 1
+    stats.open += 1
+    try:
+        while True:
+            try:
+                async with asyncio.timeout(IDLE_TIMEOUT):
+                    readings = await read_frame(reader)
+            except asyncio.IncompleteReadError as e:
+                # client closed the connection, reply only if it left half a frame behind
+                if e.partial:
+                    writer.write(b"Wrong package length")
+                break
+            except TimeoutError:
+                break
+            except FrameError as e:
+                # framing can't be trusted after a bad frame, so drop the connection
+                stats.errors += 1
+                writer.write(e.reply)
+                break
+
+            stats.frames += 1
+            stats.readings += len(readings)
+            if verbose:
+                show(addr, readings)
+            writer.write(OK)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        stats.open -= 1
+        writer.close()
+
+
+async def report_stats(stats: Stats, interval: float = STATS_INTERVAL) -> None:
+    last = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        elapsed = now - last
+        print(  # noqa: T201
+            f"conn/s: {stats.connections / elapsed:.1f} | frames/s: {stats.frames / elapsed:.1f}"
+            f" | readings/s: {stats.readings / elapsed:.1f} | errors/s: {stats.errors / elapsed:.1f}"
+            f" | open: {stats.open}"
+        )
+        stats.connections = stats.frames = stats.readings = stats.errors = 0
+        last = now
+
+
+async def serve_async(host: str, port: int, *, verbose: bool = False) -> None:
+    stats = Stats()
+    slots = asyncio.Semaphore(MAX_CONNECTIONS)
+    handlers: set[asyncio.Task] = set()
+
+    async def serve(conn: socket.socket) -> None:
         try:
-            raw = base64.b64decode(data)
-        except ValueError as e:
-            msg = f"Error: {e}".encode()
-            conn.sendall(msg)
-            return
-
-        # check package length
-        if len(raw) != PACKET_SIZE:
-            conn.sendall(b"Wrong package length")
-            return
-
-        # unpack 2 little-endian 4-byte signed integer
+            reader, writer = await asyncio.open_connection(sock=conn)
+            await handle_connection(reader, writer, stats, verbose=verbose)
+        finally:
+            slots.release()
+
+    # our own accept loop instead of asyncio.start_server, which accepts whatever is pending
+    loop = asyncio.get_running_loop()
+    reporter = asyncio.create_task(report_stats(stats))
+    with socket.create_server((host, port), backlog=BACKLOG) as listener:
+        listener.setblocking(False)  # noqa: FBT003
         try:
-            v1, v2 = struct.unpack("<ii", raw)
-        except ValueError as e:
-            msg = f"Invalid struct: {e}".encode()
-            conn.sendall(msg)
-            return
+            while True:
+                await slots.acquire()
+                conn, _ = await loop.sock_accept(listener)
+                handler = asyncio.create_task(serve(conn))
+                handlers.add(handler)
+                handler.add_done_callback(handlers.discard)
+        finally:
+            reporter.cancel()
+            for handler in handlers:
+                handler.cancel()
 
-        t = round(v1 * BASE**EXPONENT, 2)
-        h = round(v2 * BASE**EXPONENT, 2)
 
-        print(f"\n** Received from {addr[0]} **\nTemperature: {t} C\nHumidity: {h} %")  # noqa: T201
-        conn.sendall(b"Ok")
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Receive temperature/humidity frames over TCP")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--mode", choices=("thread", "async"), default="thread")
+    parser.add_argument("--verbose", action="store_true", help="print every frame in async mode")
+    args = parser.parse_args()
 
+    if args.mode == "async":
+        asyncio.run(serve_async(args.host, args.port, verbose=args.verbose))
+    else:
+        serve_threaded(args.host, args.port)
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # force reuse port
-    s.bind((HOST, PORT))
-    s.listen(1)
 
-    # add simple multi-threading
-    while True:
-        conn, addr = s.accept()
-        threading.Thread(target=client, args=(conn, addr), daemon=True).start()
+if __name__ == "__main__":
+    main()
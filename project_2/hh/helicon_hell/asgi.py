@@ -10,7 +10,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.db import connections
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'helicon_hell.settings')
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "helicon_hell.settings")
 
 application = get_asgi_application()
+
+# load the sensor identity cache before the first reading arrives, once the apps are ready,
+# requests are served by other threads, which open their own database connections
+from main.identity import preload_identity_cache  # noqa: E402
+
+preload_identity_cache()
+connections.close_all()
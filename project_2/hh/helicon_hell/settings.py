@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +49,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # compresses API responses (COMPRESS_PATHS), before anything else reads the body
+    "main.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -76,6 +80,33 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "helicon_hell.wsgi.application"
 
+# Database connections, the same for every database below (main.metrics reports on them)
+# - DATABASE_POOL: a psycopg 3 connection pool per process and database (the
+#   requirements ship psycopg[binary,pool]). Borrowing a pooled connection
+#   takes microseconds instead of a new connection per request, also under ASGI
+# - pool size and the seconds a request waits for a free connection before it fails
+# - without a pool connections are kept open for DATABASE_CONN_MAX_AGE seconds
+#   and checked before they are reused
+DATABASE_POOL = os.environ.get("DATABASE_POOL", "False") == "True"
+DATABASE_POOL_MIN_SIZE = int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", "20"))
+DATABASE_POOL_TIMEOUT = float(os.environ.get("DATABASE_POOL_TIMEOUT", "10"))
+DATABASE_CONN_MAX_AGE = int(os.environ.get("DATABASE_CONN_MAX_AGE", "60"))
+
+if DATABASE_POOL:
+    DATABASE_CONNECTION = {
+        "CONN_MAX_AGE": 0,  # the pool decides how long connections live
+        "OPTIONS": {
+            "pool": {
+                "min_size": DATABASE_POOL_MIN_SIZE,
+                "max_size": DATABASE_POOL_MAX_SIZE,
+                "timeout": DATABASE_POOL_TIMEOUT,
+            }
+        },
+    }
+else:
+    DATABASE_CONNECTION = {"CONN_MAX_AGE": DATABASE_CONN_MAX_AGE, "CONN_HEALTH_CHECKS": True}
+
 DATABASES = {
     "default": {
         "ENGINE": f"django.db.backends.{os.getenv('DATABASE_ENGINE')}",
@@ -84,8 +115,49 @@ DATABASES = {
         "PASSWORD": os.getenv("DATABASE_PASSWORD"),
         "HOST": os.getenv("DATABASE_HOST"),
         "PORT": os.getenv("DATABASE_PORT"),
+        **DATABASE_CONNECTION,
+    }
+}
+
+# Timescale shards for readings (see main.sharding)
+# READINGS_SHARD_HOSTS is a comma separated list of host:port, one database alias
+# timescale1..N per entry using the databases created by compose.yaml (<DATABASE_NAME>_TS<N>)
+# READINGS_SHARD_KEY picks the column hashed to choose a shard: location_id or sensor_id
+READINGS_SHARD_HOSTS = [host for host in os.environ.get("READINGS_SHARD_HOSTS", "").split(",") if host]
+READINGS_SHARD_KEY = os.environ.get("READINGS_SHARD_KEY", "location_id")
+READINGS_SHARDS = []
+
+for index, shard_host in enumerate(READINGS_SHARD_HOSTS, start=1):
+    shard_name, _, shard_port = shard_host.partition(":")
+    DATABASES[f"timescale{index}"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": f"{os.getenv('DATABASE_NAME')}_TS{index}",
+        "USER": os.getenv("DATABASE_USERNAME"),
+        "PASSWORD": os.getenv("DATABASE_PASSWORD"),
+        "HOST": shard_name,
+        "PORT": shard_port or "5432",
+        **DATABASE_CONNECTION,
+    }
+    READINGS_SHARDS.append(f"timescale{index}")
+
+DATABASE_ROUTERS = ["main.routers.ReadingRouter"]
+
+
+# Cache for the fleet list endpoints (main.cache), local memory per process by default
+# point CACHE_BACKEND/CACHE_LOCATION at a shared cache (e.g. redis) when running several processes
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "hh"),
     }
 }
+API_CACHE_TIMEOUT = int(os.environ.get("API_CACHE_TIMEOUT", "300"))  # seconds
+
+# JSON encoder of the API (main.renderers): auto, orjson, msgspec or json
+API_JSON_BACKEND = os.environ.get("API_JSON_BACKEND", "auto")
+
+# zstd/gzip compressed responses for clients accepting them (main.middleware), by path prefix
+COMPRESS_PATHS = ["/api/"]
 
 
 # Password validation
@@ -134,3 +206,134 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Europe/Stockholm"
+
+# Publishing to RabbitMQ (main.publish)
+# - producers, each with its broker connection, shared by the threads of a process
+# - seconds a request waits for a free producer before it is answered with 503
+# - seconds a publish waits for the broker's confirm before it counts as failed
+# - RabbitMQ confirms every message, a publish returns once the broker has it
+CELERY_BROKER_POOL_LIMIT = int(os.environ.get("BROKER_POOL_LIMIT", "20"))
+BROKER_POOL_TIMEOUT = float(os.environ.get("BROKER_POOL_TIMEOUT", "5"))
+BROKER_PUBLISH_TIMEOUT = float(os.environ.get("BROKER_PUBLISH_TIMEOUT", "2"))
+CELERY_BROKER_TRANSPORT_OPTIONS = {"confirm_publish": True}
+
+# Readings travel on their own queue, consumed either by a Celery worker
+# (celery -A helicon_hell worker -Q readings) or in micro-batches by
+# python manage.py consume_readings
+READINGS_QUEUE = "readings"
+CELERY_TASK_ROUTES = {
+    "main.tasks.forward_to_message_queue": {"queue": READINGS_QUEUE},
+    "main.tasks.forward_batch_to_message_queue": {"queue": READINGS_QUEUE},
+}
+
+# Batching consumer (main.consumers.BatchingConsumer)
+# - messages written and acked together
+# - milliseconds to wait for a batch to fill up after its first message
+READINGS_BATCH_SIZE = int(os.environ.get("READINGS_BATCH_SIZE", "500"))
+READINGS_BATCH_LATENCY_MS = int(os.environ.get("READINGS_BATCH_LATENCY_MS", "200"))
+
+# Batch ingest (POST /api/data/batch/)
+# - maximum number of readings accepted in one request
+# - readings per Celery message when forwarding an accepted batch
+INGEST_BATCH_MAX_ITEMS = int(os.environ.get("INGEST_BATCH_MAX_ITEMS", "10000"))
+INGEST_BATCH_CHUNK_SIZE = int(os.environ.get("INGEST_BATCH_CHUNK_SIZE", "500"))
+
+# Keys of recent readings kept to drop retransmits (main.dedup), per process
+# - in the API, before a reading is forwarded
+# - in workers, before readings are written
+INGEST_DEDUP_KEYS = int(os.environ.get("INGEST_DEDUP_KEYS", "100000"))
+READINGS_DEDUP_KEYS = int(os.environ.get("READINGS_DEDUP_KEYS", "200000"))
+
+# Rate limits on ingest (main.ratelimit), a rate of 0 turns a limit off
+# - requests per second and burst per client address (REMOTE_ADDR)
+# - readings per second and burst per sensor, the burst covers a device resending its backlog
+# - local: buckets per process, cache: counters shared through CACHES[RATE_LIMIT_CACHE]
+# - client addresses and sensors a process keeps buckets for
+RATE_LIMIT_CLIENT_RATE = float(os.environ.get("RATE_LIMIT_CLIENT_RATE", "100"))
+RATE_LIMIT_CLIENT_BURST = int(os.environ.get("RATE_LIMIT_CLIENT_BURST", "200"))
+RATE_LIMIT_SENSOR_RATE = float(os.environ.get("RATE_LIMIT_SENSOR_RATE", "10"))
+RATE_LIMIT_SENSOR_BURST = int(os.environ.get("RATE_LIMIT_SENSOR_BURST", "1000"))
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "local")
+RATE_LIMIT_CACHE = os.environ.get("RATE_LIMIT_CACHE", "default")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Admission control on ingest (main.ratelimit), 503 while the broker falls behind, 0 turns a check off
+# - messages waiting in the readings queue
+# - milliseconds successful publishes take on average, waiting for a producer included,
+#   not checked while the spool takes the readings
+# - seconds between samples of both
+ADMISSION_MAX_QUEUE_DEPTH = int(os.environ.get("ADMISSION_MAX_QUEUE_DEPTH", "100000"))
+ADMISSION_MAX_PUBLISH_MS = float(os.environ.get("ADMISSION_MAX_PUBLISH_MS", "500"))
+ADMISSION_SAMPLE_INTERVAL = float(os.environ.get("ADMISSION_SAMPLE_INTERVAL", "1"))
+
+# Spool for readings the broker can't take (main.spool), an empty path disables it
+# - memory-mapped file shared by the processes of a host
+# - size of the file, readings beyond it are refused with 503
+# - seconds between the drainer's attempts to replay the spool
+READINGS_SPOOL_PATH = os.environ.get("READINGS_SPOOL_PATH", str(BASE_DIR / "spool" / "readings.spool"))
+READINGS_SPOOL_MAX_BYTES = int(os.environ.get("READINGS_SPOOL_MAX_BYTES", str(256 * 1024 * 1024)))
+READINGS_SPOOL_DRAIN_INTERVAL = float(os.environ.get("READINGS_SPOOL_DRAIN_INTERVAL", "1"))
+
+# Sensor identity check on ingest (main.identity)
+# - reject readings whose sensor_id/location_id pair doesn't exist
+# - sensors kept in memory per process
+# - seconds an unknown sensor id is remembered before the database is asked again
+# - seconds a known sensor is trusted before the cache is loaded again, changes
+#   made by other processes take up to that long to reach this one
+INGEST_VALIDATE_IDENTITY = os.environ.get("INGEST_VALIDATE_IDENTITY", "True") == "True"
+IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", "100000"))
+IDENTITY_NEGATIVE_TTL = float(os.environ.get("IDENTITY_NEGATIVE_TTL", "60"))
+IDENTITY_TTL = float(os.environ.get("IDENTITY_TTL", "300"))
+
+# Readings storage (main.storage)
+# - readings per COPY/INSERT batch
+READINGS_FLUSH_SIZE = int(os.environ.get("READINGS_FLUSH_SIZE", "1000"))
+
+# Reading back sensor data (GET /api/data/, main.timeseries)
+# - points returned when the client asks for neither a bucket nor a point count
+# - maximum points or buckets in one response
+# - hours covered when the client gives no start
+DATA_DEFAULT_POINTS = int(os.environ.get("DATA_DEFAULT_POINTS", "1000"))
+DATA_MAX_POINTS = int(os.environ.get("DATA_MAX_POINTS", "5000"))
+DATA_DEFAULT_RANGE_HOURS = int(os.environ.get("DATA_DEFAULT_RANGE_HOURS", "24"))
+
+# Rollups (main.rollups), 1 minute / 1 hour / 1 day summaries per sensor
+# - answer GET /api/data/ from the rollups when the bucket allows it
+# - seconds between refreshes where Timescale's continuous aggregates aren't
+#   available (celery -A helicon_hell beat), readings show up in the rollups
+#   with at most this delay
+READINGS_ROLLUPS = os.environ.get("READINGS_ROLLUPS", "True") == "True"
+ROLLUP_REFRESH_INTERVAL = float(os.environ.get("ROLLUP_REFRESH_INTERVAL", "60"))
+
+# Retention of raw readings (main.retention), per location policies are RetentionPolicy rows
+# - days raw readings of locations without a policy are kept, unset keeps them forever
+# - export readings to READINGS_ARCHIVE_DIR before they are deleted
+# - Timescale chunks older than this many days are compressed
+_retention_days = os.environ.get("READINGS_RETENTION_DAYS")
+READINGS_RETENTION_DAYS = int(_retention_days) if _retention_days else None
+READINGS_RETENTION_ARCHIVE = os.environ.get("READINGS_RETENTION_ARCHIVE", "True") == "True"
+READINGS_ARCHIVE_DIR = Path(os.environ.get("READINGS_ARCHIVE_DIR", BASE_DIR / "archive"))
+READINGS_COMPRESS_AFTER_DAYS = int(os.environ.get("READINGS_COMPRESS_AFTER_DAYS", "7"))
+
+CELERY_BEAT_SCHEDULE = {
+    "refresh-reading-rollups": {
+        "task": "main.tasks.refresh_reading_rollups",
+        "schedule": ROLLUP_REFRESH_INTERVAL,
+    },
+    "apply-retention": {
+        "task": "main.tasks.apply_retention_policies",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
+
+# Fleet import (POST /api/fleet/import/, manage.py import_fleet)
+# - maximum rows in one upload
+FLEET_IMPORT_MAX_ROWS = int(os.environ.get("FLEET_IMPORT_MAX_ROWS", "50000"))
+
+# Live updates of the list pages (main.events, GET /main/events)
+# - events buffered per open page before the oldest are dropped
+# - seconds between keep-alive comments on an idle stream
+# - milliseconds a browser waits before reconnecting a dropped stream
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", "1000"))
+EVENTS_HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", "15"))
+EVENTS_RETRY_MS = int(os.environ.get("EVENTS_RETRY_MS", "3000"))
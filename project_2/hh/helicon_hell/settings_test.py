@@ -6,3 +6,18 @@ DATABASES = {
         "NAME": ":memory:",
     }
 }
+
+# readings stay in the default database
+READINGS_SHARDS = []
+
+# no RabbitMQ in tests, producers come from the same pool on kombu's in-memory transport
+CELERY_BROKER_URL = "memory://"
+
+# tests that spool point READINGS_SPOOL_PATH at a temporary directory
+READINGS_SPOOL_PATH = ""
+
+# and tests of rate limits and admission control turn them on
+RATE_LIMIT_CLIENT_RATE = 0
+RATE_LIMIT_SENSOR_RATE = 0
+ADMISSION_MAX_QUEUE_DEPTH = 0
+ADMISSION_MAX_PUBLISH_MS = 0
@@ -2,7 +2,7 @@ from typing import ClassVar
 
 from django.contrib import admin
 
-from .models import Location, Sensor
+from .models import Location, RetentionPolicy, RetentionRun, Sensor
 
 # Create your views here.
 # default register
@@ -20,3 +20,14 @@ class LocationAdmin(admin.ModelAdmin):
 class SensorAdmin(admin.ModelAdmin):
     list_display = ("name", "location", "id")
     list_filter = ("location",)
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ("location", "keep_raw_days", "archive")
+
+
+@admin.register(RetentionRun)
+class RetentionRunAdmin(admin.ModelAdmin):
+    list_display = ("started_at", "dry_run", "rows_deleted", "rows_archived", "chunks_dropped", "bytes_reclaimed")
+    list_filter = ("dry_run",)
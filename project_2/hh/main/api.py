@@ -1,16 +1,101 @@
-from typing import Literal
-
+import json
+import uuid
+from collections.abc import Iterable, Iterator
+from datetime import UTC, datetime, timedelta
+from operator import itemgetter
+from typing import Any, Literal
+
+import pydantic
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
+from django.db.models import QuerySet, Value
+from django.db.models.functions import Lower
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
 from ninja import NinjaAPI, Query, Schema
 from ninja.errors import HttpError
 from pydantic import Field
 
+from .cache import acached_response, cached_response
+from .dedup import dict_key, get_ingest_keys, get_storage_keys
+from .events import publish_readings
+from .fleet import export_rows, import_fleet, parse_csv, parse_json, stream_csv
+from .formats import (
+    JSON,
+    LIST_FORMATS,
+    PACKED,
+    SERIES_FORMATS,
+    NotAcceptableError,
+    encode_series,
+    negotiate,
+    packed_headers,
+)
+from .identity import get_identity_cache, normalize_id
+from .metrics import pool_stats
 from .models import MAX_NAME_LENGTH, MIN_NAME_LENGTH, Location, Sensor
-from .tasks import forward_to_message_queue
-
-api = NinjaAPI(title="HH Project API")
+from .pagination import (
+    MAX_PAGE_SIZE,
+    STREAM_CHUNK_SIZE,
+    InvalidCursorError,
+    after_cursor,
+    akeyset_page,
+    astream_json_array,
+    keyset_page,
+    next_link,
+    stream_json_array,
+)
+from .publish import BrokerBusyError
+from .ratelimit import (
+    OverloadedError,
+    RateLimitedError,
+    aadmit,
+    admit,
+    alimit_sensor,
+    ingest_stats,
+    limit_sensor,
+    limit_sensors,
+    retry_after,
+)
+from .renderers import FastJSONRenderer
+from .spool import aforward, forward, get_spool
+from .tasks import forward_batch_to_message_queue, forward_to_message_queue
+from .timeseries import parse_bucket, query
+
+api = NinjaAPI(title="HH Project API", renderer=FastJSONRenderer())
+
+
+# the client accepts none of the formats an endpoint offers (main.formats)
+@api.exception_handler(NotAcceptableError)
+def not_acceptable(request, exc: NotAcceptableError) -> HttpResponse:
+    return api.create_response(request, {"detail": str(exc)}, status=406)
+
+
+# every producer of the broker pool stayed busy for BROKER_POOL_TIMEOUT seconds,
+# or the broker is down and the spool full
+@api.exception_handler(BrokerBusyError)
+def broker_busy(request, exc: BrokerBusyError) -> HttpResponse:
+    response = api.create_response(request, {"detail": str(exc)}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+# a client or sensor out of tokens (main.ratelimit)
+@api.exception_handler(RateLimitedError)
+def rate_limited(request, exc: RateLimitedError) -> HttpResponse:
+    response = api.create_response(request, {"detail": str(exc)}, status=429)
+    response["Retry-After"] = retry_after(exc.retry_after)
+    return response
+
+
+# ingest shed while the broker falls behind (main.ratelimit)
+@api.exception_handler(OverloadedError)
+def overloaded(request, exc: OverloadedError) -> HttpResponse:
+    response = api.create_response(request, {"detail": str(exc)}, status=503)
+    response["Retry-After"] = retry_after(exc.retry_after)
+    return response
 
 
 class SensorSchema(Schema):
@@ -32,6 +117,51 @@ class SensorData(Schema):
     temperature: float  # Celsius
 
 
+class BatchItemResult(Schema):
+    index: int  # position of the reading in the submitted batch
+    status: Literal["accepted", "rejected", "duplicate"]
+    errors: list[str] = Field(default_factory=list)
+
+
+class BatchIngestResponse(Schema):
+    status: str
+    accepted: int
+    rejected: int
+    duplicates: int = 0  # readings this process forwarded before, not forwarded again
+    results: list[BatchItemResult]
+
+
+class FleetRowResult(Schema):
+    index: int  # position of the row in the import
+    status: Literal["created", "exists", "rejected"]
+    errors: list[str] = Field(default_factory=list)
+
+
+class FleetImportResponse(Schema):
+    locations_created: int
+    sensors_created: int
+    existing: int
+    rejected: int
+    results: list[FleetRowResult]
+
+
+class DataPoint(Schema):
+    time: datetime  # start of the bucket
+    min: float
+    max: float
+    avg: float
+    count: int
+
+
+class DataSeries(Schema):
+    sensor_id: str | None
+    location_id: str | None
+    start: datetime
+    end: datetime
+    bucket: int  # seconds
+    points: list[DataPoint]
+
+
 # Validate with Pydantic rules
 class SensorCreateSchema(Schema):
     name: str = Field(..., min_length=MIN_NAME_LENGTH, max_length=MAX_NAME_LENGTH)
@@ -42,24 +172,90 @@ class LocationCreateSchema(Schema):
     name: str = Field(..., min_length=MIN_NAME_LENGTH, max_length=MAX_NAME_LENGTH)
 
 
-# list all sensors or filter by location and/or name
-@api.get("/sensors/", response=list[SensorSchema])
-def list_sensors(request, location: str | None = Query(None), sensor: str | None = Query(None)) -> list[SensorSchema]:
+def _sensors(location: str | None, sensor: str | None, cursor: str | None) -> QuerySet:
     # Base queryset
-    sensors = Sensor.objects.select_related("location").order_by("name")
+    sensors = Sensor.objects.all()
 
     # Apply filters if provided
     if location:
         sensors = sensors.filter(location__slug=location)
 
     if sensor:
-        sensors = sensors.filter(name__iexact=sensor)
+        # Lower() on both sides instead of name__iexact, so the sensor_*_name_lower_idx indexes apply
+        sensors = sensors.alias(name_lower=Lower("name")).filter(name_lower=Lower(Value(sensor)))
+
+    try:
+        return after_cursor(sensors, cursor)
+    except InvalidCursorError as err:
+        raise HttpError(422, str(err)) from err
+
+
+# The lists are serialized straight from values() rows, shaped like SensorSchema
+# and LocationSchema, instead of building a model instance and a schema object
+# per row. The renderer's encoder turns the UUIDs into strings.
+ROW_KEY = itemgetter("name", "id")
+SENSOR_FIELDS = tuple(SensorSchema.model_fields)
+LOCATION_FIELDS = tuple(LocationSchema.model_fields)
+
+
+def _sensor_rows(sensors: QuerySet) -> QuerySet:
+    # one query for the page, only the columns of SensorSchema
+    return sensors.values("id", "name", "location__name")
+
+
+def _sensor_items(page: Iterable[dict], *, filtered: bool, cursor: str | None) -> list[dict]:
+    items = [{"id": r["id"], "name": r["name"], "location": r["location__name"]} for r in page]
 
     # If both filters applied but nothing found → 404
-    if (location or sensor) and not sensors.exists():
+    if filtered and not items and not cursor:
         raise HttpError(404, "No sensors found matching the provided criteria")
+    return items
 
-    return [SensorSchema(id=str(s.id), name=s.name, location=s.location.name) for s in sensors]
+
+def _page_headers(request, next_cursor: str | None, limit: int) -> dict[str, str]:
+    if not next_cursor:
+        return {}
+    return {"X-Next-Cursor": next_cursor, "Link": next_link(request, next_cursor, limit)}
+
+
+# list all sensors or filter by location and/or name
+@api.get("/sensors/", response=list[SensorSchema])
+def list_sensors(  # noqa: PLR0913
+    request,
+    location: str | None = Query(None),
+    sensor: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    stream: bool = Query(default=False),  # noqa: FBT001
+) -> HttpResponse:
+    """
+    List sensors ordered by name.
+    - limit/cursor: keyset pagination, the next page's link is in the Link and X-Next-Cursor headers
+    - stream=true: the JSON array is streamed row by row, for exports of the whole fleet
+    - Accept: JSON, MessagePack or Arrow IPC (main.formats), streams are JSON only
+    """
+    media_type = negotiate(request, (JSON,) if stream else LIST_FORMATS)
+    sensors = _sensors(location, sensor, cursor)
+
+    if stream:
+        rows = _sensor_rows(sensors)[:limit].iterator(chunk_size=STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            stream_json_array({"id": r["id"], "name": r["name"], "location": r["location__name"]} for r in rows),
+            content_type="application/json",
+        )
+
+    def build() -> tuple[list[dict], dict[str, str]]:
+        headers = {}
+        if limit:
+            page, next_cursor = keyset_page(_sensor_rows(sensors), limit, ROW_KEY)
+            headers = _page_headers(request, next_cursor, limit)
+        else:
+            page = list(_sensor_rows(sensors))
+        return _sensor_items(page, filtered=bool(location or sensor), cursor=cursor), headers
+
+    # served from the cache until a sensor or location changes
+    params = {"location": location, "sensor": sensor, "limit": limit, "cursor": cursor}
+    return cached_response(request, "sensors", params, build, SENSOR_FIELDS, media_type)
 
 
 # create a new sensor
@@ -129,18 +325,56 @@ def delete_sensor(request, location: str, name: str) -> tuple[Literal[204], None
     return 204, None
 
 
+def _locations(cursor: str | None) -> QuerySet:
+    try:
+        return after_cursor(Location.objects.all(), cursor)
+    except InvalidCursorError as err:
+        raise HttpError(422, str(err)) from err
+
+
+def _location_rows(locations: QuerySet) -> QuerySet:
+    return locations.values("id", "name", "slug")
+
+
 # list all locations or a specific one by slug
 @api.get("/locations/", response=list[LocationSchema])
-def list_locations(request, slug: str | None = Query(None)) -> list[LocationSchema]:
+def list_locations(
+    request,
+    slug: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    stream: bool = Query(default=False),  # noqa: FBT001
+) -> HttpResponse:
     """
     List all locations or a specific one by slug.
+    Supports the same limit/cursor pagination, stream=true export and formats as /sensors/.
     """
+    media_type = negotiate(request, (JSON,) if stream else LIST_FORMATS)
     if slug:
-        loc = get_object_or_404(Location, slug=slug)
-        return [LocationSchema(id=str(loc.id), name=loc.name, slug=loc.slug)]
 
-    locations = Location.objects.all().order_by("name")
-    return [LocationSchema(id=str(loc.id), name=loc.name, slug=loc.slug) for loc in locations]
+        def build_one() -> tuple[list[dict], dict[str, str]]:
+            return [get_object_or_404(_location_rows(Location.objects), slug=slug)], {}
+
+        return cached_response(request, "locations", {"slug": slug}, build_one, LOCATION_FIELDS, media_type)
+
+    locations = _locations(cursor)
+
+    if stream:
+        rows = _location_rows(locations)[:limit].iterator(chunk_size=STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(stream_json_array(rows), content_type="application/json")
+
+    def build() -> tuple[list[dict], dict[str, str]]:
+        headers = {}
+        if limit:
+            page, next_cursor = keyset_page(_location_rows(locations), limit, ROW_KEY)
+            headers = _page_headers(request, next_cursor, limit)
+        else:
+            page = list(_location_rows(locations))
+        return page, headers
+
+    # served from the cache until a location changes
+    params = {"limit": limit, "cursor": cursor}
+    return cached_response(request, "locations", params, build, LOCATION_FIELDS, media_type)
 
 
 # create a new location
@@ -209,9 +443,434 @@ def receive_sensor_data(request, payload: SensorData) -> dict[str, str | dict]:
     """
     Receives sensor data from a sensor device and forwards it to RabbitMQ via Celery.
     """
+    # shed while the broker falls behind, then the client's and the sensor's rate limits
+    admit(request)
+    limit_sensor(payload.sensor_id)
+
+    # reject readings from sensors we don't know, checked against the in-process identity cache
+    if settings.INGEST_VALIDATE_IDENTITY and not get_identity_cache().is_valid(payload.sensor_id, payload.location_id):
+        raise HttpError(422, "Unknown sensor or sensor not in location")
+
     data_dict = payload.dict()
 
-    # Send the data to Celery for asynchronous processing
-    forward_to_message_queue.delay(data_dict)  # type: ignore
+    # a retransmit of a reading already forwarded is acknowledged without forwarding it again
+    recent = get_ingest_keys()
+    key = dict_key(data_dict)
+    if recent.duplicates([key])[0]:
+        return {"status": "duplicate", "data": data_dict}
+
+    # Send the data to Celery for asynchronous processing, spooled while the broker is unavailable
+    forward(forward_to_message_queue, data_dict, [data_dict])
+    recent.add([key])
+    # and to the live views open on this process
+    publish_readings([data_dict])
+
+    return {"status": "queued", "data": data_dict}
+
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+
+
+@api.post("/fleet/import/", response=FleetImportResponse, summary="Import locations and sensors in bulk")
+def import_fleet_rows(request) -> FleetImportResponse:
+    """
+    Creates the locations and sensors of a CSV (text/csv) or JSON array upload,
+    one row per sensor with the columns location, location_id, sensor, sensor_id, description.
+    Existing locations and sensors are left alone, every row gets a created/exists/rejected status.
+    """
+    try:
+        if request.content_type in CSV_CONTENT_TYPES:
+            rows = list(parse_csv(request.body.decode("utf-8-sig")))
+        else:
+            rows = parse_json(request.body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as err:
+        raise HttpError(400, "Request body is not valid CSV or JSON") from err
+    except TypeError as err:
+        raise HttpError(422, str(err)) from err
+
+    max_rows = settings.FLEET_IMPORT_MAX_ROWS
+    if len(rows) > max_rows:
+        raise HttpError(413, f"Import exceeds the maximum of {max_rows} rows")
+
+    result = import_fleet(rows)
+    return FleetImportResponse(
+        locations_created=result.locations_created,
+        sensors_created=result.sensors_created,
+        existing=result.count("exists"),
+        rejected=result.count("rejected"),
+        results=[FleetRowResult(index=r.index, status=r.status, errors=r.errors) for r in result.results],
+    )
+
+
+@api.get("/fleet/export/", summary="Export all locations and sensors")
+def export_fleet_rows(request, fmt: Literal["csv", "json"] = Query("json", alias="format")) -> StreamingHttpResponse:
+    """
+    Streams every location and sensor in the import format, as CSV or a JSON array.
+    Locations without sensors are a row with an empty sensor.
+    """
+    if fmt == "csv":
+        response = StreamingHttpResponse(stream_csv(export_rows()), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="fleet.csv"'
+        return response
+    return StreamingHttpResponse(stream_json_array(export_rows()), content_type="application/json")
+
+
+@api.get("/metrics/pools/", summary="Connection pool metrics of this process")
+def read_pool_metrics(request) -> dict[str, object]:
+    """
+    Waits for a broker producer and database connections opened by this process,
+    with DATABASE_POOL also the psycopg pool's counters per database.
+    """
+    return pool_stats()
+
+
+@api.get("/metrics/spool/", summary="Ingest spool of this host")
+def read_spool_metrics(request) -> dict[str, object]:
+    """
+    Readings waiting in the spool for the broker (READINGS_SPOOL_PATH), and the
+    readings this process appended, replayed and refused.
+    """
+    spool = get_spool()
+    if spool is None:
+        raise HttpError(404, "The spool is disabled")
+    return spool.stats()
+
+
+@api.get("/metrics/dedup/", summary="Duplicate readings dropped by this process")
+def read_dedup_metrics(request) -> dict[str, object]:
+    """
+    Readings checked against the recent keys and the share that were retransmits,
+    at ingest and, in processes that write readings, at storage.
+    """
+    return {"ingest": get_ingest_keys().stats(), "storage": get_storage_keys().stats()}
+
+
+@api.get("/metrics/ingest/", summary="Rate limits and admission control of this process")
+def read_ingest_metrics(request) -> dict[str, object]:
+    """
+    Tokens taken and requests or readings limited per client address and per
+    sensor, and whether ingest is shed with the broker's last sampled state.
+    """
+    return ingest_stats()
+
+
+@api.get("/data/", response=DataSeries, summary="Read back sensor data")
+def read_sensor_data(  # noqa: PLR0913
+    request,
+    sensor_id: uuid.UUID | None = Query(None),
+    location_id: uuid.UUID | None = Query(None),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    bucket: str | None = Query(None),
+    points: int | None = Query(None, ge=3),
+) -> HttpResponse:
+    """
+    Temperature of a sensor or of all sensors in a location over [start, end), aggregated per time bucket.
+    - bucket (e.g. 300, 5m, 1h, 1d): min/max/avg/count for every bucket
+    - points: the range is bucketed and downsampled (LTTB) to at most this many points
+    Without either, DATA_DEFAULT_POINTS points are returned. end defaults to now and
+    start to DATA_DEFAULT_RANGE_HOURS before end, timestamps without an offset are UTC.
+    Accept: JSON, MessagePack, Arrow IPC or packed scaled integers (main.formats).
+    """
+    media_type = negotiate(request, SERIES_FORMATS)
+    if (sensor_id is None) == (location_id is None):
+        raise HttpError(422, "Give either sensor_id or location_id")
+    if bucket is not None and points is not None:
+        raise HttpError(422, "Give either bucket or points, not both")
+
+    end = end or datetime.now(UTC)
+    end = end if end.tzinfo is not None else end.replace(tzinfo=UTC)
+    start = start or end - timedelta(hours=settings.DATA_DEFAULT_RANGE_HOURS)
+    start = start if start.tzinfo is not None else start.replace(tzinfo=UTC)
+    if start >= end:
+        raise HttpError(422, "start must be before end")
+
+    max_points = settings.DATA_MAX_POINTS
+    if points is not None and points > max_points:
+        raise HttpError(422, f"points exceeds the maximum of {max_points}")
+
+    seconds = None
+    if bucket is not None:
+        try:
+            seconds = parse_bucket(bucket)
+        except ValueError as err:
+            raise HttpError(422, str(err)) from err
+        if (end - start).total_seconds() / seconds > max_points:
+            raise HttpError(422, f"Range has more than {max_points} buckets, use a larger bucket")
+
+    seconds, buckets = query(start, end, sensor_id=sensor_id, location_id=location_id, bucket=seconds, points=points)
+
+    series = DataSeries(
+        sensor_id=str(sensor_id) if sensor_id else None,
+        location_id=str(location_id) if location_id else None,
+        start=start,
+        end=end,
+        bucket=seconds,
+        points=[DataPoint(time=b.time, min=b.min, max=b.max, avg=b.avg, count=b.count) for b in buckets],
+    ).dict()
+
+    if media_type == JSON:
+        response = api.create_response(request, series, status=200)
+    else:
+        headers = packed_headers(series) if media_type == PACKED else {}
+        response = HttpResponse(encode_series(series, media_type), content_type=media_type, headers=headers)
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+# parse the request body into raw items, either a JSON array or newline delimited JSON
+def _iter_batch_items(request) -> Iterator[Any]:
+    content_type = request.content_type or ""
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        # read the body line by line so large uploads are never held as one string
+        for raw_line in request:
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # keep the position so the device knows which line to resend
+                yield line.decode(errors="replace")
+        return
+
+    try:
+        items = json.loads(request.body)
+    except json.JSONDecodeError as err:
+        raise HttpError(400, "Request body is not valid JSON") from err
+
+    if not isinstance(items, list):
+        raise HttpError(422, "Expected a JSON array of sensor readings")
+    yield from items
+
+
+def _chunked(items: list[dict], size: int) -> Iterable[list[dict]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+# set the outcome of the readings still accepted, an entry of None keeps the reading
+# returns the readings that stay accepted, results and readings are matched by position
+def _settle(
+    accepted: list[dict],
+    results: list[BatchItemResult],
+    errors: list[list[str] | None],
+    status: Literal["rejected", "duplicate"] = "rejected",
+) -> list[dict]:
+    accepted_results = [r for r in results if r.status == "accepted"]
+    kept = []
+    for reading, result, item_errors in zip(accepted, accepted_results, errors, strict=True):
+        if item_errors is None:
+            kept.append(reading)
+        else:
+            result.status = status
+            result.errors = item_errors
+    return kept
+
+
+# the reason a reading's time can't be stored, None when it can
+def _time_error(value: str) -> str | None:
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:  # well formed but out of range, e.g. month 13
+        parsed = None
+    if parsed is None:
+        return "time: not an ISO 8601 timestamp"
+    if parsed.tzinfo is None:
+        return "time: needs a UTC offset, e.g. 2025-10-10T12:00:00Z"
+    return None
+
+
+# validate every item in a single pass, collecting errors instead of failing the request
+def _validate_batch(request) -> tuple[list[dict], list[BatchItemResult]]:
+    max_items = settings.INGEST_BATCH_MAX_ITEMS
+    accepted: list[dict] = []
+    results: list[BatchItemResult] = []
+
+    for index, item in enumerate(_iter_batch_items(request)):
+        if index >= max_items:
+            raise HttpError(413, f"Batch exceeds the maximum of {max_items} readings")
+
+        try:
+            reading = SensorData.model_validate(item)
+        except pydantic.ValidationError as err:
+            errors = [f"{'.'.join(str(loc) for loc in e['loc']) or 'item'}: {e['msg']}" for e in err.errors()]
+            results.append(BatchItemResult(index=index, status="rejected", errors=errors))
+            continue
+        if error := _time_error(reading.time):
+            results.append(BatchItemResult(index=index, status="rejected", errors=[error]))
+            continue
+
+        accepted.append(reading.dict())
+        results.append(BatchItemResult(index=index, status="accepted"))
+    return accepted, results
+
+
+# readings of a sensor beyond its tokens are rejected, the device resends them later
+def _limit_batch(accepted: list[dict], results: list[BatchItemResult]) -> list[dict]:
+    waits = limit_sensors([r["sensor_id"] for r in accepted])
+    if not any(waits):
+        return accepted
+    errors = [
+        [f"Too many readings from this sensor, retry after {retry_after(wait)} s"] if wait else None for wait in waits
+    ]
+    return _settle(accepted, results, errors)
+
+
+# check every sensor of the batch against the identity cache, misses in one query
+def _check_batch_identity(accepted: list[dict], results: list[BatchItemResult]) -> list[dict]:
+    if not settings.INGEST_VALIDATE_IDENTITY or not accepted:
+        return accepted
+    known = get_identity_cache().lookup_many(r["sensor_id"] for r in accepted)
+    errors = []
+    for reading_dict in accepted:
+        location_id = known.get(normalize_id(reading_dict["sensor_id"]) or reading_dict["sensor_id"])
+        if location_id is None or location_id != normalize_id(reading_dict["location_id"]):
+            errors.append(["Unknown sensor or sensor not in location"])
+        else:
+            errors.append(None)
+    return _settle(accepted, results, errors)
+
+
+# retransmitted readings, also repeats within the batch, aren't forwarded again
+# returns the readings to forward and their keys, remembered once they are forwarded
+def _dedup_batch(accepted: list[dict], results: list[BatchItemResult]) -> tuple[list[dict], list]:
+    keys = [dict_key(r) for r in accepted]
+    duplicates = get_ingest_keys().duplicates(keys)
+    accepted = _settle(accepted, results, [[] if duplicate else None for duplicate in duplicates], status="duplicate")
+    return accepted, [key for key, duplicate in zip(keys, duplicates, strict=True) if not duplicate]
+
+
+@api.post("/data/batch/", response=BatchIngestResponse, summary="Receive a batch of sensor data")
+def receive_sensor_data_batch(request) -> BatchIngestResponse:
+    """
+    Receives many readings in one request (JSON array or NDJSON) and forwards
+    the valid ones to RabbitMQ in chunked Celery messages.
+    Returns the accept/reject status of every item so devices can resend rejected readings.
+    """
+    admit(request)
+    accepted, results = _validate_batch(request)
+    accepted = _limit_batch(accepted, results)
+    accepted = _check_batch_identity(accepted, results)
+    accepted, keys = _dedup_batch(accepted, results)
+
+    # one Celery message per chunk instead of one per reading
+    for chunk in _chunked(accepted, settings.INGEST_BATCH_CHUNK_SIZE):
+        forward(forward_batch_to_message_queue, chunk, chunk)
+    get_ingest_keys().add(keys)
+    publish_readings(accepted)
+
+    return BatchIngestResponse(
+        status="queued",
+        accepted=len(accepted),
+        rejected=sum(r.status == "rejected" for r in results),
+        duplicates=sum(r.status == "duplicate" for r in results),
+        results=results,
+    )
+
+
+# Async variants for an ASGI server (uvicorn, see readme)
+# Same parameters and responses as the endpoints above. While a request waits on
+# the database or the broker the event loop serves other requests, so one process
+# keeps many device connections in flight instead of one per worker thread.
+# - queries use the async ORM (aget, async for, aiterator)
+# - the identity check and the response cache answer from memory without leaving the loop
+# - Celery publishes synchronously, the publish runs on the thread pool instead of the loop
+
+
+@api.get("/async/sensors/", response=list[SensorSchema])
+async def alist_sensors(  # noqa: PLR0913
+    request,
+    location: str | None = Query(None),
+    sensor: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    stream: bool = Query(default=False),  # noqa: FBT001
+) -> HttpResponse:
+    """Async list_sensors."""
+    media_type = negotiate(request, (JSON,) if stream else LIST_FORMATS)
+    sensors = _sensors(location, sensor, cursor)
+
+    if stream:
+        # values(), values_list() runs its query on the event loop when iterated asynchronously
+        rows = _sensor_rows(sensors)[:limit].aiterator(chunk_size=STREAM_CHUNK_SIZE)
+        items = ({"id": r["id"], "name": r["name"], "location": r["location__name"]} async for r in rows)
+        return StreamingHttpResponse(astream_json_array(items), content_type="application/json")
+
+    async def build() -> tuple[list[dict], dict[str, str]]:
+        headers = {}
+        if limit:
+            page, next_cursor = await akeyset_page(_sensor_rows(sensors), limit, ROW_KEY)
+            headers = _page_headers(request, next_cursor, limit)
+        else:
+            page = [s async for s in _sensor_rows(sensors)]
+        return _sensor_items(page, filtered=bool(location or sensor), cursor=cursor), headers
+
+    params = {"location": location, "sensor": sensor, "limit": limit, "cursor": cursor}
+    return await acached_response(request, "sensors", params, build, SENSOR_FIELDS, media_type)
+
+
+@api.get("/async/locations/", response=list[LocationSchema])
+async def alist_locations(
+    request,
+    slug: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    stream: bool = Query(default=False),  # noqa: FBT001
+) -> HttpResponse:
+    """Async list_locations."""
+    media_type = negotiate(request, (JSON,) if stream else LIST_FORMATS)
+    if slug:
+
+        async def build_one() -> tuple[list[dict], dict[str, str]]:
+            try:
+                return [await _location_rows(Location.objects).aget(slug=slug)], {}
+            except Location.DoesNotExist as err:
+                raise Http404 from err
+
+        return await acached_response(request, "locations", {"slug": slug}, build_one, LOCATION_FIELDS, media_type)
+
+    locations = _locations(cursor)
+
+    if stream:
+        rows = _location_rows(locations)[:limit].aiterator(chunk_size=STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(astream_json_array(rows), content_type="application/json")
+
+    async def build() -> tuple[list[dict], dict[str, str]]:
+        headers = {}
+        if limit:
+            page, next_cursor = await akeyset_page(_location_rows(locations), limit, ROW_KEY)
+            headers = _page_headers(request, next_cursor, limit)
+        else:
+            page = [loc async for loc in _location_rows(locations)]
+        return page, headers
+
+    params = {"limit": limit, "cursor": cursor}
+    return await acached_response(request, "locations", params, build, LOCATION_FIELDS, media_type)
+
+
+@api.post("/async/data/", summary="Receive sensor data (async)")
+async def areceive_sensor_data(request, payload: SensorData) -> dict[str, str | dict]:
+    """Async receive_sensor_data."""
+    await aadmit(request)
+    await alimit_sensor(payload.sensor_id)
+    if settings.INGEST_VALIDATE_IDENTITY and not await get_identity_cache().ais_valid(
+        payload.sensor_id, payload.location_id
+    ):
+        raise HttpError(422, "Unknown sensor or sensor not in location")
+
+    data_dict = payload.dict()
+    recent = get_ingest_keys()
+    key = dict_key(data_dict)
+    if recent.duplicates([key])[0]:
+        return {"status": "duplicate", "data": data_dict}
+
+    await aforward(forward_to_message_queue, data_dict, [data_dict])
+    recent.add([key])
+    publish_readings([data_dict])
 
     return {"status": "queued", "data": data_dict}
@@ -0,0 +1,117 @@
+import hashlib
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from .formats import JSON, encode_rows
+
+# Response cache for the fleet list endpoints (/api/sensors/, /api/locations/)
+# - one entry per endpoint, filter combination and response format (main.formats),
+#   holding the serialized body and its ETag
+# - every key embeds a fleet version number, saving or deleting a Location or
+#   Sensor bumps the version (main.signals) so all old entries are skipped at
+#   once and expire on their own
+# - clients sending a matching If-None-Match get a 304 without the list being
+#   queried or serialized again
+
+FLEET_VERSION_KEY = "api:fleet:version"
+
+
+def fleet_version() -> int:
+    version = cache.get(FLEET_VERSION_KEY)
+    if version is None:
+        # start from the clock so an evicted counter never reuses an old version
+        cache.add(FLEET_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(FLEET_VERSION_KEY, 0)
+    return version
+
+
+async def afleet_version() -> int:
+    version = await cache.aget(FLEET_VERSION_KEY)
+    if version is None:
+        await cache.aadd(FLEET_VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(FLEET_VERSION_KEY, 0)
+    return version
+
+
+def bump_fleet_version() -> None:
+    try:
+        cache.incr(FLEET_VERSION_KEY)
+    except ValueError:
+        cache.set(FLEET_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def cache_key(endpoint: str, params: dict[str, object], version: int | None = None) -> str:
+    query = urlencode(sorted((k, v) for k, v in params.items() if v is not None))
+    return f"api:{endpoint}:{fleet_version() if version is None else version}:{query}"
+
+
+def make_etag(body: bytes) -> str:
+    return quote_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+
+
+def not_modified(request: HttpRequest, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in etags
+
+
+def make_entry(
+    items: list[dict], headers: dict[str, str], fields: Sequence[str] = (), media_type: str = JSON
+) -> tuple[bytes, str, dict[str, str]]:
+    body = encode_rows(items, fields, media_type)
+    return body, make_etag(body), headers | {"Content-Type": media_type}
+
+
+def entry_response(request: HttpRequest, entry: tuple[bytes, str, dict[str, str]]) -> HttpResponse:
+    body, etag, headers = entry
+    response = HttpResponseNotModified() if not_modified(request, etag) else HttpResponse(body, headers=headers)
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+def cached_response(  # noqa: PLR0913
+    request: HttpRequest,
+    endpoint: str,
+    params: dict[str, object],
+    build: Callable[[], tuple[list[dict], dict[str, str]]],
+    fields: Sequence[str],
+    media_type: str = JSON,
+) -> HttpResponse:
+    """
+    Serve the items returned by build() in media_type from the cache, or a 304 when the client already has them.
+    build() also returns extra response headers (e.g. pagination links), cached along with the body.
+    fields are the keys of an item, the columns of the Arrow format.
+    """
+    key = cache_key(endpoint, params | {"format": media_type})
+    entry = cache.get(key)
+    if entry is None:
+        entry = make_entry(*build(), fields, media_type)
+        cache.set(key, entry, settings.API_CACHE_TIMEOUT)
+    return entry_response(request, entry)
+
+
+async def acached_response(  # noqa: PLR0913
+    request: HttpRequest,
+    endpoint: str,
+    params: dict[str, object],
+    build: Callable[[], Awaitable[tuple[list[dict], dict[str, str]]]],
+    fields: Sequence[str],
+    media_type: str = JSON,
+) -> HttpResponse:
+    """cached_response for async views, shares its entries."""
+    key = cache_key(endpoint, params | {"format": media_type}, await afleet_version())
+    entry = await cache.aget(key)
+    if entry is None:
+        entry = make_entry(*await build(), fields, media_type)
+        await cache.aset(key, entry, settings.API_CACHE_TIMEOUT)
+    return entry_response(request, entry)
@@ -0,0 +1,171 @@
+import contextlib
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+from celery import Celery
+from django.conf import settings
+from django.db import close_old_connections
+from kombu import Exchange, Queue
+from kombu.message import Message
+
+from .storage import REFUSED_ERRORS, readings_from_dicts, store_readings
+from .tasks import forward_batch_to_message_queue, forward_to_message_queue
+
+logger = logging.getLogger(__name__)
+
+# Micro-batching consumer for the readings queue
+# A Celery worker runs forward_to_message_queue once per message: decode, run,
+# ack, one message at a time. This consumer reads the same queue with kombu
+# directly instead:
+# - collects up to READINGS_BATCH_SIZE messages, or whatever arrived within
+#   READINGS_BATCH_LATENCY_MS of the first one
+# - writes all their readings with one COPY per shard
+# - acks the whole batch with a single multiple=True ack
+# Messages are only acked after the write succeeded. If it fails they are
+# requeued, so a crash loses nothing (at least once delivery). When the database
+# refuses a reading (main.storage.REFUSED_ERRORS) the messages are written one
+# by one instead and a message still refused is rejected, not requeued, so a
+# poison reading can't fail its batch forever.
+# Run it with: python manage.py consume_readings
+
+
+class ReadingBatcher:
+    def __init__(self, batch_size: int, latency: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.batch_size = batch_size
+        self.latency = latency
+        self.clock = clock
+        self.messages: list[Message] = []
+        self._first: float | None = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def add(self, message: Message) -> None:
+        if self._first is None:
+            self._first = self.clock()
+        self.messages.append(message)
+
+    def time_left(self) -> float | None:
+        # how long the consumer may wait for more messages, None when idle
+        if self._first is None:
+            return None
+        return max(0.0, self.latency - (self.clock() - self._first))
+
+    def ready(self) -> bool:
+        return len(self.messages) >= self.batch_size or self.time_left() == 0
+
+    def take(self) -> list[Message]:
+        messages, self.messages, self._first = self.messages, [], None
+        return messages
+
+
+def readings_from_message(message: Message) -> list[dict]:
+    # Celery task protocol 2: the task name is a header, the body is (args, kwargs, embed)
+    task = message.headers.get("task")
+    args, _kwargs, _embed = message.decode()
+    if task == forward_to_message_queue.name:
+        return [args[0]]
+    if task == forward_batch_to_message_queue.name:
+        return list(args[0])
+    msg = f"Unexpected task '{task}' on the readings queue"
+    raise ValueError(msg)
+
+
+def process_batch(messages: list[Message]) -> int:
+    """Write the readings of a batch of messages and settle the messages, returns readings written."""
+    valid: list[tuple[Message, list[dict]]] = []
+    for message in messages:
+        try:
+            valid.append((message, readings_from_message(message)))
+        except (ValueError, TypeError, IndexError, KeyError):
+            # a message we can't read will never succeed, don't requeue it
+            logger.exception("Rejecting undecodable message %s", message.delivery_tag)
+            message.reject()
+
+    if not valid:
+        return 0
+
+    readings = readings_from_dicts(item for _, items in valid for item in items)
+    try:
+        store_readings(readings)
+    except REFUSED_ERRORS:
+        logger.warning("The database refused a reading of %d messages, writing them one by one", len(valid))
+        return _process_each(valid)
+    except Exception:
+        logger.exception("Writing %d readings failed, requeueing %d messages", len(readings), len(valid))
+        for message, _ in valid:
+            message.requeue()
+        raise
+
+    # one ack for the whole batch, acknowledges every delivery up to the highest tag
+    last = max((m for m, _ in valid), key=lambda m: m.delivery_tag)
+    last.ack(multiple=True)
+    return len(readings)
+
+
+def _process_each(valid: list[tuple[Message, list[dict]]]) -> int:
+    # after a refused batch: each message is written on its own, one still refused is rejected
+    written = 0
+    for index, (message, items) in enumerate(valid):
+        readings = readings_from_dicts(items)
+        try:
+            store_readings(readings)
+        except REFUSED_ERRORS:
+            logger.exception("Rejecting message %s, the database refuses its readings", message.delivery_tag)
+            message.reject()
+        except Exception:
+            logger.exception(
+                "Writing message %s failed, requeueing %d messages", message.delivery_tag, len(valid) - index
+            )
+            for pending, _ in valid[index:]:
+                pending.requeue()
+            raise
+        else:
+            message.ack()
+            written += len(readings)
+    return written
+
+
+class BatchingConsumer:
+    def __init__(self, app: Celery, queue: str, batch_size: int, latency: float) -> None:
+        self.app = app
+        self.queue = Queue(queue, Exchange(queue, type="direct"), routing_key=queue)
+        self.batcher = ReadingBatcher(batch_size, latency)
+        self.stopped = threading.Event()
+
+    def on_message(self, _body: object, message: Message) -> None:
+        self.batcher.add(message)
+
+    def flush(self) -> None:
+        messages = self.batcher.take()
+        if not messages:
+            return
+        try:
+            written = process_batch(messages)
+            logger.info("Wrote %d readings from %d messages", written, len(messages))
+        except Exception:  # noqa: BLE001
+            # already logged and requeued, back off before consuming again
+            time.sleep(1)
+        finally:
+            close_old_connections()
+
+    def run(self) -> None:
+        with (
+            self.app.connection_for_read() as connection,
+            connection.Consumer(
+                self.queue,
+                callbacks=[self.on_message],
+                accept=settings.CELERY_ACCEPT_CONTENT,
+                # the broker must be allowed to hand us a whole batch before the first ack
+                prefetch_count=self.batcher.batch_size,
+            ),
+        ):
+            while not self.stopped.is_set():
+                timeout = self.batcher.time_left()
+                with contextlib.suppress(TimeoutError):
+                    connection.drain_events(timeout=1.0 if timeout is None else timeout)
+                if self.batcher.messages and self.batcher.ready():
+                    self.flush()
+            self.flush()
@@ -0,0 +1,122 @@
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import UTC, datetime, timedelta
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+# Deduplication of retransmitted readings
+# A device that times out waiting for a response sends the same reading again.
+# A reading is identified by (sensor, time), the primary key of the readings
+# table, which stays the final word: COPY falls back to INSERT ... ON CONFLICT
+# DO NOTHING (main.storage). Duplicates reaching the database still cost a
+# broker message, a failed COPY and a slower retry of the whole batch, so two
+# bounded sets of recently seen keys drop them earlier:
+# - ingest (API process): retransmits are answered without being forwarded,
+#   keys are remembered once their reading was forwarded or spooled
+# - storage (worker process): readings written in the last batches, and repeats
+#   within a batch, are left out of the next COPY
+# Exact sets instead of a Bloom filter: a false positive would drop a genuine
+# reading. The oldest keys are forgotten first, at 24 bytes a key plus the set's
+# overhead 100,000 keys take about 15 MB.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+MICROSECOND = timedelta(microseconds=1)
+TIME = struct.Struct("<q")
+
+
+def reading_key(sensor_id: object, time: str | datetime) -> bytes:
+    """The sensor's 16 bytes followed by the time in microseconds since the epoch."""
+    sensor = sensor_id if isinstance(sensor_id, uuid.UUID) else uuid.UUID(str(sensor_id))
+    parsed = time if isinstance(time, datetime) else parse_datetime(time)
+    if parsed is None:
+        msg = f"Invalid timestamp '{time}'"
+        raise ValueError(msg)
+    # without an offset it is UTC, as in main.storage
+    parsed = parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=UTC)
+    return sensor.bytes + TIME.pack((parsed - EPOCH) // MICROSECOND)
+
+
+def dict_key(data: dict) -> bytes | None:
+    # None for a reading that can't be identified, it is never taken for a duplicate
+    try:
+        return reading_key(data["sensor_id"], data["time"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class RecentKeys:
+    """The last capacity keys added, with hit counters, thread safe."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._keys: OrderedDict[bytes, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def duplicates(self, keys: list[bytes | None]) -> list[bool]:
+        """Per key whether it was added before or comes up earlier in keys."""
+        flags = []
+        batch: set[bytes] = set()
+        with self._lock:
+            for key in keys:
+                duplicate = key is not None and (key in batch or key in self._keys)
+                if key is not None:
+                    batch.add(key)
+                    self.checked += 1
+                    self.hits += duplicate
+                flags.append(duplicate)
+        return flags
+
+    def add(self, keys: Iterable[bytes | None]) -> None:
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.capacity:
+                self._keys.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self.checked = self.hits = 0
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "keys": len(self._keys),
+                "capacity": self.capacity,
+                "checked": self.checked,
+                "duplicates": self.hits,
+                "hit_rate": round(self.hits / self.checked, 4) if self.checked else 0.0,
+            }
+
+
+_ingest_keys: RecentKeys | None = None
+_storage_keys: RecentKeys | None = None
+_keys_lock = threading.Lock()
+
+
+def get_ingest_keys() -> RecentKeys:
+    global _ingest_keys  # noqa: PLW0603
+    with _keys_lock:
+        if _ingest_keys is None:
+            _ingest_keys = RecentKeys(settings.INGEST_DEDUP_KEYS)
+        return _ingest_keys
+
+
+def get_storage_keys() -> RecentKeys:
+    global _storage_keys  # noqa: PLW0603
+    with _keys_lock:
+        if _storage_keys is None:
+            _storage_keys = RecentKeys(settings.READINGS_DEDUP_KEYS)
+        return _storage_keys
@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import queue
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+
+from .identity import normalize_id
+
+logger = logging.getLogger(__name__)
+
+# In-process publish/subscribe for the live views (Server-Sent Events, main.views.events)
+# - topics: "readings" accepted by the ingest API, "sensors" and "locations"
+#   changed in the database (main.signals)
+# - every subscriber (one per open browser tab) has a bounded queue, a slow one
+#   loses its oldest events instead of holding up the publisher
+# - publishing to a topic nobody subscribed to costs a dict lookup
+# - subscribers are either threads (WSGI, blocking get) or coroutines of the
+#   ASGI event loop (events handed over with call_soon_threadsafe)
+# The bus lives in one process: browsers only see what the process serving their
+# stream ingested or changed, run the web app as a single ASGI process to see everything.
+
+TOPICS = ("readings", "sensors", "locations")
+
+
+@dataclass(eq=False)
+class Event:
+    topic: str
+    id: int
+    data: dict
+    message: str | None = None  # formatted once by the first stream sending it, shared by the others
+
+
+@dataclass(eq=False)
+class Subscription:
+    topics: frozenset[str]
+    maxsize: int
+    loop: asyncio.AbstractEventLoop | None = None
+    dropped: int = 0
+    _queue: queue.Queue | asyncio.Queue = field(init=False)
+
+    def __post_init__(self) -> None:
+        self._queue = asyncio.Queue(self.maxsize) if self.loop else queue.Queue(self.maxsize)
+
+    def put(self, event: Event) -> None:
+        # called from the publishing thread
+        if self.loop is None:
+            self._put(event)
+            return
+        # a closed loop means the stream is gone, it unsubscribes on its way out
+        with contextlib.suppress(RuntimeError):
+            self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: Event) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(event)
+            except (queue.Full, asyncio.QueueFull):
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except (queue.Empty, asyncio.QueueEmpty):
+                    pass
+            else:
+                return
+
+    def drain(self) -> list[Event]:
+        events = []
+        try:
+            while True:
+                events.append(self._queue.get_nowait())
+        except (queue.Empty, asyncio.QueueEmpty):
+            return events
+
+    def get(self, wait: float) -> list[Event]:
+        """Wait up to `wait` seconds for events (threads), returns all that are queued."""
+        try:
+            first = self._queue.get(timeout=wait)
+        except queue.Empty:
+            return []
+        return [first, *self.drain()]
+
+    async def aget(self, wait: float) -> list[Event]:
+        """Same as get for subscribers on the event loop."""
+        try:
+            async with asyncio.timeout(wait):
+                first = await self._queue.get()
+        except TimeoutError:
+            return []
+        return [first, *self.drain()]
+
+
+class EventBus:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._ids = itertools.count(1)
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics: Iterable[str], loop: asyncio.AbstractEventLoop | None = None) -> Subscription:
+        subscription = Subscription(frozenset(topics), self.maxsize, loop)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic, set())
+                subscribers.discard(subscription)
+                if not subscribers:
+                    self._subscribers.pop(topic, None)
+        if subscription.dropped:
+            logger.info("Subscriber to %s dropped %d events", ",".join(subscription.topics), subscription.dropped)
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._subscribers
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(set().union(*self._subscribers.values()))
+
+    def publish(self, topic: str, data: dict) -> None:
+        if topic not in self._subscribers:
+            return
+        event = Event(topic, next(self._ids), data)
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+_bus: EventBus | None = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> EventBus:
+    global _bus  # noqa: PLW0603
+    with _bus_lock:
+        if _bus is None:
+            _bus = EventBus(settings.EVENTS_QUEUE_SIZE)
+        return _bus
+
+
+def publish_on_commit(topic: str, data: dict) -> None:
+    # subscribers must never see a change that is rolled back
+    bus = get_event_bus()
+    if bus.has_subscribers(topic):
+        transaction.on_commit(lambda: bus.publish(topic, data))
+
+
+def publish_readings(readings: Iterable[dict]) -> None:
+    """Publish the latest of the given readings of every sensor."""
+    bus = get_event_bus()
+    if not bus.has_subscribers("readings"):
+        return
+    latest = {}
+    for reading in readings:
+        latest[normalize_id(reading["sensor_id"]) or reading["sensor_id"]] = reading
+    for sensor_id, reading in latest.items():
+        bus.publish(
+            "readings",
+            {
+                "sensor_id": sensor_id,
+                "location_id": reading["location_id"],
+                "time": reading["time"],
+                "temperature": reading["temperature"],
+            },
+        )
@@ -0,0 +1,280 @@
+import csv
+import io
+import json
+import uuid
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .cache import bump_fleet_version
+from .identity import get_identity_cache
+from .models import MAX_NAME_LENGTH, MIN_NAME_LENGTH, Location, Sensor
+from .pagination import STREAM_CHUNK_SIZE
+
+# Bulk import and export of the fleet (locations and their sensors)
+# One row per sensor, a row without a sensor only makes sure its location exists:
+#   location, location_id, sensor, sensor_id, description
+# Ids are optional on import and always present on export, so an export can be
+# imported elsewhere with the ids devices already send.
+# An import runs a fixed number of queries however many rows it has:
+# - locations resolved by slug (and the ids given) in one query, missing ones
+#   created with one bulk_create and read back
+# - existing sensors of those locations fetched in one query
+# - new sensors created with one bulk_create, ignoring rows that would break
+#   unique_sensor_per_location, and read back to see which were inserted
+# bulk_create skips the post_save signals, so the fleet cache version and the
+# ingest identity cache (main.signals) are updated here instead, once the
+# import has committed.
+
+FLEET_COLUMNS = ("location", "location_id", "sensor", "sensor_id", "description")
+
+
+@dataclass
+class RowResult:
+    index: int  # position of the row in the import, 0 based
+    status: str  # "created", "exists" or "rejected"
+    errors: list[str] = field(default_factory=list)
+
+
+@dataclass
+class FleetImport:
+    locations_created: int = 0
+    sensors_created: int = 0
+    results: list[RowResult] = field(default_factory=list)
+
+    def count(self, status: str) -> int:
+        return sum(1 for r in self.results if r.status == status)
+
+
+@dataclass
+class _Row:
+    index: int
+    location: str
+    slug: str
+    location_id: uuid.UUID | None
+    sensor: str
+    sensor_id: uuid.UUID | None
+    description: str
+
+
+def parse_csv(text: str | Iterable[str]) -> Iterator[dict]:
+    lines = io.StringIO(text) if isinstance(text, str) else text
+    yield from csv.DictReader(lines)
+
+
+def parse_json(data: str | bytes) -> list:
+    rows = json.loads(data)
+    if not isinstance(rows, list):
+        msg = "Expected a JSON array of fleet rows"
+        raise TypeError(msg)
+    return rows
+
+
+def _name_errors(value: str, what: str) -> list[str]:
+    if not MIN_NAME_LENGTH <= len(value) <= MAX_NAME_LENGTH:
+        return [f"{what}: must be between {MIN_NAME_LENGTH} and {MAX_NAME_LENGTH} characters"]
+    return []
+
+
+def _uuid(value: object, what: str, errors: list[str]) -> uuid.UUID | None:
+    if value in (None, ""):
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        errors.append(f"{what}: not a valid UUID")
+        return None
+
+
+def _validate(index: int, raw: object) -> tuple[_Row | None, list[str]]:
+    if not isinstance(raw, dict):
+        return None, ["row: expected an object with location and sensor"]
+
+    errors: list[str] = []
+    location = str(raw.get("location") or "").strip()
+    sensor = str(raw.get("sensor") or "").strip()
+    errors += _name_errors(location, "location")
+    if sensor:
+        errors += _name_errors(sensor, "sensor")
+    location_id = _uuid(raw.get("location_id"), "location_id", errors)
+    sensor_id = _uuid(raw.get("sensor_id"), "sensor_id", errors)
+    slug = slugify(location)
+    if location and not slug:
+        errors.append("location: needs at least one letter or digit")
+
+    row = _Row(index, location, slug, location_id, sensor, sensor_id, str(raw.get("description") or ""))
+    return (None if errors else row), errors
+
+
+def _resolve_locations(rows: list[_Row]) -> tuple[dict[str, Location], set[uuid.UUID]]:
+    """
+    The locations of the rows by slug and the ids of those created. A new
+    location whose id belongs to another location isn't created, its rows
+    find no location.
+    """
+    slugs = {row.slug for row in rows}
+    given_ids = {row.location_id for row in rows if row.location_id}
+    found = list(Location.objects.filter(Q(slug__in=slugs) | Q(id__in=given_ids)))
+    locations = {loc.slug: loc for loc in found if loc.slug in slugs}
+    taken_ids = {loc.id for loc in found}
+    missing: dict[str, Location] = {}
+    for row in rows:
+        if row.slug in locations or row.slug in missing or row.location_id in taken_ids:
+            continue
+        missing[row.slug] = Location(id=row.location_id or uuid.uuid4(), name=row.location, slug=row.slug)
+        taken_ids.add(missing[row.slug].id)
+    if not missing:
+        return locations, set()
+
+    Location.objects.bulk_create(missing.values(), ignore_conflicts=True)
+    # read back, a concurrent import may have created some of them first
+    locations = {loc.slug: loc for loc in Location.objects.filter(slug__in=slugs)}
+    created = {loc.id for slug, loc in missing.items() if slug in locations and locations[slug].id == loc.id}
+    return locations, created
+
+
+def _location_errors(row: _Row, location: Location | None) -> list[str]:
+    if location is None:
+        return ["location_id: used by another location"]
+    if row.location_id and row.location_id != location.id:
+        return [f"location_id: '{row.slug}' has id {location.id}"]
+    return []
+
+
+def _sensor_errors(
+    row: _Row,
+    key: tuple[uuid.UUID, str],
+    existing: dict[tuple[uuid.UUID, str], uuid.UUID],
+    first_row: dict[tuple[uuid.UUID, str], int],
+    taken_ids: set[uuid.UUID],
+) -> list[str]:
+    if key in existing:
+        if row.sensor_id and row.sensor_id != existing[key]:
+            return [f"sensor_id: '{row.sensor}' has id {existing[key]}"]
+        return []
+    if key in first_row:
+        return [f"sensor: duplicate of row {first_row[key]}"]
+    if row.sensor_id in taken_ids:
+        return ["sensor_id: used by another sensor"]
+    return []
+
+
+def _create_sensors(new_sensors: dict[int, Sensor], statuses: dict[int, RowResult]) -> list[Sensor]:
+    """
+    Insert the new sensors, by the index of their row, and return those that
+    were. The rows of sensors a concurrent import created first are rejected.
+    """
+    if not new_sensors:
+        return []
+    # the unique constraint still guards against a concurrent import of the same sensors
+    Sensor.objects.bulk_create(new_sensors.values(), ignore_conflicts=True)
+    ids = [s.id for s in new_sensors.values()]
+    stored = set(Sensor.objects.filter(id__in=ids).values_list("id", "location_id", "name"))
+    inserted = []
+    for index, sensor in new_sensors.items():
+        if (sensor.id, sensor.location_id, sensor.name) in stored:
+            inserted.append(sensor)
+        else:
+            statuses[index] = RowResult(index, "rejected", ["sensor: created by a concurrent import"])
+    return inserted
+
+
+def _cache_import(sensors: list[Sensor]) -> None:
+    bump_fleet_version()
+    identity = get_identity_cache()
+    for sensor in sensors:
+        identity.remember(sensor.id, sensor.location_id)
+
+
+@transaction.atomic
+def import_fleet(raw_rows: Iterable[object]) -> FleetImport:
+    """Create the locations and sensors of the rows that don't exist yet, with a status per row."""
+    statuses: dict[int, RowResult] = {}
+    rows: list[_Row] = []
+    for index, raw in enumerate(raw_rows):
+        row, errors = _validate(index, raw)
+        if row is None:
+            statuses[index] = RowResult(index, "rejected", errors)
+        else:
+            rows.append(row)
+
+    locations, created_locations = _resolve_locations(rows)
+
+    # the existing sensors of these locations in one query
+    existing = {
+        (location_id, name): pk
+        for pk, location_id, name in Sensor.objects.filter(location__in=locations.values()).values_list(
+            "id", "location_id", "name"
+        )
+    }
+    given_ids = {row.sensor_id for row in rows if row.sensor_id}
+    taken_ids = set(Sensor.objects.filter(id__in=given_ids).values_list("id", flat=True)) if given_ids else set()
+
+    new_sensors: dict[int, Sensor] = {}
+    first_row: dict[tuple[uuid.UUID, str], int] = {}
+    for row in rows:
+        location = locations.get(row.slug)
+        errors = _location_errors(row, location)
+        if errors:
+            statuses[row.index] = RowResult(row.index, "rejected", errors)
+            continue
+        if not row.sensor:
+            statuses[row.index] = RowResult(row.index, "created" if location.id in created_locations else "exists")
+            continue
+
+        key = (location.id, row.sensor)
+        errors = _sensor_errors(row, key, existing, first_row, taken_ids)
+        if errors:
+            statuses[row.index] = RowResult(row.index, "rejected", errors)
+        elif key in existing:
+            statuses[row.index] = RowResult(row.index, "exists")
+        else:
+            first_row[key] = row.index
+            sensor_id = row.sensor_id or uuid.uuid4()
+            new_sensors[row.index] = Sensor(
+                id=sensor_id, name=row.sensor, location=location, description=row.description
+            )
+            statuses[row.index] = RowResult(row.index, "created")
+
+    inserted = _create_sensors(new_sensors, statuses)
+    if created_locations or inserted:
+        # the caches only learn about rows once they are committed
+        transaction.on_commit(lambda: _cache_import(inserted))
+
+    return FleetImport(
+        locations_created=len(created_locations),
+        sensors_created=len(inserted),
+        results=[statuses[index] for index in sorted(statuses)],
+    )
+
+
+def export_rows() -> Iterator[dict[str, str]]:
+    """Every location and sensor as import rows, read in chunks so the fleet is never held in memory."""
+    rows = (
+        Location.objects.order_by("name", "id", "sensors__name")
+        .values_list("name", "id", "sensors__name", "sensors__id", "sensors__description")
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    for location, location_id, sensor, sensor_id, description in rows:
+        yield {
+            "location": location,
+            "location_id": str(location_id),
+            "sensor": sensor or "",
+            "sensor_id": str(sensor_id) if sensor_id else "",
+            "description": description or "",
+        }
+
+
+def stream_csv(rows: Iterable[dict[str, str]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FLEET_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
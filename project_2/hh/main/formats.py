@@ -0,0 +1,147 @@
+import io
+import sys
+import uuid
+from array import array
+from collections.abc import Sequence
+from typing import Any
+
+from django.http import HttpRequest
+
+from .renderers import dumps
+
+try:
+    import msgpack
+except ImportError:  # MessagePack isn't offered
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow IPC isn't offered
+    pa = None
+
+# Response formats of the list endpoints and GET /api/data/, picked from the Accept header
+# - JSON: the default, also for clients sending no Accept header or */*
+# - MessagePack: the same structure as the JSON, UUIDs as strings and datetimes
+#   as MessagePack timestamps
+# - Arrow IPC stream: one record batch with a column per field, read by pandas,
+#   polars or DuckDB without parsing a value at a time. The data series' other
+#   fields are in the schema metadata.
+# - packed (GET /api/data/ only): one little-endian int32 record per bucket
+#   (seconds since start, min, max, avg, count), the temperatures as scaled
+#   integers, value = significand * 10^-2 like the sensor wire format of
+#   project_1/p2 (<ii). Start and bucket are in the X-Series-* headers.
+# A format whose library isn't installed isn't offered.
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+PACKED = "application/vnd.hh.packed"
+
+LIST_FORMATS = (JSON, MSGPACK, ARROW)
+SERIES_FORMATS = (JSON, MSGPACK, ARROW, PACKED)
+
+PACKED_EXPONENT = -2
+PACKED_FIELDS = ("offset", "min", "max", "avg", "count")
+
+
+class NotAcceptableError(Exception):
+    def __init__(self, offered: Sequence[str]) -> None:
+        super().__init__(f"Not acceptable, available: {', '.join(offered)}")
+
+
+def offered(media_types: Sequence[str]) -> list[str]:
+    missing = {MSGPACK: msgpack is None, ARROW: pa is None}
+    return [media_type for media_type in media_types if not missing.get(media_type)]
+
+
+def negotiate(request: HttpRequest, media_types: Sequence[str] = LIST_FORMATS) -> str:
+    media_types = offered(media_types)
+    # the first type wins when the client accepts several equally (e.g. */*)
+    media_type = request.get_preferred_type(media_types)
+    if media_type is None:
+        raise NotAcceptableError(media_types)
+    return media_type
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    msg = f"Object of type {type(obj).__name__} is not MessagePack serializable"
+    raise TypeError(msg)
+
+
+def _msgpack(data: Any) -> bytes:
+    return msgpack.packb(data, default=_msgpack_default, datetime=True)
+
+
+def _arrow_ipc(table: "pa.Table") -> bytes:
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def encode_rows(rows: list[dict], fields: Sequence[str], media_type: str) -> bytes:
+    """A list endpoint's rows (string and UUID values) in media_type."""
+    if media_type == MSGPACK:
+        return _msgpack(rows)
+    if media_type == ARROW:
+        columns = {field: [str(row[field]) for row in rows] for field in fields}
+        return _arrow_ipc(pa.table(columns, schema=pa.schema([(field, pa.string()) for field in fields])))
+    return dumps(rows)
+
+
+def encode_series(series: dict, media_type: str) -> bytes:
+    """A DataSeries as a dict in media_type, JSON is left to the API's renderer."""
+    if media_type == MSGPACK:
+        return _msgpack(series)
+    if media_type == ARROW:
+        return _arrow_series(series)
+    return _packed_series(series)
+
+
+def _arrow_series(series: dict) -> bytes:
+    points = series["points"]
+    schema = pa.schema(
+        [
+            ("time", pa.timestamp("us", tz="UTC")),
+            ("min", pa.float64()),
+            ("max", pa.float64()),
+            ("avg", pa.float64()),
+            ("count", pa.int64()),
+        ],
+        metadata={
+            key: str(series[key]) if series[key] is not None else ""
+            for key in ("sensor_id", "location_id", "start", "end", "bucket")
+        },
+    )
+    columns = [[point[field.name] for point in points] for field in schema]
+    return _arrow_ipc(pa.table(columns, schema=schema))
+
+
+def _packed_series(series: dict) -> bytes:
+    scale = 10**-PACKED_EXPONENT
+    start = series["start"]
+    values = array("i")
+    for point in series["points"]:
+        values.extend(
+            (
+                int((point["time"] - start).total_seconds()),
+                round(point["min"] * scale),
+                round(point["max"] * scale),
+                round(point["avg"] * scale),
+                point["count"],
+            )
+        )
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def packed_headers(series: dict) -> dict[str, str]:
+    return {
+        "X-Series-Start": series["start"].isoformat(),
+        "X-Series-Bucket": str(series["bucket"]),
+        "X-Packed-Fields": ",".join(PACKED_FIELDS),
+        "X-Packed-Exponent": str(PACKED_EXPONENT),
+    }
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+
+from .models import Sensor
+
+logger = logging.getLogger(__name__)
+
+# In-process cache of valid sensor ids for the ingest path
+# Every reading names a sensor and a location. Checking both against the
+# database would cost a query per reading, so the (sensor id -> location id)
+# pairs are kept in memory:
+# - loaded in one query when the server starts (asgi.py, wsgi.py), or on first
+#   use, up to maxsize sensors
+# - bounded, least recently used sensors are evicted first
+# - unknown ids are remembered for negative_ttl seconds, so a device sending a
+#   bad id doesn't cause a query per reading either
+# - kept current by the Sensor post_save/post_delete signals (main.signals),
+#   which only reach this process: known sensors are trusted for ttl seconds,
+#   then the whole cache is loaded again, so a sensor deleted or moved by
+#   another process is accepted for at most that long. One request reloads,
+#   the others go on with the expired sensors until it is done
+
+
+def normalize_id(value: object) -> str | None:
+    try:
+        return str(value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+class SensorIdentityCache:
+    def __init__(
+        self,
+        maxsize: int,
+        negative_ttl: float,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # sensor id -> (location id, expires)
+        self._known: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._unknown: OrderedDict[str, float] = OrderedDict()
+        self._expires = 0.0  # of the last preload, nothing loaded yet
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def preload(self) -> None:
+        """Replace the known sensors with those in the database."""
+        rows = list(Sensor.objects.values_list("id", "location_id")[: self.maxsize])
+        with self._lock:
+            self._known.clear()
+            for sensor_id, location_id in rows:
+                self._store(str(sensor_id), str(location_id))
+            self._expires = self.clock() + self.ttl
+
+    def _claim_reload(self) -> bool:
+        # True for the one caller that reloads the expired cache
+        with self._lock:
+            if self._reloading or self.clock() < self._expires:
+                return False
+            self._reloading = True
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._known.clear()
+            self._unknown.clear()
+            self._expires = 0.0
+
+    def _store(self, sensor_id: str, location_id: str) -> None:
+        self._unknown.pop(sensor_id, None)
+        self._known[sensor_id] = (location_id, self.clock() + self.ttl)
+        self._known.move_to_end(sensor_id)
+        while len(self._known) > self.maxsize:
+            self._known.popitem(last=False)
+
+    def _store_unknown(self, sensor_id: str) -> None:
+        self._unknown[sensor_id] = self.clock() + self.negative_ttl
+        self._unknown.move_to_end(sensor_id)
+        while len(self._unknown) > self.maxsize:
+            self._unknown.popitem(last=False)
+
+    def remember(self, sensor_id: object, location_id: object) -> None:
+        with self._lock:
+            self._store(str(sensor_id), str(location_id))
+
+    def forget(self, sensor_id: object) -> None:
+        with self._lock:
+            self._known.pop(str(sensor_id), None)
+
+    def _cached(self, sensor_id: str) -> tuple[bool, str | None]:
+        # (found in cache, location id) without touching the database
+        known = self._known.get(sensor_id)
+        if known is not None:
+            location_id, expires = known
+            if expires > self.clock() or self._reloading:
+                self._known.move_to_end(sensor_id)
+                return True, location_id
+            del self._known[sensor_id]
+        expires = self._unknown.get(sensor_id)
+        if expires is not None:
+            if expires > self.clock():
+                return True, None
+            del self._unknown[sensor_id]
+        return False, None
+
+    def _split(self, sensor_ids: Iterable[object]) -> tuple[dict[str, str | None], set[str]]:
+        # (answers from the cache, ids to ask the database about)
+        result: dict[str, str | None] = {}
+        missing: set[str] = set()
+        with self._lock:
+            for raw in sensor_ids:
+                sensor_id = normalize_id(raw)
+                if sensor_id is None:
+                    # not even a UUID, no need to ask the database
+                    result[str(raw)] = None
+                    continue
+                found, location_id = self._cached(sensor_id)
+                if found:
+                    self.hits += 1
+                    result[sensor_id] = location_id
+                else:
+                    self.misses += 1
+                    missing.add(sensor_id)
+        return result, missing
+
+    def _resolve(self, missing: set[str], rows: dict, result: dict[str, str | None]) -> dict[str, str | None]:
+        with self._lock:
+            for sensor_id in missing:
+                location_id = rows.get(uuid.UUID(sensor_id))
+                if location_id is None:
+                    self._store_unknown(sensor_id)
+                    result[sensor_id] = None
+                else:
+                    self._store(sensor_id, str(location_id))
+                    result[sensor_id] = str(location_id)
+        return result
+
+    def lookup_many(self, sensor_ids: Iterable[object]) -> dict[str, str | None]:
+        """Location id of every sensor id (None when unknown), querying only the cache misses, at once."""
+        if self._claim_reload():
+            try:
+                self.preload()
+            finally:
+                self._reloading = False
+        result, missing = self._split(sensor_ids)
+        if not missing:
+            return result
+        rows = dict(Sensor.objects.filter(id__in=missing).values_list("id", "location_id"))
+        return self._resolve(missing, rows, result)
+
+    async def alookup_many(self, sensor_ids: Iterable[object]) -> dict[str, str | None]:
+        """lookup_many for async views, a cache hit never leaves the event loop."""
+        if self._claim_reload():
+            try:
+                await sync_to_async(self.preload)()
+            finally:
+                self._reloading = False
+        result, missing = self._split(sensor_ids)
+        if not missing:
+            return result
+        rows = {pk: loc async for pk, loc in Sensor.objects.filter(id__in=missing).values_list("id", "location_id")}
+        return self._resolve(missing, rows, result)
+
+    def lookup(self, sensor_id: object) -> str | None:
+        return next(iter(self.lookup_many([sensor_id]).values()))
+
+    def is_valid(self, sensor_id: object, location_id: object) -> bool:
+        known = self.lookup(sensor_id)
+        return known is not None and known == normalize_id(location_id)
+
+    async def ais_valid(self, sensor_id: object, location_id: object) -> bool:
+        known = next(iter((await self.alookup_many([sensor_id])).values()))
+        return known is not None and known == normalize_id(location_id)
+
+
+_cache: SensorIdentityCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_identity_cache() -> SensorIdentityCache:
+    global _cache  # noqa: PLW0603
+    with _cache_lock:
+        if _cache is None:
+            _cache = SensorIdentityCache(
+                settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_NEGATIVE_TTL, settings.IDENTITY_TTL
+            )
+        return _cache
+
+
+def preload_identity_cache() -> None:
+    """Load the sensors before the first reading arrives, called by the ASGI and WSGI entry points."""
+    if not settings.INGEST_VALIDATE_IDENTITY:
+        return
+    try:
+        get_identity_cache().preload()
+    except DatabaseError:
+        # the database isn't up yet, the first lookup loads the sensors
+        logger.warning("Preloading the sensor identity cache failed", exc_info=True)
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from helicon_hell.celery import app
+
+from main.consumers import BatchingConsumer
+
+
+class Command(BaseCommand):
+    help = "Consume the readings queue in micro-batches instead of one Celery task per reading"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--queue", default=settings.READINGS_QUEUE)
+        parser.add_argument("--batch-size", type=int, default=settings.READINGS_BATCH_SIZE)
+        parser.add_argument("--latency-ms", type=int, default=settings.READINGS_BATCH_LATENCY_MS)
+
+    def handle(self, *_args, **options) -> None:
+        consumer = BatchingConsumer(
+            app,
+            queue=options["queue"],
+            batch_size=options["batch_size"],
+            latency=options["latency_ms"] / 1000,
+        )
+        self.stdout.write(f"Consuming '{options['queue']}' in batches of up to {options['batch_size']}")
+        try:
+            consumer.run()
+        except KeyboardInterrupt:
+            consumer.stopped.set()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from main.fleet import export_rows, stream_csv
+from main.pagination import stream_json_array
+
+
+class Command(BaseCommand):
+    help = "Write every location and sensor to stdout in the import_fleet format"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--format", choices=["csv", "json"], default="csv")
+
+    def handle(self, *_args, **options) -> None:
+        if options["format"] == "csv":
+            for chunk in stream_csv(export_rows()):
+                self.stdout.write(chunk, ending="")
+        else:
+            for chunk in stream_json_array(export_rows()):
+                self.stdout.write(chunk.decode(), ending="")
+            self.stdout.write("")
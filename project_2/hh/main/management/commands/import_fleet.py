@@ -0,0 +1,36 @@
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from main.fleet import import_fleet, parse_csv, parse_json
+
+
+class Command(BaseCommand):
+    help = "Create locations and sensors in bulk from a CSV or JSON file (location, sensor, description and ids)"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", help="CSV or JSON file, - for stdin")
+        parser.add_argument("--format", choices=["csv", "json"], help="default: from the file extension, csv for stdin")
+
+    def handle(self, *_args, **options) -> None:
+        path = options["path"]
+        fmt = options["format"] or ("json" if path.endswith(".json") else "csv")
+        try:
+            text = sys.stdin.read() if path == "-" else Path(path).read_text(encoding="utf-8-sig")
+            rows = list(parse_csv(text)) if fmt == "csv" else parse_json(text)
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError, TypeError) as err:
+            msg = f"Can't read {path}: {err}"
+            raise CommandError(msg) from err
+
+        result = import_fleet(rows)
+        for row in result.results:
+            if row.status == "rejected":
+                # CSV: line number in the file (1 based, after the header), JSON: index in the array
+                where = f"line {row.index + 2}" if fmt == "csv" else f"item {row.index}"
+                self.stderr.write(f"{where}: {'; '.join(row.errors)}")
+        self.stdout.write(
+            f"Created {result.locations_created} locations and {result.sensors_created} sensors, "
+            f"{result.count('exists')} rows already existed, {result.count('rejected')} rejected"
+        )
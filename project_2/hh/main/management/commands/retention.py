@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from main.models import Location, RetentionPolicy
+from main.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = "List, change and apply the retention policies of raw readings"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        actions = parser.add_subparsers(dest="action", required=True)
+
+        actions.add_parser("list", help="Show the policy of every location")
+
+        set_policy = actions.add_parser("set", help="Keep raw readings of a location for a number of days")
+        set_policy.add_argument("location", help="location slug")
+        set_policy.add_argument("--keep-days", type=int, required=True)
+        set_policy.add_argument("--no-archive", action="store_true", help="delete without exporting first")
+
+        unset_policy = actions.add_parser("unset", help="Fall back to READINGS_RETENTION_DAYS for a location")
+        unset_policy.add_argument("location", help="location slug")
+
+        apply = actions.add_parser("apply", help="Archive, delete and compress readings now")
+        apply.add_argument("--dry-run", action="store_true", help="only count the readings that would be deleted")
+
+    def handle(self, *_args, **options) -> None:
+        getattr(self, f"handle_{options['action']}")(**options)
+
+    def _location(self, slug: str) -> Location:
+        try:
+            return Location.objects.get(slug=slug)
+        except Location.DoesNotExist as err:
+            msg = f"Location '{slug}' does not exist"
+            raise CommandError(msg) from err
+
+    def handle_list(self, **_options) -> None:
+        default = settings.READINGS_RETENTION_DAYS
+        policies = {p.location_id: p for p in RetentionPolicy.objects.all()}
+        for location in Location.objects.order_by("name"):
+            policy = policies.get(location.id)
+            if policy is not None:
+                archive = "archive" if policy.archive else "no archive"
+                self.stdout.write(f"{location.slug}: {policy.keep_raw_days} days, {archive}")
+            else:
+                self.stdout.write(f"{location.slug}: {f'{default} days' if default else 'forever'} (default)")
+
+    def handle_set(self, **options) -> None:
+        if options["keep_days"] < 1:
+            msg = "--keep-days must be at least 1"
+            raise CommandError(msg)
+        location = self._location(options["location"])
+        RetentionPolicy.objects.update_or_create(
+            location=location,
+            defaults={"keep_raw_days": options["keep_days"], "archive": not options["no_archive"]},
+        )
+        self.stdout.write(f"{location.slug}: {options['keep_days']} days")
+
+    def handle_unset(self, **options) -> None:
+        location = self._location(options["location"])
+        RetentionPolicy.objects.filter(location=location).delete()
+        self.stdout.write(f"{location.slug}: default")
+
+    def handle_apply(self, **options) -> None:
+        run = apply_retention(dry_run=options["dry_run"])
+        prefix = "Would delete" if run.dry_run else "Deleted"
+        self.stdout.write(
+            f"{prefix} {run.rows_deleted} readings, archived {run.rows_archived}, "
+            f"dropped {run.chunks_dropped} chunks, compressed {run.chunks_compressed}"
+            + (f", reclaimed {run.bytes_reclaimed} bytes" if run.bytes_reclaimed is not None else "")
+        )
@@ -0,0 +1,86 @@
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Connection pool metrics of this process, served by GET /api/metrics/pools/
+# - broker: time requests waited for a producer of the shared pool (main.publish)
+# - broker_publish: time publishes took until the broker confirmed them, and failures
+# - spool_publish: the same for the publishes of the spool drainer (main.spool),
+#   kept apart so admission control (main.ratelimit) samples requests only
+# - databases: with DATABASE_POOL the psycopg pool's own counters (requests,
+#   time waited for a connection, connections opened), otherwise the number of
+#   connections opened, which stays flat while persistent connections are reused
+
+
+class WaitStats:
+    """Count, total and maximum of the waits for a pooled resource, thread safe."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+            self.failed = 0
+            self.failed_total = 0.0
+
+    def record(self, seconds: float, *, failed: bool = False) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.failed += failed
+            self.failed_total += seconds if failed else 0.0
+
+    def succeeded(self) -> tuple[int, float]:
+        """Count and total seconds of the waits that didn't fail."""
+        with self._lock:
+            return self.count - self.failed, self.total - self.failed_total
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.count,
+                "failed": self.failed,
+                "wait_ms_total": round(self.total * 1000, 3),
+                "wait_ms_mean": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+                "wait_ms_max": round(self.max * 1000, 3),
+            }
+
+
+broker_wait = WaitStats()
+broker_publish = WaitStats()
+spool_wait = WaitStats()
+spool_publish = WaitStats()
+connections_opened: Counter[str] = Counter()
+
+
+@receiver(connection_created)
+def count_connection(connection: BaseDatabaseWrapper, **_kwargs) -> None:
+    connections_opened[connection.alias] += 1
+
+
+def database_stats(alias: str) -> dict[str, object]:
+    stats: dict[str, object] = {"connections_opened": connections_opened[alias]}
+    # the psycopg pool of the postgresql backend, only there with DATABASE_POOL
+    pool = getattr(connections[alias], "pool", None)
+    if pool is not None:
+        stats["pool"] = pool.get_stats()
+    return stats
+
+
+def pool_stats() -> dict[str, object]:
+    return {
+        "broker": broker_wait.snapshot(),
+        "broker_publish": broker_publish.snapshot(),
+        "spool_wait": spool_wait.snapshot(),
+        "spool_publish": spool_publish.snapshot(),
+        "databases": {alias: database_stats(alias) for alias in connections},
+    }
@@ -0,0 +1,95 @@
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBase
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+# Compression of API responses, zstd or gzip, whichever the client prefers in
+# Accept-Encoding (zstd on a tie, it compresses about as well at a fraction of
+# gzip's CPU time). zstd needs the zstandard package.
+# Only paths under COMPRESS_PATHS are compressed: the API holds no secrets, the
+# pages carry CSRF tokens that compression would expose to BREACH. Event streams
+# are left alone, every event has to reach the browser as it is sent.
+
+MIN_LENGTH = 200
+
+
+def accepted_encodings(header: str) -> dict[str, float]:
+    encodings = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        key, _, value = params.strip().partition("=")
+        if key.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def preferred_encoding(header: str) -> str | None:
+    accepted = accepted_encodings(header)
+    available = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+    ranked = [(accepted.get(name, accepted.get("*", 0.0)), -index, name) for index, name in enumerate(available)]
+    quality, _, name = max(ranked)
+    return name if quality > 0 else None
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request: HttpRequest, response: HttpResponseBase) -> HttpResponseBase:
+        if not request.path.startswith(tuple(settings.COMPRESS_PATHS)):
+            return response
+        if response.get("Content-Type", "").startswith("text/event-stream"):
+            return response
+        encoding = preferred_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding == "gzip":
+            return super().process_response(request, response)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if encoding == "zstd" and not response.has_header("Content-Encoding"):
+            self.zstd_compress(response)
+        return response
+
+    def zstd_compress(self, response: HttpResponseBase) -> None:
+        # GZipMiddleware.process_response with zstd
+        if response.streaming:
+            content = response.streaming_content
+            response.streaming_content = self._azstd(content) if response.is_async else self._zstd(content)
+            del response.headers["Content-Length"]
+        else:
+            if len(response.content) < MIN_LENGTH:
+                return
+            compressed = zstandard.ZstdCompressor().compress(response.content)
+            if len(compressed) >= len(response.content):
+                return
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # a compressed body only weakly matches the uncompressed one's ETag
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "zstd"
+
+    @staticmethod
+    def _zstd(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        # one zstd frame, flushed after every chunk so a slow stream isn't held back
+        compressor = zstandard.ZstdCompressor().compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+    @staticmethod
+    async def _azstd(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        compressor = zstandard.ZstdCompressor().compressobj()
+        async for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_sensor_unique_sensor_per_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reading',
+            fields=[
+                ('pk', models.CompositePrimaryKey('sensor_id', 'time', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('sensor_id', models.UUIDField()),
+                ('time', models.DateTimeField()),
+                ('location_id', models.UUIDField()),
+                ('temperature', models.FloatField()),
+                ('humidity', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location_id', 'time'], name='reading_location_time_idx')],
+            },
+        ),
+    ]
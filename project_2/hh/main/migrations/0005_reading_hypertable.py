@@ -0,0 +1,31 @@
+# Turns main_reading into a TimescaleDB hypertable when the extension is available.
+# SQLite and plain Postgres keep the regular table, so tests run without Timescale.
+
+from django.db import migrations
+
+
+def create_hypertable(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+        cursor.execute(
+            "SELECT create_hypertable('main_reading', by_range('time', INTERVAL '1 day'),"
+            " if_not_exists => TRUE, migrate_data => TRUE)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_reading'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_hypertable, migrations.RunPython.noop, hints={'model_name': 'reading'}),
+    ]
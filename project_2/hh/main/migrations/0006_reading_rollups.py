@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_reading_hypertable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('dirty_from', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReadingRollup1d',
+            fields=[
+                ('pk', models.CompositePrimaryKey('sensor_id', 'bucket', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('sensor_id', models.UUIDField()),
+                ('bucket', models.DateTimeField()),
+                ('location_id', models.UUIDField()),
+                ('min_temperature', models.FloatField()),
+                ('max_temperature', models.FloatField()),
+                ('sum_temperature', models.FloatField()),
+                ('count', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'main_reading_1d',
+                'indexes': [models.Index(fields=['location_id', 'bucket'], name='reading_1d_location_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReadingRollup1h',
+            fields=[
+                ('pk', models.CompositePrimaryKey('sensor_id', 'bucket', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('sensor_id', models.UUIDField()),
+                ('bucket', models.DateTimeField()),
+                ('location_id', models.UUIDField()),
+                ('min_temperature', models.FloatField()),
+                ('max_temperature', models.FloatField()),
+                ('sum_temperature', models.FloatField()),
+                ('count', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'main_reading_1h',
+                'indexes': [models.Index(fields=['location_id', 'bucket'], name='reading_1h_location_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReadingRollup1m',
+            fields=[
+                ('pk', models.CompositePrimaryKey('sensor_id', 'bucket', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('sensor_id', models.UUIDField()),
+                ('bucket', models.DateTimeField()),
+                ('location_id', models.UUIDField()),
+                ('min_temperature', models.FloatField()),
+                ('max_temperature', models.FloatField()),
+                ('sum_temperature', models.FloatField()),
+                ('count', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'main_reading_1m',
+                'indexes': [models.Index(fields=['location_id', 'bucket'], name='reading_1m_location_idx')],
+            },
+        ),
+    ]
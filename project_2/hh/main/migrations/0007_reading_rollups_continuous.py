@@ -0,0 +1,81 @@
+# On Timescale the rollup tables from 0006 are replaced by continuous aggregates
+# with the same name and columns, so the ORM reads them like any other table:
+# - main_reading_1m aggregates main_reading, 1h aggregates 1m and 1d aggregates 1h
+# - real-time aggregation (materialized_only = false) adds readings not materialized yet
+# - refresh policies keep recent buckets current as readings arrive
+# Elsewhere the tables stay and main.rollups.refresh_rollups fills them.
+# Continuous aggregates can't be created inside a transaction, hence atomic = False.
+
+from django.db import migrations
+
+ROLLUPS = [
+    # view, bucket width, source, source time column, refresh start offset
+    ("main_reading_1m", "1 minute", "main_reading", "time", "1 day"),
+    ("main_reading_1h", "1 hour", "main_reading_1m", "bucket", "7 days"),
+    ("main_reading_1d", "1 day", "main_reading_1h", "bucket", "60 days"),
+]
+
+
+def is_timescale(connection):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+        return cursor.fetchone() is not None
+
+
+def aggregate_columns(source):
+    if source == "main_reading":
+        return "min(temperature), max(temperature), sum(temperature), count(*)"
+    return "min(min_temperature), max(max_temperature), sum(sum_temperature), sum(count)"
+
+
+def create_continuous_aggregates(apps, schema_editor):
+    connection = schema_editor.connection
+    if not is_timescale(connection):
+        return
+
+    with connection.cursor() as cursor:
+        for view, width, source, time_column, start_offset in ROLLUPS:
+            cursor.execute(f"DROP TABLE IF EXISTS {view}")
+            cursor.execute(
+                f"CREATE MATERIALIZED VIEW {view} (sensor_id, bucket, location_id,"
+                " min_temperature, max_temperature, sum_temperature, count)"
+                " WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS"
+                f" SELECT sensor_id, time_bucket(INTERVAL '{width}', {time_column}), location_id,"
+                f" {aggregate_columns(source)}"
+                f" FROM {source} GROUP BY 1, 2, 3 WITH NO DATA"
+            )
+            cursor.execute(f"CREATE INDEX {view}_location_idx ON {view} (location_id, bucket)")
+            cursor.execute(
+                f"SELECT add_continuous_aggregate_policy('{view}',"
+                f" start_offset => INTERVAL '{start_offset}', end_offset => INTERVAL '{width}',"
+                f" schedule_interval => INTERVAL '{width}')"
+            )
+
+
+def drop_continuous_aggregates(apps, schema_editor):
+    connection = schema_editor.connection
+    if not is_timescale(connection):
+        return
+
+    with connection.cursor() as cursor:
+        for view, *_ in reversed(ROLLUPS):
+            cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view}")
+    for model_name in ("ReadingRollup1m", "ReadingRollup1h", "ReadingRollup1d"):
+        schema_editor.create_model(apps.get_model("main", model_name))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0006_reading_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_continuous_aggregates, drop_continuous_aggregates, hints={'model_name': 'reading'}
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:47
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_reading_rollups_continuous'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetentionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('dry_run', models.BooleanField(default=False)),
+                ('rows_archived', models.BigIntegerField(default=0)),
+                ('rows_deleted', models.BigIntegerField(default=0)),
+                ('chunks_compressed', models.IntegerField(default=0)),
+                ('chunks_dropped', models.IntegerField(default=0)),
+                ('bytes_before', models.BigIntegerField(blank=True, null=True)),
+                ('bytes_after', models.BigIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RetentionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keep_raw_days', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('archive', models.BooleanField(default=True)),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='retention_policy', to='main.location')),
+            ],
+            options={
+                'verbose_name_plural': 'retention policies',
+            },
+        ),
+    ]
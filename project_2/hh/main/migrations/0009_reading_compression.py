@@ -0,0 +1,46 @@
+# Enables native compression on the main_reading hypertable where Timescale is installed.
+# Chunks are segmented per location and sensor, so deleting one location's old
+# readings and reading one sensor's range only touch their own segments.
+# main.retention compresses chunks older than READINGS_COMPRESS_AFTER_DAYS.
+
+from django.db import migrations
+
+
+def enable_compression(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            "ALTER TABLE main_reading SET (timescaledb.compress,"
+            " timescaledb.compress_segmentby = 'location_id, sensor_id',"
+            " timescaledb.compress_orderby = 'time DESC')"
+        )
+
+
+def disable_compression(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("SELECT decompress_chunk(c, if_compressed => true) FROM show_chunks('main_reading') c")
+        cursor.execute("ALTER TABLE main_reading SET (timescaledb.compress = false)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_retention'),
+    ]
+
+    operations = [
+        migrations.RunPython(enable_compression, disable_compression, hints={'model_name': 'reading'}),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:56
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_reading_compression'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='sensor_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(models.F('location'), django.db.models.functions.text.Lower('name'), name='sensor_location_name_lower_idx'),
+        ),
+    ]
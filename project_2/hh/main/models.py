@@ -2,8 +2,9 @@ import uuid
 from typing import ClassVar
 
 from django.core.exceptions import ValidationError
-from django.core.validators import MinLengthValidator
+from django.core.validators import MinLengthValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 
@@ -62,6 +63,137 @@ class Sensor(models.Model):
         constraints: ClassVar[list[models.UniqueConstraint | str]] = [
             models.UniqueConstraint(fields=["name", "location"], name="unique_sensor_per_location")
         ]
+        # the API looks sensors up by name case insensitively (Lower(name) = Lower(...)),
+        # on its own and within a location (location__slug resolves to location_id through
+        # the unique slug), which the case sensitive unique constraint can't serve
+        indexes: ClassVar[list[models.Index]] = [
+            models.Index(Lower("name"), name="sensor_name_lower_idx"),
+            models.Index("location", Lower("name"), name="sensor_location_name_lower_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name}"
+
+
+class Reading(models.Model):
+    # - One row per sensor reading, stored in a TimescaleDB hypertable partitioned on time
+    # - The primary key is (sensor, time), a sensor can't report twice for the same instant
+    # - Sensor and location are plain UUIDs instead of foreign keys so readings can
+    #   live in a different database than the fleet (Timescale vs the default db)
+    # - Rows are written in bulk by main.storage, never one save() at a time
+
+    pk = models.CompositePrimaryKey("sensor_id", "time")
+    sensor_id = models.UUIDField()
+    time = models.DateTimeField()
+    location_id = models.UUIDField()
+    temperature = models.FloatField()  # Celsius
+    humidity = models.FloatField(null=True, blank=True)  # percent
+
+    class Meta:
+        indexes: ClassVar[list[models.Index]] = [
+            models.Index(fields=["location_id", "time"], name="reading_location_time_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.sensor_id} @ {self.time}"
+
+
+class ReadingRollup(models.Model):
+    # - Temperature summary of one sensor per time bucket, kept next to the readings
+    # - sum and count instead of avg so buckets can be combined into coarser ones
+    # - On Timescale the tables are replaced by continuous aggregates (migration 0007),
+    #   elsewhere main.rollups.refresh_rollups fills them from the readings
+
+    pk = models.CompositePrimaryKey("sensor_id", "bucket")
+    sensor_id = models.UUIDField()
+    bucket = models.DateTimeField()  # start of the bucket
+    location_id = models.UUIDField()
+    min_temperature = models.FloatField()
+    max_temperature = models.FloatField()
+    sum_temperature = models.FloatField()
+    count = models.BigIntegerField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self) -> str:
+        return f"{self.sensor_id} @ {self.bucket}"
+
+
+class ReadingRollup1m(ReadingRollup):
+    class Meta:
+        db_table = "main_reading_1m"
+        indexes: ClassVar[list[models.Index]] = [
+            models.Index(fields=["location_id", "bucket"], name="reading_1m_location_idx"),
+        ]
+
+
+class ReadingRollup1h(ReadingRollup):
+    class Meta:
+        db_table = "main_reading_1h"
+        indexes: ClassVar[list[models.Index]] = [
+            models.Index(fields=["location_id", "bucket"], name="reading_1h_location_idx"),
+        ]
+
+
+class ReadingRollup1d(ReadingRollup):
+    class Meta:
+        db_table = "main_reading_1d"
+        indexes: ClassVar[list[models.Index]] = [
+            models.Index(fields=["location_id", "bucket"], name="reading_1d_location_idx"),
+        ]
+
+
+class RollupState(models.Model):
+    # - One row per readings database: the earliest reading time written since the
+    #   rollups were last refreshed, so a refresh only recomputes that range
+    # - Set by main.storage.write_readings, cleared by main.rollups.refresh_rollups
+
+    name = models.CharField(max_length=32, primary_key=True)
+    dirty_from = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} dirty from {self.dirty_from}"
+
+
+class RetentionPolicy(models.Model):
+    # - How many days raw readings of a location are kept, locations without a
+    #   policy use READINGS_RETENTION_DAYS (None keeps them forever)
+    # - Older readings are exported to READINGS_ARCHIVE_DIR first when archive is set
+    # - Rollups are never deleted, charts over old ranges keep working from them
+    # - Applied by main.retention.apply_retention (manage.py retention apply, Celery beat)
+
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, related_name="retention_policy")
+    keep_raw_days = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    archive = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name_plural = "retention policies"
+
+    def __str__(self) -> str:
+        return f"{self.location}: {self.keep_raw_days} days"
+
+
+class RetentionRun(models.Model):
+    # - One row per retention run with what it did, the storage metrics of main.retention
+    # - Sizes are summed over the readings databases, None where the database can't tell (SQLite)
+
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    dry_run = models.BooleanField(default=False)
+    rows_archived = models.BigIntegerField(default=0)
+    rows_deleted = models.BigIntegerField(default=0)
+    chunks_compressed = models.IntegerField(default=0)
+    chunks_dropped = models.IntegerField(default=0)
+    # size of the readings on Timescale, plain PostgreSQL doesn't shrink on DELETE
+    bytes_before = models.BigIntegerField(null=True, blank=True)
+    bytes_after = models.BigIntegerField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Retention run {self.started_at:%Y-%m-%d %H:%M}"
+
+    @property
+    def bytes_reclaimed(self) -> int | None:
+        if self.bytes_before is None or self.bytes_after is None:
+            return None
+        return self.bytes_before - self.bytes_after
@@ -0,0 +1,104 @@
+import base64
+import binascii
+import json
+import uuid
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+from operator import attrgetter
+
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest
+
+from .renderers import dumps
+
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+
+# Keyset pagination on (name, id)
+# An OFFSET page makes the database walk every row before it, a keyset page
+# continues right after the last row it returned:
+#   WHERE name > :name OR (name = :name AND id > :id) ORDER BY name, id LIMIT :limit
+# The id breaks ties between equal names, so no row is skipped or repeated.
+# The cursor is the (name, id) of the last row, base64 encoded so clients treat it as opaque.
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(name: str, pk: object) -> str:
+    raw = json.dumps([name, str(pk)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, pk = json.loads(raw)
+        # the ids are UUIDs, anything else would fail later when the queryset is filtered
+        pk = uuid.UUID(str(pk))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as err:
+        msg = "Invalid cursor"
+        raise InvalidCursorError(msg) from err
+    return str(name), str(pk)
+
+
+def after_cursor(queryset: QuerySet, cursor: str | None) -> QuerySet:
+    queryset = queryset.order_by("name", "id")
+    if not cursor:
+        return queryset
+    name, pk = decode_cursor(cursor)
+    return queryset.filter(Q(name__gt=name) | Q(name=name, id__gt=pk))
+
+
+# (name, id) of a model instance, pass itemgetter("name", "id") for values() rows
+RowKey = Callable[[object], tuple[str, object]]
+
+
+def keyset_page(queryset: QuerySet, limit: int, key: RowKey = attrgetter("name", "id")) -> tuple[list, str | None]:
+    """
+    One page of a queryset positioned with after_cursor() and the cursor of the
+    next page (None on the last page).
+    """
+    # fetch one extra row to know whether another page follows
+    rows = list(queryset[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+async def akeyset_page(
+    queryset: QuerySet, limit: int, key: RowKey = attrgetter("name", "id")
+) -> tuple[list, str | None]:
+    """keyset_page for async views."""
+    rows = [row async for row in queryset[: limit + 1]]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+def next_link(request: HttpRequest, cursor: str, limit: int) -> str:
+    params = request.GET.copy()
+    params["cursor"] = cursor
+    params["limit"] = str(limit)
+    return f'<{request.path}?{params.urlencode()}>; rel="next"'
+
+
+def stream_json_array(rows: Iterable[dict]) -> Iterator[bytes]:
+    # yields "[", the rows separated by commas and "]" so the array is never built in memory
+    yield b"["
+    for index, row in enumerate(rows):
+        prefix = b"," if index else b""
+        yield prefix + dumps(row)
+    yield b"]"
+
+
+async def astream_json_array(rows: AsyncIterable[dict]) -> AsyncIterator[bytes]:
+    # stream_json_array over rows read with the async ORM (QuerySet.aiterator)
+    yield b"["
+    prefix = b""
+    async for row in rows:
+        yield prefix + dumps(row)
+        prefix = b","
+    yield b"]"
@@ -0,0 +1,53 @@
+import time
+
+from celery import Task
+from django.conf import settings
+from kombu.exceptions import LimitExceeded, OperationalError
+
+from .metrics import broker_publish, broker_wait, spool_publish, spool_wait
+
+# Publishing Celery tasks from the API
+# Task.delay takes a producer, and with it a broker connection, from the app's
+# producer pool (CELERY_BROKER_POOL_LIMIT per process) and blocks while all of
+# them are in use. send() borrows the producer itself, so the time a request
+# waits for it shows up in main.metrics and a request gives up after
+# BROKER_POOL_TIMEOUT seconds instead of hanging with the pool exhausted.
+# A publish the broker doesn't confirm within BROKER_PUBLISH_TIMEOUT seconds,
+# after one reconnect, fails with BrokerBusyError as well (main.spool keeps the
+# readings of such requests). The drainer's publishes are counted apart (drain=True).
+
+PUBLISH_RETRY_POLICY = {"max_retries": 1, "interval_start": 0, "interval_step": 0.2, "interval_max": 0.2}
+
+
+class BrokerBusyError(Exception):
+    pass
+
+
+def send(task: Task, *args: object, drain: bool = False) -> None:
+    waits, publishes = (spool_wait, spool_publish) if drain else (broker_wait, broker_publish)
+    started = time.perf_counter()
+    try:
+        producer = task.app.producer_pool.acquire(block=True, timeout=settings.BROKER_POOL_TIMEOUT)
+    except LimitExceeded as err:
+        waits.record(time.perf_counter() - started, failed=True)
+        msg = "No broker connection available"
+        raise BrokerBusyError(msg) from err
+    waits.record(time.perf_counter() - started)
+
+    errors = producer.connection.connection_errors + producer.connection.channel_errors
+    started = time.perf_counter()
+    try:
+        task.apply_async(
+            args,
+            producer=producer,
+            timeout=settings.BROKER_PUBLISH_TIMEOUT,
+            confirm_timeout=settings.BROKER_PUBLISH_TIMEOUT,
+            retry_policy=PUBLISH_RETRY_POLICY,
+        )
+    except (OperationalError, OSError, *errors) as err:
+        publishes.record(time.perf_counter() - started, failed=True)
+        msg = "Broker unavailable"
+        raise BrokerBusyError(msg) from err
+    finally:
+        producer.release()
+    publishes.record(time.perf_counter() - started)
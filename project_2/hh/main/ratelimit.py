@@ -0,0 +1,457 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Protocol
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+from kombu.exceptions import LimitExceeded, OperationalError
+
+from .identity import normalize_id
+from .metrics import broker_publish, broker_wait
+from .spool import get_spool
+from .tasks import forward_to_message_queue
+
+logger = logging.getLogger(__name__)
+
+# Rate limits and admission control on ingest
+# Token buckets, one per client address (requests) and one per sensor
+# (readings): a bucket holds up to burst tokens and refills at rate tokens a
+# second, a request or reading takes one. Without a token the API answers 429
+# with Retry-After, the seconds until the next token, and a batch rejects the
+# readings of a sensor beyond its tokens per item. The limits are checked before
+# anything else, a flooding device costs neither a lookup nor a publish.
+# - local: buckets in the memory of each process, exact, the limit applies per process
+# - cache: counters in CACHES[RATE_LIMIT_CACHE] shared by all processes, a fixed
+#   window of burst / rate seconds allowing burst tokens, so up to twice the burst
+#   at a window's edge; needs a cache with an atomic incr (Redis, Memcached).
+#   The async views count with the cache's async API (aadmit, alimit_sensor)
+#
+# The admission controller sheds all ingest with 503 while the broker falls
+# behind: more than ADMISSION_MAX_QUEUE_DEPTH messages waiting in the readings
+# queue, or publishes (with the wait for a producer) taking more than
+# ADMISSION_MAX_PUBLISH_MS on average. A thread samples both every
+# ADMISSION_SAMPLE_INTERVAL seconds, requests only read the last decision.
+# The latency is the mean of the requests' successful publishes: a broker that is
+# down fails fast or times out, and while the spool (main.spool) takes the
+# readings instead requests don't publish at all, so neither sheds ingest.
+# Shedding stops the publishes the latency is measured on, an interval without
+# any counts as healthy, so ingest is retried at least every other interval.
+
+
+class RateLimitedError(Exception):
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after(seconds: float) -> str:
+    """The Retry-After header for a wait, in whole seconds and at least one."""
+    return str(max(1, math.ceil(seconds)))
+
+
+class Buckets(Protocol):
+    def take_many(self, keys: list[str]) -> list[float]: ...
+
+    async def atake_many(self, keys: list[str]) -> list[float]: ...
+
+    def clear(self) -> None: ...
+
+    def stats(self) -> dict[str, float]: ...
+
+
+class TokenBuckets:
+    """Token buckets per key in this process, the least recently used forgotten beyond max_keys."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.taken = 0
+        self.limited = 0
+
+    def take_many(self, keys: list[str]) -> list[float]:
+        """
+        Per key a token, 0.0 when it was taken, otherwise the seconds until the
+        bucket has one again. A key can come up more than once.
+        """
+        waits = []
+        with self._lock:
+            now = self.clock()
+            for key in keys:
+                tokens, updated = self._buckets.pop(key, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    tokens -= 1
+                    self.taken += 1
+                    waits.append(0.0)
+                else:
+                    self.limited += 1
+                    waits.append((1 - tokens) / self.rate)
+                self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return waits
+
+    async def atake_many(self, keys: list[str]) -> list[float]:
+        # memory only, fine to run on the event loop
+        return self.take_many(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self.taken = self.limited = 0
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "backend": "local",
+                "rate": self.rate,
+                "burst": self.burst,
+                "keys": len(self._buckets),
+                "taken": self.taken,
+                "limited": self.limited,
+            }
+
+
+class CacheBuckets:
+    """Fixed window counters per key in a Django cache, shared by the processes using it."""
+
+    def __init__(self, name: str, rate: float, burst: int, alias: str, clock: Callable[[], float] = time.time) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.alias = alias
+        self.clock = clock
+        self.window = max(1, math.ceil(burst / rate))
+        self._lock = threading.Lock()
+        self.taken = 0
+        self.limited = 0
+
+    def _window(self) -> tuple[int, float]:
+        # the current window and the seconds until the next one
+        now = self.clock()
+        window = int(now // self.window)
+        return window, (window + 1) * self.window - now
+
+    def _waits(self, counts: list[int], wait: float) -> list[float]:
+        waits = [0.0 if count <= self.burst else wait for count in counts]
+        with self._lock:
+            limited = sum(1 for w in waits if w)
+            self.limited += limited
+            self.taken += len(waits) - limited
+        return waits
+
+    def take_many(self, keys: list[str]) -> list[float]:
+        cache = caches[self.alias]
+        window, wait = self._window()
+        counts = []
+        for key in keys:
+            cache_key = f"ratelimit:{self.name}:{key}:{window}"
+            cache.add(cache_key, 0, timeout=self.window * 2)
+            try:
+                count = cache.incr(cache_key)
+            except ValueError:
+                # expired between add and incr
+                cache.add(cache_key, 1, timeout=self.window * 2)
+                count = 1
+            counts.append(count)
+        return self._waits(counts, wait)
+
+    async def atake_many(self, keys: list[str]) -> list[float]:
+        """take_many for async views, the cache round trips don't block the event loop."""
+        cache = caches[self.alias]
+        window, wait = self._window()
+        counts = []
+        for key in keys:
+            cache_key = f"ratelimit:{self.name}:{key}:{window}"
+            await cache.aadd(cache_key, 0, timeout=self.window * 2)
+            try:
+                count = await cache.aincr(cache_key)
+            except ValueError:
+                await cache.aadd(cache_key, 1, timeout=self.window * 2)
+                count = 1
+            counts.append(count)
+        return self._waits(counts, wait)
+
+    def clear(self) -> None:
+        # the counters expire with their window, only this process's counts are reset
+        with self._lock:
+            self.taken = self.limited = 0
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "backend": "cache",
+                "rate": self.rate,
+                "burst": self.burst,
+                "window": self.window,
+                "taken": self.taken,
+                "limited": self.limited,
+            }
+
+
+def make_buckets(name: str, rate: float, burst: int) -> Buckets | None:
+    if rate <= 0:
+        return None
+    if settings.RATE_LIMIT_BACKEND == "cache":
+        return CacheBuckets(name, rate, burst, settings.RATE_LIMIT_CACHE)
+    return TokenBuckets(rate, burst, settings.RATE_LIMIT_MAX_KEYS)
+
+
+_client_buckets: Buckets | None = None
+_sensor_buckets: Buckets | None = None
+_buckets_loaded = False
+_buckets_lock = threading.Lock()
+
+
+def get_buckets() -> tuple[Buckets | None, Buckets | None]:
+    """The process wide buckets per client address and per sensor, None for a limit that is off."""
+    global _client_buckets, _sensor_buckets, _buckets_loaded  # noqa: PLW0603
+    with _buckets_lock:
+        if not _buckets_loaded:
+            _client_buckets = make_buckets("client", settings.RATE_LIMIT_CLIENT_RATE, settings.RATE_LIMIT_CLIENT_BURST)
+            _sensor_buckets = make_buckets("sensor", settings.RATE_LIMIT_SENSOR_RATE, settings.RATE_LIMIT_SENSOR_BURST)
+            _buckets_loaded = True
+        return _client_buckets, _sensor_buckets
+
+
+def reset_buckets() -> None:
+    # the next get_buckets() builds them from the settings again
+    global _client_buckets, _sensor_buckets, _buckets_loaded  # noqa: PLW0603
+    with _buckets_lock:
+        _client_buckets = _sensor_buckets = None
+        _buckets_loaded = False
+
+
+def client_address(request: HttpRequest) -> str:
+    # behind a proxy REMOTE_ADDR is the proxy's, it has to set it to the client's
+    return request.META.get("REMOTE_ADDR") or "unknown"
+
+
+def sensor_key(sensor_id: object) -> str:
+    # the same bucket however the id is spelled
+    return normalize_id(sensor_id) or str(sensor_id)
+
+
+def _client_limited(wait: float) -> None:
+    if wait:
+        msg = "Too many requests from this address"
+        raise RateLimitedError(msg, wait)
+
+
+def limit_client(request: HttpRequest) -> None:
+    client, _ = get_buckets()
+    if client is not None:
+        _client_limited(*client.take_many([client_address(request)]))
+
+
+async def alimit_client(request: HttpRequest) -> None:
+    client, _ = get_buckets()
+    if client is not None:
+        _client_limited(*await client.atake_many([client_address(request)]))
+
+
+def limit_sensors(sensor_ids: list[object]) -> list[float]:
+    """Per reading 0.0 when its sensor had a token, otherwise the seconds until it has one."""
+    _, sensors = get_buckets()
+    if sensors is None:
+        return [0.0] * len(sensor_ids)
+    return sensors.take_many([sensor_key(s) for s in sensor_ids])
+
+
+def _sensor_limited(wait: float) -> None:
+    if wait:
+        msg = "Too many readings from this sensor"
+        raise RateLimitedError(msg, wait)
+
+
+def limit_sensor(sensor_id: object) -> None:
+    _sensor_limited(*limit_sensors([sensor_id]))
+
+
+async def alimit_sensor(sensor_id: object) -> None:
+    _, sensors = get_buckets()
+    if sensors is not None:
+        _sensor_limited(*await sensors.atake_many([sensor_key(sensor_id)]))
+
+
+def readings_queue_depth() -> int | None:
+    """Messages waiting in the readings queue, None when the broker can't tell."""
+    app = forward_to_message_queue.app
+    try:
+        producer = app.producer_pool.acquire(block=True, timeout=settings.BROKER_POOL_TIMEOUT)
+    except LimitExceeded:
+        return None
+    try:
+        errors = producer.connection.connection_errors + producer.connection.channel_errors
+        try:
+            return producer.channel.queue_declare(settings.READINGS_QUEUE, passive=True).message_count
+        except (OperationalError, OSError, *errors):
+            return None
+    finally:
+        producer.release()
+
+
+def spool_accepting() -> bool:
+    """Requests append their readings to the spool instead of publishing them."""
+    spool = get_spool()
+    return spool is not None and spool.pending() > 0 and spool.used_bytes() < spool.size
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_queue_depth: int,
+        max_publish_ms: float,
+        interval: float,
+        queue_depth: Callable[[], int | None] = readings_queue_depth,
+        spooling: Callable[[], bool] = spool_accepting,
+    ) -> None:
+        self.max_queue_depth = max_queue_depth
+        self.max_publish_ms = max_publish_ms
+        self.interval = interval
+        self.queue_depth = queue_depth
+        self.spooling = spooling
+        self.overloaded = False
+        self.reason = ""
+        self.depth: int | None = None
+        self.publish_ms: float | None = None
+        self.shed = 0
+        self._last = self._publishes()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _publishes() -> tuple[int, float]:
+        # successful publishes and their total seconds so far, waits for a producer included
+        count, total = broker_publish.succeeded()
+        return count, total + broker_wait.succeeded()[1]
+
+    def sample(self) -> None:
+        depth = self.queue_depth() if self.max_queue_depth else None
+        count, total = self._publishes()
+        last_count, last_total = self._last
+        self._last = (count, total)
+        publish_ms = (total - last_total) * 1000 / (count - last_count) if count > last_count else None
+
+        slow = self.max_publish_ms and publish_ms is not None and publish_ms > self.max_publish_ms
+        reason = ""
+        if depth is not None and depth > self.max_queue_depth:
+            reason = f"{depth} messages waiting in the readings queue"
+        elif slow and not self.spooling():
+            reason = f"publishes take {publish_ms:.0f} ms"
+        if reason and not self.overloaded:
+            logger.warning("Shedding ingest, %s", reason)
+        elif self.overloaded and not reason:
+            logger.info("Admitting ingest again")
+        self.depth, self.publish_ms = depth, publish_ms
+        self.overloaded, self.reason = bool(reason), reason
+
+    def admit(self) -> None:
+        if self.overloaded:
+            with self._lock:
+                self.shed += 1
+            msg = f"Overloaded, {self.reason}"
+            raise OverloadedError(msg, self.interval)
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "overloaded": self.overloaded,
+            "reason": self.reason,
+            "queue_depth": self.depth,
+            "publish_ms": None if self.publish_ms is None else round(self.publish_ms, 3),
+            "max_queue_depth": self.max_queue_depth,
+            "max_publish_ms": self.max_publish_ms,
+            "shed": self.shed,
+        }
+
+
+class Sampler(threading.Thread):
+    def __init__(self, controller: AdmissionController) -> None:
+        super().__init__(name="admission-sampler", daemon=True)
+        self.controller = controller
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.controller.interval):
+            try:
+                self.controller.sample()
+            except Exception:
+                logger.exception("Sampling the broker for admission control failed")
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+_admission: AdmissionController | None = None
+_sampler: Sampler | None = None
+_admission_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController | None:
+    """The process wide admission controller with its sampler running, None with both thresholds 0."""
+    global _admission, _sampler  # noqa: PLW0603
+    if not (settings.ADMISSION_MAX_QUEUE_DEPTH or settings.ADMISSION_MAX_PUBLISH_MS):
+        return None
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                admission = AdmissionController(
+                    settings.ADMISSION_MAX_QUEUE_DEPTH,
+                    settings.ADMISSION_MAX_PUBLISH_MS,
+                    settings.ADMISSION_SAMPLE_INTERVAL,
+                )
+                _sampler = Sampler(admission)
+                _sampler.start()
+                _admission = admission
+    return _admission
+
+
+def close_admission() -> None:
+    global _admission, _sampler  # noqa: PLW0603
+    with _admission_lock:
+        if _sampler is not None:
+            _sampler.stop()
+        _admission = _sampler = None
+
+
+def admit(request: HttpRequest) -> None:
+    """Shed while the broker falls behind, then the client's rate limit."""
+    admission = get_admission()
+    if admission is not None:
+        admission.admit()
+    limit_client(request)
+
+
+async def aadmit(request: HttpRequest) -> None:
+    """admit for async views, the admission decision is in memory, the client's limit may be in the cache."""
+    admission = get_admission()
+    if admission is not None:
+        admission.admit()
+    await alimit_client(request)
+
+
+def ingest_stats() -> dict[str, object]:
+    client, sensors = get_buckets()
+    admission = get_admission()
+    return {
+        "admission": None if admission is None else admission.stats(),
+        "rate_limits": {
+            "client": None if client is None else client.stats(),
+            "sensor": None if sensors is None else sensors.stats(),
+        },
+    }
@@ -0,0 +1,70 @@
+import functools
+import json
+from collections.abc import Callable
+from typing import Any
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpRequest
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# JSON encoding of API responses, the cached list bodies and the streamed exports
+# API_JSON_BACKEND picks the encoder: orjson or msgspec (both written in C/Rust,
+# several times faster than the json module on large lists), json, or auto for
+# the first one installed. All write compact JSON, encode UUIDs and datetimes
+# themselves and hand anything else (pydantic models, Decimal, ...) to Ninja's
+# encoder. Datetimes keep their microseconds with orjson and msgspec, the json
+# module cuts them to milliseconds.
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _default(obj: Any) -> Any:
+    return NinjaJSONEncoder().default(obj)
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, cls=NinjaJSONEncoder, separators=(",", ":")).encode()
+
+
+def installed_backends() -> list[str]:
+    modules = {"orjson": orjson, "msgspec": msgspec, "json": json}
+    return [name for name in BACKENDS if modules[name] is not None]
+
+
+@functools.cache
+def get_dumps(backend: str) -> Callable[[Any], bytes]:
+    if backend == "auto":
+        return get_dumps(installed_backends()[0])
+    if backend not in installed_backends():
+        msg = f"API_JSON_BACKEND {backend!r} is not installed, available: {', '.join(installed_backends())}"
+        raise ImproperlyConfigured(msg)
+    if backend == "orjson":
+        return functools.partial(orjson.dumps, default=_default, option=orjson.OPT_UTC_Z)
+    if backend == "msgspec":
+        return msgspec.json.Encoder(enc_hook=_default).encode
+    return _json_dumps
+
+
+def dumps(data: Any) -> bytes:
+    return get_dumps(settings.API_JSON_BACKEND)(data)
+
+
+class FastJSONRenderer(BaseRenderer):
+    """Ninja's JSONRenderer on the API_JSON_BACKEND encoder."""
+
+    media_type = "application/json"
+
+    def render(self, request: HttpRequest, data: Any, *, response_status: int) -> bytes:  # noqa: ARG002
+        return dumps(data)
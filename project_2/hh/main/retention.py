@@ -0,0 +1,206 @@
+import gzip
+import itertools
+import json
+import logging
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from .models import Reading, RetentionPolicy, RetentionRun
+from .pagination import STREAM_CHUNK_SIZE
+from .sharding import shard_aliases
+from .storage import READING_COLUMNS
+from .timescale import floor_time, is_timescale
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # archives fall back to gzipped JSON columns
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Retention of raw readings
+# At a 10 second cadence every sensor adds 8640 readings a day. A retention run:
+# 1. per location, exports readings older than its policy to READINGS_ARCHIVE_DIR
+#    (one compressed columnar file per location and day: Parquet when pyarrow is
+#    installed, gzipped JSON columns otherwise) and deletes them. Export and
+#    delete share one REPEATABLE READ snapshot on PostgreSQL, so a reading
+#    committed in between is left for the next run instead of deleted unarchived
+# 2. on Timescale, drops the chunks every policy is done with and compresses
+#    chunks older than READINGS_COMPRESS_AFTER_DAYS
+# 3. records what it did in RetentionRun, with the bytes reclaimed on Timescale.
+#    Plain PostgreSQL keeps the pages of deleted rows for reuse until VACUUM FULL,
+#    the table doesn't shrink, so there only the rows deleted are reported
+# Cutoffs are whole UTC days, so a day is always archived in one piece.
+
+DAY = 86400
+
+
+@dataclass
+class RetentionResult:
+    rows_archived: int = 0
+    rows_deleted: int = 0
+    chunks_compressed: int = 0
+    chunks_dropped: int = 0
+    bytes_before: int | None = None
+    bytes_after: int | None = None
+
+    def add_sizes(self, before: int | None, after: int | None) -> None:
+        if before is None or after is None:
+            return
+        self.bytes_before = (self.bytes_before or 0) + before
+        self.bytes_after = (self.bytes_after or 0) + after
+
+
+@dataclass
+class RetentionRule:
+    locations: Q
+    keep_raw_days: int
+    archive: bool
+
+
+def retention_rules() -> list[RetentionRule]:
+    """One rule per location with a policy, plus READINGS_RETENTION_DAYS for every other location."""
+    policies = list(RetentionPolicy.objects.all())
+    rules = [RetentionRule(Q(location_id=p.location_id), p.keep_raw_days, p.archive) for p in policies]
+    if settings.READINGS_RETENTION_DAYS:
+        others = ~Q(location_id__in=[p.location_id for p in policies])
+        rules.append(RetentionRule(others, settings.READINGS_RETENTION_DAYS, settings.READINGS_RETENTION_ARCHIVE))
+    return rules
+
+
+def readings_size(connection: BaseDatabaseWrapper) -> int | None:
+    """Bytes used by main_reading on Timescale including indexes and compressed chunks, None elsewhere."""
+    if not is_timescale(connection):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT hypertable_size('main_reading')")
+        return cursor.fetchone()[0]
+
+
+def archive_path(directory: Path, location_id: object, day: date, suffix: str) -> Path:
+    # never overwrite, readings arriving late for an archived day get a file of their own
+    folder = directory / str(location_id)
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / f"{day.isoformat()}{suffix}"
+    n = 0
+    while path.exists():
+        n += 1
+        path = folder / f"{day.isoformat()}.{n}{suffix}"
+    return path
+
+
+def write_archive(directory: Path, location_id: object, day: date, rows: list[tuple]) -> Path:
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(READING_COLUMNS)}
+    columns["sensor_id"] = [str(v) for v in columns["sensor_id"]]
+    columns["location_id"] = [str(v) for v in columns["location_id"]]
+
+    if pa is not None:
+        path = archive_path(directory, location_id, day, ".parquet")
+        pq.write_table(pa.table(columns), path, compression="zstd")
+        return path
+
+    path = archive_path(directory, location_id, day, ".json.gz")
+    columns["time"] = [t.isoformat() for t in columns["time"]]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(columns, f)
+    return path
+
+
+def archive_readings(readings: QuerySet, directory: Path) -> int:
+    """Export readings to one file per location and day, returns the number of readings written."""
+    rows = readings.order_by("location_id", "time").values_list(*READING_COLUMNS).iterator(chunk_size=STREAM_CHUNK_SIZE)
+    location_index = READING_COLUMNS.index("location_id")
+    written = 0
+    for (location_id, day), group in itertools.groupby(rows, key=lambda r: (r[location_index], r[0].date())):
+        day_rows = list(group)
+        path = write_archive(directory, location_id, day, day_rows)
+        logger.info("Archived %d readings to %s", len(day_rows), path)
+        written += len(day_rows)
+    return written
+
+
+def _timescale_maintenance(
+    connection: BaseDatabaseWrapper, drop_before: datetime | None, result: RetentionResult
+) -> None:
+    with connection.cursor() as cursor:
+        if drop_before is not None:
+            # every location is past its cutoff here, the chunks are empty
+            cursor.execute("SELECT count(*) FROM drop_chunks('main_reading', older_than => %s)", [drop_before])
+            result.chunks_dropped += cursor.fetchone()[0]
+
+        compress_before = timezone.now() - timedelta(days=settings.READINGS_COMPRESS_AFTER_DAYS)
+        cursor.execute(
+            "SELECT count(compress_chunk(c, if_not_compressed => true))"
+            " FROM show_chunks('main_reading', older_than => %s) c",
+            [compress_before],
+        )
+        result.chunks_compressed += cursor.fetchone()[0]
+
+
+def _repeatable_read(connection: BaseDatabaseWrapper) -> None:
+    # only the first statement of a transaction can set its isolation level
+    if connection.vendor == "postgresql" and not connection.savepoint_ids:
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+
+def apply_retention(now: datetime | None = None, *, dry_run: bool = False) -> RetentionRun:
+    """Apply the retention policies on every readings database and record the run."""
+    started_at = timezone.now()
+    now = now or started_at
+    rules = retention_rules()
+    result = RetentionResult()
+    directory = Path(settings.READINGS_ARCHIVE_DIR)
+
+    # chunks can only be dropped when every location has a cutoff, up to the longest one
+    drop_before = None
+    if settings.READINGS_RETENTION_DAYS:
+        drop_before = floor_time(now - timedelta(days=max(r.keep_raw_days for r in rules)), DAY)
+
+    for alias in shard_aliases():
+        connection = connections[alias]
+        before = readings_size(connection)
+
+        for rule in rules:
+            cutoff = floor_time(now - timedelta(days=rule.keep_raw_days), DAY)
+            expired = Reading.objects.using(alias).filter(rule.locations, time__lt=cutoff)
+            if dry_run:
+                result.rows_deleted += expired.count()
+                continue
+            with transaction.atomic(using=alias):
+                _repeatable_read(connection)
+                if rule.archive:
+                    result.rows_archived += archive_readings(expired, directory)
+                deleted, _ = expired.delete()
+            result.rows_deleted += deleted
+
+        if not dry_run and is_timescale(connection):
+            _timescale_maintenance(connection, drop_before, result)
+
+        result.add_sizes(before, readings_size(connection))
+
+    run = RetentionRun.objects.create(
+        started_at=started_at,
+        finished_at=timezone.now(),
+        dry_run=dry_run,
+        **{f.name: getattr(result, f.name) for f in fields(result)},
+    )
+    logger.info(
+        "Retention%s: %d readings deleted, %d archived, %d chunks dropped, %d compressed, %s bytes reclaimed",
+        " (dry run)" if dry_run else "",
+        run.rows_deleted,
+        run.rows_archived,
+        run.chunks_dropped,
+        run.chunks_compressed,
+        run.bytes_reclaimed,
+    )
+    return run
@@ -0,0 +1,139 @@
+import logging
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min, Sum
+
+from .models import Reading, ReadingRollup, ReadingRollup1d, ReadingRollup1h, ReadingRollup1m, RollupState
+from .sharding import shard_aliases
+from .timescale import EpochBucket, floor_time, is_timescale
+
+logger = logging.getLogger(__name__)
+
+# Rollups of the readings: 1 minute, 1 hour and 1 day summaries per sensor
+# - Timescale: continuous aggregates (migration 0007), maintained by Timescale itself
+# - elsewhere: tables refreshed by the refresh_reading_rollups Celery beat task.
+#   Every write of readings moves RollupState.dirty_from back to the earliest
+#   reading written, a refresh recomputes only the buckets from there on:
+#   1m from the readings, 1h from 1m, 1d from 1h.
+# main.timeseries reads the coarsest rollup that fits the requested bucket.
+
+ROLLUPS: list[tuple[int, type[ReadingRollup]]] = [
+    (60, ReadingRollup1m),
+    (3600, ReadingRollup1h),
+    (86400, ReadingRollup1d),
+]
+STATE = "readings"
+
+
+def rollup_for(seconds: int) -> type[ReadingRollup] | None:
+    """Coarsest rollup whose buckets add up exactly to buckets of `seconds`, None to read the raw readings."""
+    if not settings.READINGS_ROLLUPS:
+        return None
+    fitting = [model for width, model in ROLLUPS if seconds % width == 0]
+    return fitting[-1] if fitting else None
+
+
+def rollup_width(seconds: int) -> int:
+    """Round a bucket width up so a rollup can answer it (1234s -> 1260s, 5000s -> 7200s)."""
+    if not settings.READINGS_ROLLUPS:
+        return seconds
+    widths = [width for width, _ in ROLLUPS if width <= seconds]
+    if not widths:
+        return seconds
+    width = widths[-1]
+    return -(-seconds // width) * width
+
+
+def tracks_changes(using: str) -> bool:
+    # continuous aggregates keep track of new readings themselves
+    return not is_timescale(connections[using])
+
+
+def mark_dirty(since: datetime, using: str) -> None:
+    """Remember that readings from `since` on were written, call inside the write's transaction."""
+    states = RollupState.objects.using(using)
+    updated = states.filter(name=STATE, dirty_from__isnull=True).update(dirty_from=since)
+    updated += states.filter(name=STATE, dirty_from__gt=since).update(dirty_from=since)
+    if not updated:
+        states.get_or_create(name=STATE, defaults={"dirty_from": since})
+
+
+def _rebuild(
+    model: type[ReadingRollup], seconds: int, source: type[ReadingRollup] | None, start: datetime, using: str
+) -> int:
+    if source is None:
+        rows = (
+            Reading.objects.using(using)
+            .filter(time__gte=start)
+            .annotate(b=EpochBucket("time", seconds))
+            .values("sensor_id", "location_id", "b")
+            .annotate(t_min=Min("temperature"), t_max=Max("temperature"), t_sum=Sum("temperature"), t_count=Count("*"))
+        )
+    else:
+        rows = (
+            source.objects.using(using)
+            .filter(bucket__gte=start)
+            .annotate(b=EpochBucket("bucket", seconds))
+            .values("sensor_id", "location_id", "b")
+            .annotate(
+                t_min=Min("min_temperature"),
+                t_max=Max("max_temperature"),
+                t_sum=Sum("sum_temperature"),
+                t_count=Sum("count"),
+            )
+        )
+    rollups = [
+        model(
+            sensor_id=r["sensor_id"],
+            location_id=r["location_id"],
+            bucket=datetime.fromtimestamp(r["b"], UTC),
+            min_temperature=r["t_min"],
+            max_temperature=r["t_max"],
+            sum_temperature=r["t_sum"],
+            count=r["t_count"],
+        )
+        for r in rows
+    ]
+    # replace only the buckets recomputed: buckets whose readings were removed by
+    # main.retention have no source rows any more and must be kept
+    model.objects.using(using).bulk_create(
+        rollups,
+        batch_size=settings.READINGS_FLUSH_SIZE,
+        update_conflicts=True,
+        unique_fields=["sensor_id", "bucket"],
+        update_fields=["location_id", "min_temperature", "max_temperature", "sum_temperature", "count"],
+    )
+    return len(rollups)
+
+
+def refresh_shard(using: str) -> bool:
+    """Recompute the rollup buckets of one readings database from its dirty_from on, returns False if clean."""
+    with transaction.atomic(using=using):
+        state = RollupState.objects.using(using).select_for_update().filter(name=STATE).first()
+        if state is None or state.dirty_from is None:
+            return False
+        since = state.dirty_from
+        # cleared first, readings written while we refresh mark the state dirty again
+        state.dirty_from = None
+        state.save(using=using, update_fields=["dirty_from"])
+
+    try:
+        with transaction.atomic(using=using):
+            source = None
+            for seconds, model in ROLLUPS:
+                # from the start of the bucket containing `since`, older buckets are unchanged
+                written = _rebuild(model, seconds, source, floor_time(since, seconds), using)
+                logger.debug("Rebuilt %d %s rows on %s", written, model.__name__, using)
+                source = model
+    except Exception:
+        with transaction.atomic(using=using):
+            mark_dirty(since, using)
+        raise
+    return True
+
+
+def refresh_rollups() -> int:
+    """Refresh the rollups on every readings database without continuous aggregates, returns databases refreshed."""
+    return sum(refresh_shard(alias) for alias in shard_aliases() if tracks_changes(alias))
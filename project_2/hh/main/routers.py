@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import models
+
+from .sharding import shard_aliases, shard_for_reading
+
+# models stored on the Timescale shards instead of the default database
+TIMESERIES_MODELS = {"reading", "readingrollup1m", "readingrollup1h", "readingrollup1d", "rollupstate"}
+
+
+def is_timeseries(model: type[models.Model]) -> bool:
+    return model._meta.app_label == "main" and model._meta.model_name in TIMESERIES_MODELS  # noqa: SLF001
+
+
+class ReadingRouter:
+    """
+    Sends readings to their Timescale shard and keeps every other model in the default database.
+    Queries spanning shards go through main.sharding, which picks the nodes with .using().
+    """
+
+    def _route(self, model: type[models.Model], **hints) -> str | None:
+        if not is_timeseries(model):
+            return None
+        instance = hints.get("instance")
+        if instance is not None:
+            return shard_for_reading(instance)
+        return shard_aliases()[0]
+
+    def db_for_read(self, model: type[models.Model], **hints) -> str | None:
+        return self._route(model, **hints)
+
+    def db_for_write(self, model: type[models.Model], **hints) -> str | None:
+        return self._route(model, **hints)
+
+    def allow_relation(self, obj1: models.Model, obj2: models.Model, **_hints) -> bool | None:
+        # readings reference sensors by UUID only, never by foreign key
+        if is_timeseries(type(obj1)) or is_timeseries(type(obj2)):
+            return False
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: str | None = None, **_hints) -> bool | None:
+        timeseries = app_label == "main" and model_name in TIMESERIES_MODELS
+        if not settings.READINGS_SHARDS:
+            return None
+        if db in settings.READINGS_SHARDS:
+            return timeseries
+        return not timeseries
@@ -0,0 +1,96 @@
+import heapq
+import uuid
+import zlib
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from operator import attrgetter
+from typing import TypeVar
+
+from django.conf import settings
+from django.db import connections
+
+from .models import Reading
+
+T = TypeVar("T")
+
+# Sharding readings across Timescale nodes
+# - every reading is stored on exactly one node, picked by hashing its shard key
+#   (READINGS_SHARD_KEY: location_id or sensor_id)
+# - crc32 instead of hash() so every process picks the same node for a key
+# - a query that names the shard key goes to one node, anything else is sent to
+#   all nodes in parallel and the results are merged
+# Without READINGS_SHARDS everything stays in the default database.
+
+
+def shard_aliases() -> list[str]:
+    return list(settings.READINGS_SHARDS) or ["default"]
+
+
+def shard_for(key: uuid.UUID | str) -> str:
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return aliases[0]
+    try:
+        key_bytes = key.bytes if isinstance(key, uuid.UUID) else uuid.UUID(str(key)).bytes
+    except ValueError:
+        # not a UUID, the node it lands on refuses the reading (main.storage)
+        key_bytes = str(key).encode()
+    return aliases[zlib.crc32(key_bytes) % len(aliases)]
+
+
+def shard_for_reading(reading: Reading) -> str:
+    return shard_for(getattr(reading, settings.READINGS_SHARD_KEY))
+
+
+def shards_for(*, sensor_id: uuid.UUID | str | None = None, location_id: uuid.UUID | str | None = None) -> list[str]:
+    """Nodes that can hold readings matching the given filters."""
+    key = {"sensor_id": sensor_id, "location_id": location_id}.get(settings.READINGS_SHARD_KEY)
+    return [shard_for(key)] if key is not None else shard_aliases()
+
+
+def group_by_shard(readings: Iterable[Reading]) -> dict[str, list[Reading]]:
+    groups: dict[str, list[Reading]] = defaultdict(list)
+    for reading in readings:
+        groups[shard_for_reading(reading)].append(reading)
+    return groups
+
+
+def fan_out(query: Callable[[str], T], aliases: list[str]) -> list[T]:
+    """Run query(alias) on every node in parallel, results in the order of aliases."""
+    if len(aliases) == 1:
+        return [query(aliases[0])]
+
+    def run(alias: str) -> T:
+        try:
+            return query(alias)
+        finally:
+            # connections are per thread, don't leave one open per pool thread
+            connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=len(aliases), thread_name_prefix="shard") as pool:
+        return list(pool.map(run, aliases))
+
+
+def merge_by_time(results: Iterable[Iterable[Reading]]) -> list[Reading]:
+    # every node returns its rows ordered by time, so a k-way merge keeps the order
+    return list(heapq.merge(*results, key=attrgetter("time")))
+
+
+def readings_for_location(location_id: uuid.UUID | str, start: datetime, end: datetime) -> list[Reading]:
+    def query(alias: str) -> list[Reading]:
+        return list(
+            Reading.objects.using(alias).filter(location_id=location_id, time__gte=start, time__lt=end).order_by("time")
+        )
+
+    return merge_by_time(fan_out(query, shards_for(location_id=location_id)))
+
+
+def readings_for_sensor(sensor_id: uuid.UUID | str, start: datetime, end: datetime) -> list[Reading]:
+    def query(alias: str) -> list[Reading]:
+        return list(
+            Reading.objects.using(alias).filter(sensor_id=sensor_id, time__gte=start, time__lt=end).order_by("time")
+        )
+
+    return merge_by_time(fan_out(query, shards_for(sensor_id=sensor_id)))
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_fleet_version
+from .events import get_event_bus, publish_on_commit
+from .identity import get_identity_cache
+from .models import Location, Sensor
+
+
+# any change to the fleet invalidates the cached sensor and location lists
+# (a renamed location also changes the sensor list, so both share one version)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def invalidate_fleet_cache(**_kwargs) -> None:
+    bump_fleet_version()
+
+
+# keep the ingest identity cache in step with the sensors table
+# (deleting a location sends post_delete for each of its sensors)
+@receiver(post_save, sender=Sensor)
+def remember_sensor(instance: Sensor, **_kwargs) -> None:
+    get_identity_cache().remember(instance.id, instance.location_id)
+
+
+@receiver(post_delete, sender=Sensor)
+def forget_sensor(instance: Sensor, **_kwargs) -> None:
+    get_identity_cache().forget(instance.id)
+
+
+# live views (main.events): changed rows are pushed to the open pages
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def publish_sensor(instance: Sensor, created: bool = False, **kwargs) -> None:  # noqa: FBT001, FBT002
+    if not get_event_bus().has_subscribers("sensors"):
+        return  # nobody watching, don't load the location for the name
+    deleted = kwargs["signal"] is post_delete
+    data = {"id": str(instance.id), "created": created, "deleted": deleted}
+    if not deleted:
+        data |= {"name": instance.name, "location_id": str(instance.location_id), "location": instance.location.name}
+    publish_on_commit("sensors", data)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def publish_location(instance: Location, created: bool = False, **kwargs) -> None:  # noqa: FBT001, FBT002
+    deleted = kwargs["signal"] is post_delete
+    data = {"id": str(instance.id), "name": instance.name, "created": created, "deleted": deleted}
+    publish_on_commit("locations", data)
@@ -0,0 +1,276 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from celery import Task
+from django.conf import settings
+
+from .publish import BrokerBusyError, send
+from .tasks import forward_batch_to_message_queue
+
+logger = logging.getLogger(__name__)
+
+# Write-ahead spool for ingest
+# When a reading can't be published (no free producer, the broker down or not
+# confirming in time) it is appended to a memory-mapped file instead and the
+# request is answered as usual. While the spool holds readings new ones are
+# appended too, without trying the broker, so a broker outage costs requests one
+# failed publish and not one timeout each. A drainer thread in every process
+# replays the spool to the broker, a batch of readings per message
+# (forward_batch_to_message_queue), once it takes messages again.
+#
+# File layout, little-endian:
+#   header  magic, version, records pending, read offset, write offset
+#   record  payload length, crc32 of the payload, payload (JSON list of readings)
+# Records are appended at the write offset and consumed from the read offset.
+# Once everything is drained both offsets go back to the start, when the file
+# fills up the pending records are moved to the front. With READINGS_SPOOL_MAX_BYTES
+# pending a reading is refused (SpoolFullError, the API answers 503).
+# All processes of a host share the file: appends and offset changes hold an
+# flock on it, one drainer at a time holds an flock on the .drain file next to it.
+# The file lives in the page cache, a process crash loses nothing, a power cut
+# can lose what wasn't written back yet. A reading can be delivered twice when
+# a drainer dies between publishing a batch and consuming it.
+
+HEADER = struct.Struct("<4sIQQQ")
+RECORD = struct.Struct("<II")
+MAGIC = b"HHSP"
+VERSION = 1
+
+
+# the broker can't take the reading and neither can the spool
+class SpoolFullError(BrokerBusyError):
+    pass
+
+
+class Spool:
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._drain_fd = os.open(self.path.with_suffix(".drain"), os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            size = os.fstat(self._fd).st_size
+            if size < max_bytes:
+                os.ftruncate(self._fd, max_bytes)  # sparse, blocks are allocated as records are written
+            self._map = mmap.mmap(self._fd, max(size, max_bytes))
+            magic, *_ = HEADER.unpack_from(self._map)
+            if magic != MAGIC:
+                self._write_header(0, HEADER.size, HEADER.size)
+        self.size = len(self._map)
+        # counters of this process, for main.metrics
+        self.appended = 0
+        self.drained = 0
+        self.refused = 0
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+        os.close(self._drain_fd)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # the thread lock for this process, the flock for the others
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header(self) -> tuple[int, int, int]:
+        _, _, records, read, write = HEADER.unpack_from(self._map)
+        return records, read, write
+
+    def _write_header(self, records: int, read: int, write: int) -> None:
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, records, read, write)
+
+    def append(self, readings: list[dict]) -> None:
+        payload = json.dumps(readings, separators=(",", ":")).encode()
+        needed = RECORD.size + len(payload)
+        with self._locked():
+            records, read, write = self._header()
+            if write + needed > self.size and read > HEADER.size:
+                # move the pending records to the front
+                self._map.move(HEADER.size, read, write - read)
+                read, write = HEADER.size, HEADER.size + write - read
+                self._write_header(records, read, write)
+            if write + needed > self.size:
+                self.refused += 1
+                msg = f"Spool full ({self.size} bytes)"
+                raise SpoolFullError(msg)
+            RECORD.pack_into(self._map, write, len(payload), zlib.crc32(payload))
+            self._map[write + RECORD.size : write + needed] = payload
+            # the record is complete before the header points past it
+            self._write_header(records + 1, read, write + needed)
+            self.appended += len(readings)
+
+    def pending(self) -> int:
+        """Records waiting to be drained, read without taking the lock."""
+        return self._header()[0]
+
+    def used_bytes(self) -> int:
+        _, read, write = self._header()
+        return write - read
+
+    def peek(self, max_readings: int) -> tuple[list[dict], int, int]:
+        """
+        The oldest records, at least one and up to max_readings readings, with
+        the bytes and the number of records to consume() once they are published.
+        """
+        readings: list[dict] = []
+        with self._locked():
+            records, read, write = self._header()
+            offset = read
+            count = 0
+            while offset < write and (not readings or len(readings) < max_readings):
+                length, crc = RECORD.unpack_from(self._map, offset)
+                payload = self._map[offset + RECORD.size : offset + RECORD.size + length]
+                if offset + RECORD.size + length > write or zlib.crc32(payload) != crc:
+                    # a torn write from a crashed process, nothing after it can be trusted
+                    logger.error(
+                        "Spool %s corrupt at offset %d, dropping %d records", self.path, offset, records - count
+                    )
+                    self._write_header(count, read, offset)
+                    break
+                readings.extend(json.loads(payload))
+                offset += RECORD.size + length
+                count += 1
+        return readings, offset - read, count
+
+    def consume(self, nbytes: int, count: int) -> None:
+        # relative to the read offset, which stays valid when append() moved the records
+        with self._locked():
+            records, read, write = self._header()
+            read += nbytes
+            records -= count
+            if read >= write:
+                read = write = HEADER.size
+                records = 0
+            self._write_header(records, read, write)
+
+    def drain(self, task: Task, batch_size: int) -> int:
+        """Publish pending readings with task until the spool is empty, returns the readings sent."""
+        try:
+            fcntl.flock(self._drain_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0  # another process is draining
+        sent = 0
+        try:
+            while self.pending():
+                readings, nbytes, count = self.peek(batch_size)
+                if readings:
+                    send(task, readings, drain=True)  # BrokerBusyError stops the drain, the batch stays
+                self.consume(nbytes, count)
+                sent += len(readings)
+                self.drained += len(readings)
+        finally:
+            fcntl.flock(self._drain_fd, fcntl.LOCK_UN)
+        return sent
+
+    def stats(self) -> dict[str, object]:
+        records, read, write = self._header()
+        return {
+            "path": str(self.path),
+            "records": records,
+            "used_bytes": write - read,
+            "max_bytes": self.size,
+            "appended": self.appended,
+            "drained": self.drained,
+            "refused": self.refused,
+        }
+
+
+class Drainer(threading.Thread):
+    def __init__(self, spool: Spool, interval: float) -> None:
+        super().__init__(name="spool-drainer", daemon=True)
+        self.spool = spool
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.wake = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if not self.spool.pending():
+                continue
+            try:
+                sent = self.spool.drain(forward_batch_to_message_queue, settings.INGEST_BATCH_CHUNK_SIZE)
+            except BrokerBusyError:
+                logger.warning("Broker still unavailable, %d spooled records wait", self.spool.pending())
+            except Exception:
+                logger.exception("Draining the spool failed")
+            else:
+                if sent:
+                    logger.info("Replayed %d spooled readings", sent)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.wake.set()
+        self.join()
+
+
+_spool: Spool | None = None
+_drainer: Drainer | None = None
+_spool_lock = threading.Lock()
+
+
+def get_spool() -> Spool | None:
+    """The process wide spool with its drainer running, None with READINGS_SPOOL_PATH unset."""
+    global _spool, _drainer  # noqa: PLW0603
+    if not settings.READINGS_SPOOL_PATH:
+        return None
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                spool = Spool(settings.READINGS_SPOOL_PATH, settings.READINGS_SPOOL_MAX_BYTES)
+                _drainer = Drainer(spool, settings.READINGS_SPOOL_DRAIN_INTERVAL)
+                _drainer.start()
+                _spool = spool
+    return _spool
+
+
+def close_spool() -> None:
+    global _spool, _drainer  # noqa: PLW0603
+    with _spool_lock:
+        if _drainer is not None:
+            _drainer.stop()
+        if _spool is not None:
+            _spool.close()
+        _spool = _drainer = None
+
+
+def forward(task: Task, payload: object, readings: list[dict]) -> bool:
+    """
+    Publish payload with task, or spool its readings when the broker can't take
+    them. Returns False when the readings were spooled.
+    """
+    spool = get_spool()
+    if spool is None:
+        send(task, payload)
+        return True
+    if not spool.pending():
+        try:
+            send(task, payload)
+        except BrokerBusyError:
+            logger.warning("Broker unavailable, spooling readings")
+        else:
+            return True
+    spool.append(readings)
+    return False
+
+
+async def aforward(task: Task, payload: object, readings: list[dict]) -> bool:
+    # the publish, or the append, runs on the thread pool instead of the loop
+    return await sync_to_async(forward, thread_sensitive=False)(task, payload, readings)
@@ -0,0 +1,151 @@
+import csv
+import io
+import logging
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, connections, transaction
+from django.db.backends.utils import CursorWrapper
+from django.utils.dateparse import parse_datetime
+
+from .dedup import get_storage_keys, reading_key
+from .models import Reading
+from .rollups import mark_dirty, tracks_changes
+from .sharding import group_by_shard
+
+logger = logging.getLogger(__name__)
+
+READING_COLUMNS = ("time", "sensor_id", "location_id", "temperature", "humidity")
+# errors of the readings themselves, as opposed to an unreachable database
+REFUSED_ERRORS = (DataError, IntegrityError, ValidationError)
+
+# Bulk storage of sensor readings
+# Writing each reading with Reading.save() costs a round trip and a transaction
+# per row, so readings are written in batches instead:
+# - Postgres/Timescale: COPY ... FROM STDIN, one statement per batch
+# - other databases (SQLite in tests): bulk_create, a multi-row INSERT per batch_size rows
+# Batches come from the micro-batching consumer (main.consumers), many messages
+# at once, or from a Celery task, the readings of one message. Either way the
+# message is only acked once its readings are written, nothing is buffered
+# in memory. Each batch is split per Timescale shard (main.sharding) before it is written.
+# A reading the database refuses (REFUSED_ERRORS, e.g. a sensor id that isn't a
+# UUID) fails its whole batch, store_each writes the batch again one reading at a
+# time and drops the refused ones, retrying would never succeed.
+
+
+def parse_time(value: str | datetime) -> datetime:
+    parsed = value if isinstance(value, datetime) else parse_datetime(value)
+    if parsed is None:
+        msg = f"Invalid timestamp '{value}'"
+        raise ValueError(msg)
+    # readings without an offset are taken as UTC
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=UTC)
+
+
+def reading_from_dict(data: dict) -> Reading:
+    return Reading(
+        time=parse_time(data["time"]),
+        sensor_id=data["sensor_id"],
+        location_id=data["location_id"],
+        temperature=data["temperature"],
+        humidity=data.get("humidity"),
+    )
+
+
+def readings_from_dicts(items: Iterable[dict]) -> list[Reading]:
+    readings = []
+    for data in items:
+        try:
+            readings.append(reading_from_dict(data))
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Dropping malformed reading: %r", data)
+    return readings
+
+
+def _copy_readings(cursor: CursorWrapper, readings: list[Reading]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for r in readings:
+        # an empty unquoted field is NULL in COPY's csv format
+        writer.writerow((r.time.isoformat(), r.sensor_id, r.location_id, r.temperature, r.humidity))
+    buffer.seek(0)
+
+    sql = f"COPY main_reading ({', '.join(READING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    if hasattr(cursor, "copy_expert"):  # psycopg2
+        cursor.copy_expert(sql, buffer)
+    else:  # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _key(reading: Reading) -> bytes | None:
+    try:
+        return reading_key(reading.sensor_id, reading.time)
+    except (TypeError, ValueError):
+        return None
+
+
+def write_readings(readings: list[Reading], using: str = "default") -> None:
+    # readings written by this process lately, or repeated in the batch, are left
+    # out so a retransmitted reading doesn't fail the COPY (main.dedup)
+    recent = get_storage_keys()
+    keys = [_key(r) for r in readings]
+    duplicates = recent.duplicates(keys)
+    if any(duplicates):
+        kept = [(r, key) for r, key, duplicate in zip(readings, keys, duplicates, strict=True) if not duplicate]
+        logger.debug("Dropping %d duplicate readings", len(readings) - len(kept))
+        readings = [r for r, _ in kept]
+        keys = [key for _, key in kept]
+    if not readings:
+        return
+
+    _write_readings(readings, using)
+    recent.add(keys)
+
+
+def _write_readings(readings: list[Reading], using: str) -> None:
+    connection = connections[using]
+    # the rollups refresh from the earliest reading written, in the same transaction as the write
+    track = tracks_changes(using)
+    since = min(r.time for r in readings)
+
+    if connection.vendor == "postgresql":
+        try:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                _copy_readings(cursor, readings)
+                if track:
+                    mark_dirty(since, using)
+        except IntegrityError:
+            # COPY is all or nothing, a single duplicate (sensor, time) fails the batch
+            logger.info("COPY of %d readings hit a duplicate, retrying with INSERT", len(readings))
+        else:
+            return
+
+    with transaction.atomic(using=using):
+        Reading.objects.using(using).bulk_create(
+            readings, batch_size=settings.READINGS_FLUSH_SIZE, ignore_conflicts=True
+        )
+        if track:
+            mark_dirty(since, using)
+
+
+def store_readings(readings: list[Reading], chunk_size: int | None = None) -> None:
+    """Write readings right away, one COPY/INSERT per shard and chunk."""
+    chunk_size = chunk_size or settings.READINGS_FLUSH_SIZE
+    for alias, rows in group_by_shard(readings).items():
+        for start in range(0, len(rows), chunk_size):
+            write_readings(rows[start : start + chunk_size], using=alias)
+
+
+def store_each(readings: list[Reading]) -> int:
+    """Write readings one at a time, logging and dropping those the database refuses. Returns the number dropped."""
+    dropped = 0
+    for reading in readings:
+        try:
+            store_readings([reading])
+        except REFUSED_ERRORS:
+            logger.warning("Dropping reading of sensor %s at %s", reading.sensor_id, reading.time, exc_info=True)
+            dropped += 1
+    return dropped
@@ -1,7 +1,59 @@
 from celery import shared_task
+from django.db import InterfaceError, OperationalError
 
+from .retention import apply_retention
+from .rollups import refresh_rollups
+from .storage import REFUSED_ERRORS, readings_from_dicts, store_each, store_readings
 
-@shared_task
+# Readings tasks
+# - ignore_result: nothing reads the outcome, don't write a django-db result row per reading
+# - acks_late: the message is acked once its readings are written, not when the
+#   task starts, and reject_on_worker_lost requeues it when the worker process
+#   is killed before that, so a crash loses no reading
+# - a database that can't be reached retries the task (backing off up to a
+#   minute) instead of acking a failed write. A reading the database refuses is
+#   dropped and logged instead, a retry would fail the same way and hold up the queue
+# Each message is written on its own, python manage.py consume_readings writes
+# many messages with one COPY (main.consumers).
+READINGS_TASK_OPTIONS = {
+    "ignore_result": True,
+    "acks_late": True,
+    "reject_on_worker_lost": True,
+    "autoretry_for": (OperationalError, InterfaceError),
+    "retry_backoff": True,
+    "retry_backoff_max": 60,
+    "max_retries": None,
+}
+
+
+def _store(sensor_data: list[dict]) -> None:
+    readings = readings_from_dicts(sensor_data)
+    try:
+        store_readings(readings)
+    except REFUSED_ERRORS:
+        store_each(readings)
+
+
+@shared_task(**READINGS_TASK_OPTIONS)
 def forward_to_message_queue(sensor_data: dict) -> None:
-    # For now, just print — later this will send to RabbitMQ or Timescale
-    print(f"Received sensor data: {sensor_data}")
+    # Written to the readings hypertable before the message is acked
+    _store([sensor_data])
+
+
+@shared_task(**READINGS_TASK_OPTIONS)
+def forward_batch_to_message_queue(sensor_data: list[dict]) -> None:
+    # A chunk of readings from the batch endpoint, one COPY per shard
+    _store(sensor_data)
+
+
+# Celery beat, every ROLLUP_REFRESH_INTERVAL seconds. Only databases without
+# continuous aggregates are refreshed, and only from their oldest new reading on
+@shared_task(ignore_result=True)
+def refresh_reading_rollups() -> None:
+    refresh_rollups()
+
+
+# Celery beat, nightly
+@shared_task(ignore_result=True)
+def apply_retention_policies() -> None:
+    apply_retention()
@@ -0,0 +1,29 @@
+import pytest
+from celery.app.task import Task
+from django.core.cache import cache
+
+from main.dedup import get_ingest_keys, get_storage_keys
+from main.identity import get_identity_cache
+from main.ratelimit import reset_buckets
+
+
+# cached API responses, sensor ids, seen readings and rate limits must not leak from one test into the next
+@pytest.fixture(autouse=True)
+def clear_cache() -> None:
+    cache.clear()
+    get_identity_cache().clear()
+    get_ingest_keys().clear()
+    get_storage_keys().clear()
+    reset_buckets()
+
+
+# capture Celery messages instead of talking to RabbitMQ
+@pytest.fixture
+def published(monkeypatch) -> list[tuple[str, tuple]]:
+    sent: list[tuple[str, tuple]] = []
+
+    def fake_apply_async(self, args=None, kwargs=None, **options) -> None:
+        sent.append((self.name, tuple(args or ())))
+
+    monkeypatch.setattr(Task, "apply_async", fake_apply_async)
+    return sent
@@ -0,0 +1,59 @@
+import pytest
+
+from main.models import Location, Sensor
+
+
+@pytest.mark.django_db
+class TestListCache:
+    def test_second_request_is_served_from_cache(self, client, django_assert_num_queries):
+        loc = Location.objects.create(name="Plant A")
+        Sensor.objects.create(name="SensorA", location=loc)
+
+        first = client.get("/api/sensors/")
+        assert first.status_code == 200
+
+        with django_assert_num_queries(0):
+            second = client.get("/api/sensors/")
+        assert second.json() == first.json()
+
+        # a different filter is a different entry
+        with django_assert_num_queries(1):
+            client.get(f"/api/sensors/?location={loc.slug}")
+
+    def test_changes_invalidate_the_cache(self, client):
+        loc = Location.objects.create(name="Plant A")
+        assert client.get("/api/sensors/").json() == []
+
+        sensor = Sensor.objects.create(name="SensorA", location=loc)
+        assert [s["name"] for s in client.get("/api/sensors/").json()] == ["SensorA"]
+
+        # renaming the location changes the sensor list too
+        loc.name = "Plant B"
+        loc.save()
+        assert client.get("/api/sensors/").json()[0]["location"] == "Plant B"
+        assert client.get("/api/locations/").json()[0]["name"] == "Plant B"
+
+        sensor.delete()
+        assert client.get("/api/sensors/").json() == []
+
+    def test_etag_returns_304_until_the_list_changes(self, client, django_assert_num_queries):
+        Location.objects.create(name="Plant A")
+
+        resp = client.get("/api/locations/")
+        etag = resp["ETag"]
+        assert etag
+
+        with django_assert_num_queries(0):
+            resp = client.get("/api/locations/", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp["ETag"] == etag
+
+        Location.objects.create(name="Plant B")
+        resp = client.get("/api/locations/", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp["ETag"] != etag
+
+    def test_not_found_is_not_cached(self, client):
+        assert client.get("/api/locations/?slug=plant-a").status_code == 404
+        Location.objects.create(name="Plant A")
+        assert client.get("/api/locations/?slug=plant-a").status_code == 200
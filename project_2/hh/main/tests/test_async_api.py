@@ -0,0 +1,103 @@
+import json
+import uuid
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from main.identity import get_identity_cache
+from main.models import Location, Sensor
+
+
+@pytest.fixture
+def fleet() -> list[Sensor]:
+    plant_a = Location.objects.create(name="Plant A")
+    plant_b = Location.objects.create(name="Plant B")
+    return [
+        Sensor.objects.create(name=name, location=loc)
+        for name, loc in [("Gamma", plant_a), ("Alpha", plant_b), ("Beta", plant_a)]
+    ]
+
+
+def aget(async_client, url: str, **headers):
+    return async_to_sync(async_client.get)(url, headers=headers)
+
+
+def astream(async_client, url: str) -> list:
+    async def read() -> bytes:
+        resp = await async_client.get(url)
+        return b"".join([chunk async for chunk in resp.streaming_content])
+
+    return json.loads(async_to_sync(read)())
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("fleet")
+class TestAsyncLists:
+    @pytest.mark.parametrize(
+        "query",
+        ["", "?location=plant-a", "?sensor=alpha", "?location=plant-a&sensor=BETA", "?limit=2"],
+    )
+    def test_sensors_match_the_sync_endpoint(self, client, async_client, query):
+        sync = client.get(f"/api/sensors/{query}")
+        get_identity_cache().clear()
+
+        resp = aget(async_client, f"/api/async/sensors/{query}")
+
+        assert resp.status_code == 200
+        assert resp.json() == sync.json()
+        assert resp.get("X-Next-Cursor") == sync.get("X-Next-Cursor")
+
+    def test_sensors_pages_and_304(self, async_client):
+        first = aget(async_client, "/api/async/sensors/?limit=2")
+        second = aget(async_client, f"/api/async/sensors/?limit=2&cursor={first['X-Next-Cursor']}")
+
+        assert [s["name"] for s in first.json() + second.json()] == ["Alpha", "Beta", "Gamma"]
+        assert aget(async_client, "/api/async/sensors/?limit=2", If_None_Match=first["ETag"]).status_code == 304
+
+    def test_sensors_errors(self, async_client):
+        assert aget(async_client, "/api/async/sensors/?location=nowhere").status_code == 404
+        assert aget(async_client, "/api/async/sensors/?cursor=%%%").status_code == 422
+
+    def test_streamed_sensors(self, async_client):
+        rows = astream(async_client, "/api/async/sensors/?stream=true")
+        assert [r["name"] for r in rows] == ["Alpha", "Beta", "Gamma"]
+
+    def test_locations(self, client, async_client):
+        assert aget(async_client, "/api/async/locations/").json() == client.get("/api/locations/").json()
+        assert aget(async_client, "/api/async/locations/?slug=plant-b").json()[0]["name"] == "Plant B"
+        assert aget(async_client, "/api/async/locations/?slug=nowhere").status_code == 404
+        assert [r["slug"] for r in astream(async_client, "/api/async/locations/?stream=true")] == ["plant-a", "plant-b"]
+
+
+@pytest.mark.django_db
+def test_async_ingest(async_client, fleet, published):
+    sensor = fleet[0]
+    get_identity_cache().clear()
+    payload = {
+        "time": "2025-10-10T12:00:00Z",
+        "sensor_id": str(sensor.id),
+        "location_id": str(sensor.location_id),
+        "temperature": 22.5,
+    }
+    post = async_to_sync(async_client.post)
+
+    resp = post("/api/async/data/", payload, content_type="application/json")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "queued"
+    assert published == [("main.tasks.forward_to_message_queue", (payload,))]
+
+    unknown = payload | {"sensor_id": str(uuid.uuid4())}
+    assert post("/api/async/data/", unknown, content_type="application/json").status_code == 422
+    assert len(published) == 1
+
+
+@pytest.mark.django_db
+def test_async_identity_check_answers_from_memory(fleet, django_assert_num_queries):
+    sensor = fleet[1]
+    cache = get_identity_cache()
+    cache.clear()
+    cache.preload()
+
+    with django_assert_num_queries(0):
+        assert async_to_sync(cache.ais_valid)(sensor.id, sensor.location_id)
+        assert not async_to_sync(cache.ais_valid)(sensor.id, fleet[0].location_id)
@@ -0,0 +1,102 @@
+import itertools
+import json
+import uuid
+
+import pytest
+from django.test import override_settings
+
+from main.models import Location, Sensor
+
+
+@pytest.fixture
+def sensor():
+    return Sensor.objects.create(name="SensorA", location=Location.objects.create(name="Plant A"))
+
+
+# a second apart, the same sensor and time would be a retransmit (main.dedup)
+SECONDS = itertools.count()
+
+
+def reading(sensor: Sensor, temperature: float = 21.5) -> dict:
+    return {
+        "time": f"2025-10-10T12:00:{next(SECONDS) % 60:02d}Z",
+        "sensor_id": str(sensor.id),
+        "location_id": str(sensor.location_id),
+        "temperature": temperature,
+    }
+
+
+@pytest.mark.django_db
+class TestBatchIngest:
+    def test_json_array_reports_per_item_status(self, client, published, sensor):
+        items = [reading(sensor, 20.0), {"time": "2025-10-10T12:00:00Z"}, reading(sensor, 22.0)]
+        resp = client.post("/api/data/batch/", data=json.dumps(items), content_type="application/json")
+        assert resp.status_code == 200
+
+        data = resp.json()
+        assert data["accepted"] == 2
+        assert data["rejected"] == 1
+        assert [r["status"] for r in data["results"]] == ["accepted", "rejected", "accepted"]
+        assert data["results"][1]["errors"]
+
+        # both valid readings travel in a single message
+        assert len(published) == 1
+        task_name, args = published[0]
+        assert task_name == "main.tasks.forward_batch_to_message_queue"
+        assert [r["temperature"] for r in args[0]] == [20.0, 22.0]
+
+    def test_unusable_times_are_rejected(self, client, published, sensor):
+        times = ["yesterday", "2025-13-01T12:00:00Z", "2025-10-10T12:00:00"]
+        items = [{**reading(sensor), "time": time} for time in times] + [reading(sensor)]
+
+        data = client.post("/api/data/batch/", items, content_type="application/json").json()
+
+        assert [r["status"] for r in data["results"]] == ["rejected", "rejected", "rejected", "accepted"]
+        assert data["results"][0]["errors"] == ["time: not an ISO 8601 timestamp"]
+        assert data["results"][1]["errors"] == ["time: not an ISO 8601 timestamp"]
+        assert data["results"][2]["errors"] == ["time: needs a UTC offset, e.g. 2025-10-10T12:00:00Z"]
+        assert len(published[0][1][0]) == 1
+
+    @pytest.mark.usefixtures("published")
+    def test_ndjson_body(self, client, sensor):
+        body = "\n".join([json.dumps(reading(sensor, 1.0)), "not json", "", json.dumps(reading(sensor, 2.0))])
+        resp = client.post("/api/data/batch/", data=body, content_type="application/x-ndjson")
+        assert resp.status_code == 200
+
+        data = resp.json()
+        assert data["accepted"] == 2
+        assert data["results"][1]["status"] == "rejected"
+
+    @override_settings(INGEST_BATCH_CHUNK_SIZE=2)
+    def test_accepted_readings_are_chunked(self, client, published, sensor):
+        items = [reading(sensor, float(i)) for i in range(5)]
+        resp = client.post("/api/data/batch/", data=json.dumps(items), content_type="application/json")
+        assert resp.status_code == 200
+        assert [len(args[0]) for _, args in published] == [2, 2, 1]
+
+    @override_settings(INGEST_BATCH_MAX_ITEMS=2)
+    def test_too_many_items_and_malformed_body(self, client, published, sensor):
+        items = [reading(sensor) for _ in range(3)]
+        resp = client.post("/api/data/batch/", data=json.dumps(items), content_type="application/json")
+        assert resp.status_code == 413
+
+        resp = client.post("/api/data/batch/", data="{not json", content_type="application/json")
+        assert resp.status_code == 400
+
+        resp = client.post("/api/data/batch/", data=json.dumps(reading(sensor)), content_type="application/json")
+        assert resp.status_code == 422
+        assert published == []
+
+    def test_unknown_sensors_are_rejected_per_item(self, client, published, sensor):
+        other_location = Location.objects.create(name="Plant B")
+        wrong_location = {**reading(sensor), "location_id": str(other_location.id)}
+        unknown_sensor = {**reading(sensor), "sensor_id": str(uuid.uuid4())}
+        not_a_uuid = {**reading(sensor), "sensor_id": "sensor-1"}
+
+        items = [reading(sensor), wrong_location, unknown_sensor, not_a_uuid]
+        resp = client.post("/api/data/batch/", data=json.dumps(items), content_type="application/json")
+
+        data = resp.json()
+        assert [r["status"] for r in data["results"]] == ["accepted", "rejected", "rejected", "rejected"]
+        assert data["accepted"] == 1
+        assert len(published[0][1][0]) == 1
@@ -0,0 +1,98 @@
+import uuid
+
+import pytest
+
+from main.consumers import ReadingBatcher, process_batch
+from main.models import Reading
+from main.tasks import forward_batch_to_message_queue, forward_to_message_queue
+
+LOCATION = str(uuid.uuid4())
+
+
+class FakeMessage:
+    def __init__(self, tag: int, task: str, args: list) -> None:
+        self.delivery_tag = tag
+        self.headers = {"task": task}
+        self.body = (args, {}, {})
+        self.state = "RECEIVED"
+        self.multiple = False
+
+    def decode(self):
+        return self.body
+
+    def ack(self, *, multiple=False):
+        self.state = "ACK"
+        self.multiple = multiple
+
+    def reject(self):
+        self.state = "REJECTED"
+
+    def requeue(self):
+        self.state = "REQUEUED"
+
+
+def reading(second: int) -> dict:
+    return {
+        "time": f"2025-10-10T12:00:{second:02d}Z",
+        "sensor_id": str(uuid.uuid4()),
+        "location_id": LOCATION,
+        "temperature": 20.0,
+    }
+
+
+def test_batcher_is_ready_when_full_or_late():
+    now = [0.0]
+    batcher = ReadingBatcher(batch_size=3, latency=0.2, clock=lambda: now[0])
+    assert batcher.time_left() is None
+
+    batcher.add(FakeMessage(1, "x", []))
+    assert not batcher.ready()
+    now[0] = 0.25
+    assert batcher.ready()
+
+    batcher.take()
+    for tag in range(3):
+        batcher.add(FakeMessage(tag, "x", []))
+    assert batcher.ready()
+    assert len(batcher.take()) == 3
+    assert len(batcher) == 0
+
+
+@pytest.mark.django_db
+def test_process_batch_writes_once_and_acks_together():
+    single = FakeMessage(1, forward_to_message_queue.name, [reading(0)])
+    batch = FakeMessage(2, forward_batch_to_message_queue.name, [[reading(1), reading(2)]])
+    unknown = FakeMessage(3, "main.tasks.something_else", [{}])
+
+    assert process_batch([single, batch, unknown]) == 3
+    assert Reading.objects.count() == 3
+
+    # only the highest valid tag is acked, with multiple=True covering the rest
+    assert batch.state == "ACK"
+    assert batch.multiple
+    assert single.state == "RECEIVED"
+    assert unknown.state == "REJECTED"
+
+
+@pytest.mark.django_db
+def test_process_batch_requeues_on_write_failure(monkeypatch):
+    def broken(readings):
+        raise RuntimeError
+
+    monkeypatch.setattr("main.consumers.store_readings", broken)
+    message = FakeMessage(1, forward_to_message_queue.name, [reading(0)])
+
+    with pytest.raises(RuntimeError):
+        process_batch([message])
+    assert message.state == "REQUEUED"
+
+
+@pytest.mark.django_db
+def test_process_batch_rejects_the_message_the_database_refuses():
+    good = FakeMessage(1, forward_to_message_queue.name, [reading(0)])
+    poison = FakeMessage(2, forward_batch_to_message_queue.name, [[reading(1), {**reading(2), "sensor_id": "s-1"}]])
+    later = FakeMessage(3, forward_to_message_queue.name, [reading(3)])
+
+    assert process_batch([good, poison, later]) == 2
+    assert Reading.objects.count() == 2
+    assert (good.state, poison.state, later.state) == ("ACK", "REJECTED", "ACK")
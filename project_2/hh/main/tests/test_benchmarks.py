@@ -0,0 +1,226 @@
+# Benchmarks of the API on a realistic fleet, run with:
+#   pytest main/tests/test_benchmarks.py --benchmark-only  (or --benchmark-enable)
+#   pytest main/tests/test_benchmarks.py --benchmark-autosave / --benchmark-compare  (regressions between runs)
+# BENCH_LOCATIONS and BENCH_SENSORS scale the fleet down for a quick run.
+# Seeding the fleet takes minutes, so the default run skips the module.
+# Every benchmark also asserts how many queries one call may run, so an N+1
+# fails the suite even on a small fleet.
+import itertools
+import json
+import os
+import uuid
+
+import pytest
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from main.api import SensorSchema, _sensor_items, _sensor_rows
+from main.identity import get_identity_cache
+from main.models import Location, Sensor
+from main.renderers import get_dumps, installed_backends
+
+pytest.importorskip("pytest_benchmark")
+
+LOCATIONS = int(os.environ.get("BENCH_LOCATIONS", "1000"))
+SENSORS = int(os.environ.get("BENCH_SENSORS", "100000"))
+ROUNDS = 5
+
+
+@pytest.fixture(scope="module", autouse=True)
+def benchmarks_requested(request) -> None:
+    options = request.config.option
+    if not (options.benchmark_enable or options.benchmark_only):
+        pytest.skip("benchmarks run with --benchmark-only or --benchmark-enable")
+
+
+@pytest.fixture(scope="module")
+def fleet(django_db_setup, django_db_blocker) -> list[Location]:
+    # seeded once for the module, outside the per test transactions, and removed at the end
+    with django_db_blocker.unblock():
+        locations = [Location(name=f"Location {i:04d}", slug=f"location-{i:04d}") for i in range(LOCATIONS)]
+        Location.objects.bulk_create(locations, batch_size=1000)
+        per_location = SENSORS // LOCATIONS
+        sensors = (
+            Sensor(name=f"Sensor {i:03d}", location=location) for location in locations for i in range(per_location)
+        )
+        while batch := list(itertools.islice(sensors, 5000)):
+            Sensor.objects.bulk_create(batch)
+        yield locations
+        Sensor.objects.all().delete()
+        Location.objects.all().delete()
+
+
+def uncached() -> None:
+    cache.clear()
+    get_identity_cache().clear()
+
+
+def measure(benchmark, django_assert_max_num_queries, max_queries: int, call, **pedantic):
+    # one call with the query count checked, then the timed rounds
+    with django_assert_max_num_queries(max_queries):
+        result = call()
+    benchmark.pedantic(call, rounds=ROUNDS, **pedantic)
+    return result
+
+
+@pytest.mark.django_db
+class TestBenchmarks:
+    def test_list_sensors(self, benchmark, django_assert_max_num_queries, client, fleet):
+        uncached()
+        resp = measure(benchmark, django_assert_max_num_queries, 1, lambda: client.get("/api/sensors/"), setup=uncached)
+        assert resp.status_code == 200
+        assert len(resp.json()) == len(fleet) * (SENSORS // LOCATIONS)
+
+    @pytest.mark.usefixtures("fleet")
+    def test_list_sensors_cached(self, benchmark, django_assert_max_num_queries, client):
+        client.get("/api/sensors/")
+        resp = measure(benchmark, django_assert_max_num_queries, 0, lambda: client.get("/api/sensors/"))
+        assert resp.status_code == 200
+
+    @pytest.mark.usefixtures("fleet")
+    def test_list_sensors_page(self, benchmark, django_assert_max_num_queries, client):
+        uncached()
+        resp = measure(
+            benchmark, django_assert_max_num_queries, 1, lambda: client.get("/api/sensors/?limit=100"), setup=uncached
+        )
+        assert len(resp.json()) == 100
+
+    def test_list_sensors_by_location(self, benchmark, django_assert_max_num_queries, client, fleet):
+        uncached()
+        url = f"/api/sensors/?location={fleet[LOCATIONS // 2].slug}"
+        resp = measure(benchmark, django_assert_max_num_queries, 1, lambda: client.get(url), setup=uncached)
+        assert len(resp.json()) == SENSORS // LOCATIONS
+
+    def test_list_sensors_by_location_and_name(self, benchmark, django_assert_max_num_queries, client, fleet):
+        uncached()
+        url = f"/api/sensors/?location={fleet[-1].slug}&sensor=sensor 001"
+        resp = measure(benchmark, django_assert_max_num_queries, 1, lambda: client.get(url), setup=uncached)
+        assert [s["name"] for s in resp.json()] == ["Sensor 001"]
+
+    def test_list_sensors_by_name(self, benchmark, django_assert_max_num_queries, client, fleet):
+        uncached()
+        resp = measure(
+            benchmark,
+            django_assert_max_num_queries,
+            1,
+            lambda: client.get("/api/sensors/?sensor=Sensor 000"),
+            setup=uncached,
+        )
+        assert len(resp.json()) == len(fleet)
+
+    def test_list_locations(self, benchmark, django_assert_max_num_queries, client, fleet):
+        uncached()
+        resp = measure(
+            benchmark, django_assert_max_num_queries, 1, lambda: client.get("/api/locations/"), setup=uncached
+        )
+        assert len(resp.json()) == len(fleet)
+
+    def test_location_by_slug(self, benchmark, django_assert_max_num_queries, client, fleet):
+        uncached()
+        url = f"/api/locations/?slug={fleet[-1].slug}"
+        resp = measure(benchmark, django_assert_max_num_queries, 1, lambda: client.get(url), setup=uncached)
+        assert resp.json()[0]["slug"] == fleet[-1].slug
+
+    def test_create_sensor(self, benchmark, django_assert_max_num_queries, client, fleet):
+        names = (f"New sensor {i}" for i in itertools.count())
+        slug = fleet[0].slug
+
+        def create():
+            return client.post(
+                "/api/sensors/", {"name": next(names), "location": slug}, content_type="application/json"
+            )
+
+        resp = measure(benchmark, django_assert_max_num_queries, 2, create)
+        assert resp.status_code == 201
+
+    def test_modify_sensor(self, benchmark, django_assert_max_num_queries, client, fleet):
+        slug = fleet[1].slug
+        url = f"/api/sensors/{slug}/Sensor 000/"
+        payload = {"name": "Sensor 000", "location": slug}
+
+        def modify():
+            return client.put(url, payload, content_type="application/json")
+
+        # the lookup, the new location, full_clean's location and uniqueness checks, the update
+        resp = measure(benchmark, django_assert_max_num_queries, 5, modify)
+        assert resp.status_code == 200
+
+    def test_delete_sensor(self, benchmark, django_assert_max_num_queries, client, fleet):
+        location = fleet[2]
+        names = (f"Doomed {i}" for i in itertools.count())
+
+        def make_sensor() -> tuple[tuple, dict]:
+            sensor = Sensor.objects.create(name=next(names), location=location)
+            return (f"/api/sensors/{location.slug}/{sensor.name}/",), {}
+
+        args, _ = make_sensor()
+        with django_assert_max_num_queries(3):
+            resp = client.delete(*args)
+        assert resp.status_code == 204
+        benchmark.pedantic(client.delete, setup=make_sensor, rounds=ROUNDS)
+
+    def test_receive_sensor_data(self, benchmark, django_assert_max_num_queries, client, fleet, published):
+        sensor = Sensor.objects.filter(location=fleet[3]).first()
+        payload = {
+            "time": "2025-10-10T12:00:00Z",
+            "sensor_id": str(sensor.id),
+            "location_id": str(sensor.location_id),
+            "temperature": 21.5,
+        }
+
+        def receive():
+            return client.post("/api/data/", payload, content_type="application/json")
+
+        # the first reading of a sensor looks it up, later ones are answered by the identity cache
+        get_identity_cache().clear()
+        with django_assert_max_num_queries(1):
+            receive()
+        resp = measure(benchmark, django_assert_max_num_queries, 0, receive)
+        assert resp.status_code == 200
+        assert published
+
+    @pytest.mark.usefixtures("published")
+    def test_receive_unknown_sensor(self, benchmark, django_assert_max_num_queries, client, fleet):
+        payload = {
+            "time": "2025-10-10T12:00:00Z",
+            "sensor_id": str(uuid.uuid4()),
+            "location_id": str(fleet[0].id),
+            "temperature": 21.5,
+        }
+        # loading the identity cache and the miss, after that the id is remembered as unknown
+        get_identity_cache().clear()
+        resp = measure(
+            benchmark,
+            django_assert_max_num_queries,
+            2,
+            lambda: client.post("/api/data/", payload, content_type="application/json"),
+        )
+        assert resp.status_code == 422
+
+
+# The body of the full sensor list, built the way the endpoint did before
+# serializing values() rows against the way it does now, on every JSON backend
+# installed. Both run the same single query.
+@pytest.mark.django_db
+@pytest.mark.usefixtures("fleet")
+@pytest.mark.benchmark(group="sensor list body")
+class TestSerialization:
+    def schema_objects(self) -> bytes:
+        page = Sensor.objects.select_related("location").only("id", "name", "location__name").order_by("name", "id")
+        items = [SensorSchema(id=str(s.id), name=s.name, location=s.location.name).dict() for s in page]
+        return json.dumps(items, cls=DjangoJSONEncoder).encode()
+
+    def test_schema_objects(self, benchmark, django_assert_max_num_queries):
+        body = measure(benchmark, django_assert_max_num_queries, 1, self.schema_objects)
+        assert len(json.loads(body)) == SENSORS // LOCATIONS * LOCATIONS
+
+    @pytest.mark.parametrize("backend", installed_backends())
+    def test_values_rows(self, benchmark, django_assert_max_num_queries, backend):
+        dumps = get_dumps(backend)
+
+        def values_rows() -> bytes:
+            rows = _sensor_rows(Sensor.objects.order_by("name", "id"))
+            return dumps(_sensor_items(rows, filtered=False, cursor=None))
+
+        body = measure(benchmark, django_assert_max_num_queries, 1, values_rows)
+        assert json.loads(body) == json.loads(self.schema_objects())
@@ -0,0 +1,100 @@
+import uuid
+from datetime import UTC, datetime
+
+import pytest
+from celery.app.task import Task
+from kombu.exceptions import OperationalError
+
+from main.dedup import RecentKeys, dict_key, get_storage_keys, reading_key
+from main.identity import get_identity_cache
+from main.models import Location, Reading, Sensor
+from main.storage import write_readings
+
+SENSOR = uuid.uuid4()
+
+
+def test_key_is_the_same_for_the_same_instant():
+    assert reading_key(SENSOR, "2025-10-10T12:00:00Z") == reading_key(str(SENSOR).upper(), "2025-10-10T14:00:00+02:00")
+    assert reading_key(SENSOR, "2025-10-10T12:00:00") == reading_key(SENSOR, datetime(2025, 10, 10, 12, tzinfo=UTC))
+    assert reading_key(SENSOR, "2025-10-10T12:00:00Z") != reading_key(SENSOR, "2025-10-10T12:00:00.000001Z")
+    assert dict_key({"sensor_id": "sensor-1", "time": "2025-10-10T12:00:00Z"}) is None
+
+
+def test_recent_keys_flag_repeats_and_forget_the_oldest():
+    recent = RecentKeys(capacity=2)
+    a, b, c = (reading_key(SENSOR, f"2025-10-10T12:00:0{n}Z") for n in range(3))
+
+    assert recent.duplicates([a, b, a, None, None]) == [False, False, True, False, False]
+    recent.add([a, b, c])
+
+    assert len(recent) == 2
+    assert recent.duplicates([a, b, c]) == [False, True, True]
+    assert recent.stats() == {"keys": 2, "capacity": 2, "checked": 6, "duplicates": 3, "hit_rate": 0.5}
+
+
+@pytest.mark.django_db
+class TestIngest:
+    @pytest.fixture
+    def payload(self) -> dict:
+        loc = Location.objects.create(name="Plant A")
+        sensor = Sensor.objects.create(name="SensorA", location=loc)
+        get_identity_cache().clear()
+        return {
+            "time": "2025-10-10T12:00:00Z",
+            "sensor_id": str(sensor.id),
+            "location_id": str(loc.id),
+            "temperature": 21.5,
+        }
+
+    def test_retransmit_is_acknowledged_once_forwarded(self, client, published, payload):
+        first = client.post("/api/data/", payload, content_type="application/json")
+        retransmit = client.post("/api/data/", payload, content_type="application/json")
+
+        assert first.json()["status"] == "queued"
+        assert retransmit.status_code == 200
+        assert retransmit.json()["status"] == "duplicate"
+        assert len(published) == 1
+
+        ingest = client.get("/api/metrics/dedup/").json()["ingest"]
+        assert ingest["checked"] == 2
+        assert ingest["hit_rate"] == 0.5
+
+    def test_batch_marks_repeats(self, client, published, payload):
+        client.post("/api/data/", payload, content_type="application/json")
+        later = {**payload, "time": "2025-10-10T12:00:10Z"}
+
+        resp = client.post("/api/data/batch/", [payload, later, later], content_type="application/json")
+
+        data = resp.json()
+        assert [r["status"] for r in data["results"]] == ["duplicate", "accepted", "duplicate"]
+        assert (data["accepted"], data["rejected"], data["duplicates"]) == (1, 0, 2)
+        assert published[-1][1][0] == [later]
+
+    def test_failed_publish_is_not_remembered(self, client, published, payload, monkeypatch):
+        def apply_async(self, args=None, kwargs=None, **options) -> None:
+            raise OperationalError(111, "Connection refused")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(Task, "apply_async", apply_async)
+            assert client.post("/api/data/", payload, content_type="application/json").status_code == 503
+
+        # the client's retry goes through
+        assert client.post("/api/data/", payload, content_type="application/json").json()["status"] == "queued"
+        assert len(published) == 1
+
+
+@pytest.mark.django_db
+def test_storage_leaves_out_readings_it_wrote():
+    def reading(second: int, temperature: float) -> Reading:
+        return Reading(
+            time=datetime(2025, 10, 10, 12, 0, second, tzinfo=UTC),
+            sensor_id=SENSOR,
+            location_id=uuid.uuid4(),
+            temperature=temperature,
+        )
+
+    write_readings([reading(0, 20.0), reading(1, 21.0), reading(1, 99.0)])
+    write_readings([reading(0, 99.0), reading(2, 22.0)])
+
+    assert list(Reading.objects.order_by("time").values_list("temperature", flat=True)) == [20.0, 21.0, 22.0]
+    assert get_storage_keys().stats()["duplicates"] == 2
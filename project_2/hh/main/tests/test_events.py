@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import uuid
+
+import pytest
+
+from main.events import EventBus, get_event_bus, publish_readings
+from main.identity import get_identity_cache
+from main.models import Location, Sensor
+from main.views import sse_messages
+
+
+@pytest.fixture
+def subscribe():
+    # subscriptions on the process wide bus, removed after the test
+    bus = get_event_bus()
+    subscriptions = []
+
+    def make(*topics: str):
+        subscriptions.append(bus.subscribe(topics))
+        return subscriptions[-1]
+
+    yield make
+    for subscription in subscriptions:
+        bus.unsubscribe(subscription)
+
+
+def test_publish_reaches_only_subscribers_of_the_topic():
+    bus = EventBus(maxsize=10)
+    readings = bus.subscribe(["readings"])
+    fleet = bus.subscribe(["sensors", "locations"])
+
+    bus.publish("readings", {"sensor_id": "a"})
+    bus.publish("locations", {"id": "b"})
+
+    assert [e.data for e in readings.get(wait=0.1)] == [{"sensor_id": "a"}]
+    assert [e.data for e in fleet.get(wait=0.1)] == [{"id": "b"}]
+    assert readings.get(wait=0.01) == []
+
+    bus.unsubscribe(readings)
+    bus.unsubscribe(fleet)
+    assert not bus.has_subscribers("readings")
+    assert bus.subscriber_count() == 0
+
+
+def test_slow_subscriber_loses_oldest_events():
+    bus = EventBus(maxsize=3)
+    subscription = bus.subscribe(["readings"])
+
+    for i in range(5):
+        bus.publish("readings", {"n": i})
+
+    assert [e.data["n"] for e in subscription.get(wait=0.1)] == [2, 3, 4]
+    assert subscription.dropped == 2
+
+
+def test_async_subscriber_receives_events_published_from_other_threads():
+    bus = EventBus(maxsize=10)
+
+    async def receive() -> list:
+        subscription = bus.subscribe(["sensors"], loop=asyncio.get_running_loop())
+        threading.Thread(target=bus.publish, args=("sensors", {"id": "x"})).start()
+        events = await subscription.aget(wait=1)
+        bus.unsubscribe(subscription)
+        return events
+
+    assert [e.data for e in asyncio.run(receive())] == [{"id": "x"}]
+
+
+def test_publish_readings_sends_latest_per_sensor(subscribe):
+    subscription = subscribe("readings")
+    sensor_id = uuid.uuid4()
+    publish_readings(
+        [
+            {"time": "2025-10-10T12:00:00Z", "sensor_id": str(sensor_id), "location_id": "l", "temperature": 20.0},
+            # the same sensor, its id written differently
+            {
+                "time": "2025-10-10T12:00:10Z",
+                "sensor_id": str(sensor_id).upper(),
+                "location_id": "l",
+                "temperature": 21,
+            },
+        ]
+    )
+
+    events = subscription.get(wait=0.1)
+    assert [(e.data["sensor_id"], e.data["temperature"]) for e in events] == [(str(sensor_id), 21)]
+    assert f"event: reading-{sensor_id}\n" in sse_messages(events[0])
+
+
+@pytest.mark.django_db
+def test_fleet_changes_are_published_after_commit(subscribe, django_capture_on_commit_callbacks):
+    subscription = subscribe("sensors", "locations")
+
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        loc = Location.objects.create(name="Plant A")
+        sensor = Sensor.objects.create(name="SensorA", location=loc)
+    assert subscription.get(wait=0.01) == []  # nothing before the commit
+
+    for callback in callbacks:
+        callback()
+    created = subscription.get(wait=0.1)
+    assert [(e.topic, e.data["created"]) for e in created] == [("locations", True), ("sensors", True)]
+    assert "event: sensor-created\n" in sse_messages(created[1])
+
+    sensor_id = sensor.id
+    with django_capture_on_commit_callbacks(execute=True):
+        loc.name = "Plant B"
+        loc.save()
+        sensor.delete()
+    renamed, deleted = subscription.get(wait=0.1)
+    message = sse_messages(renamed)
+    assert f"event: location-{loc.id}\n" in message
+    assert f"event: location-name-{loc.id}\n" in message
+    assert "Plant B" in message
+    # an empty swap removes the row
+    assert sse_messages(deleted) == f"id: {deleted.id}\nevent: sensor-{sensor_id}\ndata: \n\n"
+
+
+@pytest.mark.django_db
+def test_ingested_readings_are_published(client, subscribe, published):
+    loc = Location.objects.create(name="Plant A")
+    sensor = Sensor.objects.create(name="SensorA", location=loc)
+    get_identity_cache().clear()
+    subscription = subscribe("readings")
+
+    resp = client.post(
+        "/api/data/",
+        {"time": "2025-10-10T12:00:00Z", "sensor_id": str(sensor.id), "location_id": str(loc.id), "temperature": 22.5},
+        content_type="application/json",
+    )
+
+    assert resp.status_code == 200
+    assert published
+    assert [e.data["temperature"] for e in subscription.get(wait=0.1)] == [22.5]
+
+
+@pytest.mark.django_db
+def test_event_stream(client, settings):
+    settings.EVENTS_HEARTBEAT = 0.05
+    bus = get_event_bus()
+
+    resp = client.get("/main/events?topics=readings")
+    assert resp["Content-Type"] == "text/event-stream"
+    chunks = iter(resp.streaming_content)
+    assert next(chunks) == b"retry: 3000\n\n"
+    assert next(chunks) == b": ping\n\n"
+
+    sensor_id = str(uuid.uuid4())
+    for temperature in (20.0, 21.0):
+        bus.publish("readings", {"sensor_id": sensor_id, "location_id": "l", "time": "t", "temperature": temperature})
+    message = next(chunks).decode()
+    # both readings were waiting, only the latest is sent
+    assert message.count("event: ") == 1
+    assert "21.0 °C" in message
+
+    resp.close()
+    assert not bus.has_subscribers("readings")
@@ -0,0 +1,126 @@
+import json
+import uuid
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+
+from main.fleet import import_fleet
+from main.identity import get_identity_cache
+from main.models import Location, Sensor
+
+CSV = """location,location_id,sensor,sensor_id,description
+Plant A,,SensorA,,boiler
+Plant A,,SensorB,,
+Plant B,,,,
+Plant A,,SensorA,,again
+Plant A,,x,,
+"""
+
+
+@pytest.mark.django_db
+class TestFleetImport:
+    def test_csv_import_reports_every_row(self, client):
+        resp = client.post("/api/fleet/import/", data=CSV, content_type="text/csv")
+        assert resp.status_code == 200
+        body = resp.json()
+        assert (body["locations_created"], body["sensors_created"], body["rejected"]) == (2, 2, 2)
+        assert [r["status"] for r in body["results"]] == ["created", "created", "created", "rejected", "rejected"]
+        assert body["results"][3]["errors"] == ["sensor: duplicate of row 0"]
+        assert Sensor.objects.get(name="SensorA").description == "boiler"
+        assert Location.objects.get(name="Plant B").slug == "plant-b"
+
+        # a second import finds everything in place
+        body = client.post("/api/fleet/import/", data=CSV, content_type="text/csv").json()
+        assert (body["locations_created"], body["sensors_created"], body["existing"]) == (0, 0, 4)
+
+    def test_query_count_does_not_grow_with_rows(self, client, django_assert_max_num_queries):
+        Location.objects.create(name="Plant A")
+        rows = [{"location": "Plant A", "sensor": f"Sensor{i}"} for i in range(300)]
+        with django_assert_max_num_queries(8):
+            resp = client.post("/api/fleet/import/", data=json.dumps(rows), content_type="application/json")
+        assert resp.json()["sensors_created"] == 300
+
+    def test_import_updates_caches(self, client, django_capture_on_commit_callbacks):
+        assert client.get("/api/sensors/").json() == []
+        sensor_id = uuid.uuid4()
+        rows = [{"location": "Plant A", "sensor": "SensorA", "sensor_id": str(sensor_id)}]
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post("/api/fleet/import/", data=json.dumps(rows), content_type="application/json")
+
+        # bulk_create sends no signals, the import invalidates the list cache itself
+        assert [s["name"] for s in client.get("/api/sensors/").json()] == ["SensorA"]
+        assert get_identity_cache().lookup(sensor_id) == str(Sensor.objects.get().location_id)
+
+    def test_ids_must_match_existing_rows(self, client):
+        sensor = Sensor.objects.create(name="SensorA", location=Location.objects.create(name="Plant A"))
+        rows = [
+            {"location": "Plant A", "location_id": str(uuid.uuid4())},
+            {"location": "Plant A", "sensor": "SensorA", "sensor_id": str(uuid.uuid4())},
+            {"location": "Plant A", "sensor": "SensorB", "sensor_id": str(sensor.id)},
+            {"location": "Plant A", "sensor": "SensorC", "sensor_id": "nope"},
+            "Plant A",
+        ]
+        body = client.post("/api/fleet/import/", data=json.dumps(rows), content_type="application/json").json()
+        assert body["rejected"] == 5
+
+    def test_new_location_with_a_taken_id_is_rejected(self, client):
+        plant_a = Location.objects.create(name="Plant A")
+        rows = [
+            {"location": "Plant B", "location_id": str(plant_a.id), "sensor": "SensorA"},
+            {"location": "Plant C", "location_id": str(plant_a.id)},
+        ]
+        resp = client.post("/api/fleet/import/", data=json.dumps(rows), content_type="application/json")
+
+        assert resp.status_code == 200
+        assert [r["errors"] for r in resp.json()["results"]] == [["location_id: used by another location"]] * 2
+        assert list(Location.objects.values_list("name", flat=True)) == ["Plant A"]
+
+    def test_rolled_back_import_leaves_the_caches_alone(self, django_capture_on_commit_callbacks):
+        sensor_id = uuid.uuid4()
+
+        def import_and_fail() -> None:
+            with transaction.atomic():
+                import_fleet([{"location": "Plant A", "sensor": "SensorA", "sensor_id": str(sensor_id)}])
+                raise RuntimeError
+
+        with django_capture_on_commit_callbacks(execute=True) as callbacks, pytest.raises(RuntimeError):
+            import_and_fail()
+
+        assert callbacks == []
+        assert get_identity_cache().lookup(sensor_id) is None
+
+    @pytest.mark.parametrize(
+        ("data", "content_type", "status"),
+        [("{", "application/json", 400), ('{"a": 1}', "application/json", 422)],
+    )
+    def test_invalid_body(self, client, data, content_type, status):
+        assert client.post("/api/fleet/import/", data=data, content_type=content_type).status_code == status
+
+
+@pytest.mark.django_db
+def test_export_round_trips_through_import_command(client, tmp_path):
+    plant_a = Location.objects.create(name="Plant A")
+    Location.objects.create(name="Plant B")
+    sensor = Sensor.objects.create(name="SensorA", location=plant_a, description="boiler")
+
+    resp = client.get("/api/fleet/export/?format=csv")
+    assert resp.streaming
+    export = b"".join(resp.streaming_content).decode()
+    assert export.splitlines()[1] == f"Plant A,{plant_a.id},SensorA,{sensor.id},boiler"
+    json_rows = json.loads(b"".join(client.get("/api/fleet/export/").streaming_content))
+    assert [r["sensor"] for r in json_rows] == ["SensorA", ""]
+
+    # into an empty fleet, keeping the ids
+    Location.objects.all().delete()
+    path = tmp_path / "fleet.csv"
+    path.write_text(export)
+    out = StringIO()
+    call_command("import_fleet", str(path), stdout=out)
+    assert "Created 2 locations and 1 sensors" in out.getvalue()
+    assert Sensor.objects.get(id=sensor.id).location_id == plant_a.id
+
+    out = StringIO()
+    call_command("export_fleet", stdout=out)
+    assert out.getvalue() == export
@@ -0,0 +1,154 @@
+import gzip
+import struct
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from main.formats import ARROW, MSGPACK, PACKED, offered
+from main.models import Location, Reading, Sensor
+from main.rollups import refresh_rollups
+from main.storage import write_readings
+
+SENSOR = uuid.uuid4()
+T0 = datetime(2025, 10, 10, tzinfo=UTC)
+SERIES = {"sensor_id": str(SENSOR), "start": "2025-10-10T00:00:00Z", "end": "2025-10-10T02:00:00Z", "bucket": "30m"}
+
+
+@pytest.fixture
+def fleet() -> None:
+    plant = Location.objects.create(name="Plant A")
+    for name in ("Beta", "Alpha"):
+        Sensor.objects.create(name=name, location=plant)
+
+
+@pytest.fixture
+def readings() -> None:
+    # one reading per minute for two hours, 20.0 .. 139.0
+    write_readings(
+        [
+            Reading(time=T0 + timedelta(minutes=i), sensor_id=SENSOR, location_id=uuid.uuid4(), temperature=20.0 + i)
+            for i in range(120)
+        ]
+    )
+    refresh_rollups()
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("fleet")
+class TestListFormats:
+    def test_json_without_accept(self, client):
+        resp = client.get("/api/sensors/")
+        assert resp["Content-Type"] == "application/json"
+        assert "Accept" in resp["Vary"]
+
+    def test_msgpack(self, client):
+        msgpack = pytest.importorskip("msgpack")
+
+        resp = client.get("/api/sensors/", headers={"Accept": MSGPACK})
+
+        assert resp["Content-Type"] == MSGPACK
+        assert msgpack.unpackb(resp.content) == client.get("/api/sensors/").json()
+
+    def test_arrow(self, client):
+        pa = pytest.importorskip("pyarrow")
+
+        resp = client.get("/api/locations/", headers={"Accept": f"{ARROW}, application/json;q=0.5"})
+
+        table = pa.ipc.open_stream(resp.content).read_all()
+        assert table.column_names == ["id", "name", "slug"]
+        assert table.column("slug").to_pylist() == ["plant-a"]
+
+    def test_formats_are_cached_apart(self, client):
+        pytest.importorskip("msgpack")
+        json_etag = client.get("/api/sensors/")["ETag"]
+        resp = client.get("/api/sensors/", headers={"Accept": MSGPACK, "If-None-Match": json_etag})
+        assert resp.status_code == 200
+
+    def test_not_acceptable(self, client):
+        assert client.get("/api/sensors/", headers={"Accept": "text/csv"}).status_code == 406
+        # streams are JSON only
+        assert client.get("/api/sensors/?stream=true", headers={"Accept": ARROW}).status_code == 406
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("readings")
+class TestSeriesFormats:
+    def test_packed(self, client):
+        resp = client.get("/api/data/", SERIES, headers={"Accept": PACKED})
+
+        assert resp["Content-Type"] == PACKED
+        assert resp["X-Series-Bucket"] == "1800"
+        assert resp["X-Packed-Fields"] == "offset,min,max,avg,count"
+        records = list(struct.iter_unpack("<iiiii", resp.content))
+        assert records[0] == (0, 2000, 4900, 3450, 30)
+        assert [r[0] for r in records] == [0, 1800, 3600, 5400]
+
+    def test_msgpack(self, client):
+        msgpack = pytest.importorskip("msgpack")
+
+        resp = client.get("/api/data/", SERIES, headers={"Accept": MSGPACK})
+
+        body = msgpack.unpackb(resp.content, timestamp=3)
+        assert body["bucket"] == 1800
+        assert body["points"][0]["time"] == T0
+        assert body["points"][0]["avg"] == 34.5
+
+    def test_arrow(self, client):
+        pa = pytest.importorskip("pyarrow")
+
+        resp = client.get("/api/data/", SERIES, headers={"Accept": ARROW})
+
+        table = pa.ipc.open_stream(resp.content).read_all()
+        assert table.column("count").to_pylist() == [30, 30, 30, 30]
+        assert table.column("time")[0].as_py() == T0
+        assert table.schema.metadata[b"bucket"] == b"1800"
+
+    def test_json_still_default(self, client):
+        resp = client.get("/api/data/", SERIES, headers={"Accept": "*/*"})
+        assert resp.json()["points"][0]["avg"] == 34.5
+        assert "Accept" in resp["Vary"]
+
+
+def test_missing_libraries_are_not_offered():
+    assert offered([PACKED, "application/json"]) == [PACKED, "application/json"]
+
+
+@pytest.mark.django_db
+class TestCompression:
+    @pytest.mark.usefixtures("fleet")
+    def test_gzip(self, client):
+        resp = client.get("/api/sensors/", headers={"Accept-Encoding": "gzip"})
+        # too short to compress
+        assert not resp.has_header("Content-Encoding")
+
+        resp = client.get("/api/openapi.json", headers={"Accept-Encoding": "gzip"})
+        assert resp["Content-Encoding"] == "gzip"
+        assert gzip.decompress(resp.content).startswith(b"{")
+
+    def test_zstd_preferred(self, client):
+        zstandard = pytest.importorskip("zstandard")
+
+        resp = client.get("/api/openapi.json", headers={"Accept-Encoding": "gzip, zstd"})
+
+        assert resp["Content-Encoding"] == "zstd"
+        assert zstandard.ZstdDecompressor().decompress(resp.content).startswith(b"{")
+
+    def test_quality_decides(self, client):
+        resp = client.get("/api/openapi.json", headers={"Accept-Encoding": "zstd;q=0.1, gzip"})
+        assert resp["Content-Encoding"] == "gzip"
+        resp = client.get("/api/openapi.json", headers={"Accept-Encoding": "identity"})
+        assert not resp.has_header("Content-Encoding")
+
+    @pytest.mark.usefixtures("fleet")
+    def test_zstd_stream(self, client):
+        zstandard = pytest.importorskip("zstandard")
+
+        resp = client.get("/api/sensors/?stream=true", headers={"Accept-Encoding": "zstd"})
+
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(b"".join(resp.streaming_content))
+        assert body.startswith(b'[{"id":')
+
+    def test_pages_are_not_compressed(self, client):
+        resp = client.get("/main/", headers={"Accept-Encoding": "gzip"})
+        assert not resp.has_header("Content-Encoding")
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import threading
+import uuid
+
+import pytest
+
+from main.identity import SensorIdentityCache, get_identity_cache, preload_identity_cache
+from main.models import Location, Sensor
+
+
+@pytest.fixture
+def sensor():
+    return Sensor.objects.create(name="SensorA", location=Location.objects.create(name="Plant A"))
+
+
+@pytest.mark.django_db
+class TestSensorIdentityCache:
+    def test_preloaded_sensors_need_no_queries(self, sensor, django_assert_num_queries):
+        identity = SensorIdentityCache(maxsize=10, negative_ttl=60)
+        identity.preload()
+
+        with django_assert_num_queries(0):
+            assert identity.is_valid(sensor.id, sensor.location_id)
+            assert identity.is_valid(str(sensor.id), str(sensor.location_id))
+            assert not identity.is_valid(sensor.id, uuid.uuid4())
+            assert not identity.is_valid("not-a-uuid", sensor.location_id)
+
+    def test_unknown_ids_are_negatively_cached(self, django_assert_num_queries):
+        now = [0.0]
+        identity = SensorIdentityCache(maxsize=10, negative_ttl=60, clock=lambda: now[0])
+        identity.preload()
+        unknown = uuid.uuid4()
+
+        with django_assert_num_queries(1):
+            assert identity.lookup(unknown) is None
+            assert identity.lookup(unknown) is None
+
+        # asked again once the negative entry expired
+        now[0] = 61
+        with django_assert_num_queries(1):
+            assert identity.lookup(unknown) is None
+
+    def test_known_sensors_are_loaded_again_after_the_ttl(self, sensor, django_assert_num_queries):
+        now = [0.0]
+        identity = SensorIdentityCache(maxsize=10, negative_ttl=60, ttl=300, clock=lambda: now[0])
+        identity.preload()
+
+        # deleted by another process, this one gets no signal
+        Sensor.objects.filter(id=sensor.id).delete()
+        identity.remember(sensor.id, sensor.location_id)
+        with django_assert_num_queries(0):
+            assert identity.is_valid(sensor.id, sensor.location_id)
+
+        now[0] = 300
+        with django_assert_num_queries(2):
+            assert not identity.is_valid(sensor.id, sensor.location_id)
+
+    def test_one_caller_reloads_the_expired_cache(self, monkeypatch):
+        now = [0.0]
+        identity = SensorIdentityCache(maxsize=10, negative_ttl=60, ttl=300, clock=lambda: now[0])
+        sensor_id = uuid.uuid4()
+        identity.remember(sensor_id, "loc")
+        now[0] = 300
+        loading, loaded = threading.Event(), threading.Event()
+        preloads = []
+
+        def preload() -> None:
+            preloads.append(threading.current_thread())
+            loading.set()
+            loaded.wait(5)
+
+        monkeypatch.setattr(identity, "preload", preload)
+        reloader = threading.Thread(target=identity.lookup_many, args=([sensor_id],))
+        reloader.start()
+        loading.wait(5)
+
+        # the other requests answer from the expired entries meanwhile
+        assert identity.lookup(sensor_id) == "loc"
+
+        async def lookups() -> list[dict]:
+            return await asyncio.gather(*(identity.alookup_many([sensor_id]) for _ in range(3)))
+
+        assert asyncio.run(lookups()) == [{str(sensor_id): "loc"}] * 3
+        loaded.set()
+        reloader.join()
+        assert len(preloads) == 1
+
+    def test_least_recently_used_sensor_is_evicted(self):
+        identity = SensorIdentityCache(maxsize=2, negative_ttl=60)
+        a, b, c = (uuid.uuid4() for _ in range(3))
+        identity.remember(a, "loc")
+        identity.remember(b, "loc")
+        identity._cached(str(a))  # touch a, b becomes the oldest
+        identity.remember(c, "loc")
+
+        assert set(identity._known) == {str(a), str(c)}
+
+    def test_signals_keep_the_process_cache_current(self, django_assert_num_queries):
+        identity = get_identity_cache()
+        identity.preload()
+        loc = Location.objects.create(name="Plant A")
+        new_id = uuid.uuid4()
+
+        # an id reported before the sensor existed is cached as unknown
+        assert identity.lookup(new_id) is None
+        sensor = Sensor.objects.create(id=new_id, name="SensorA", location=loc)
+        with django_assert_num_queries(0):
+            assert identity.is_valid(sensor.id, loc.id)
+
+        loc.delete()
+        assert identity.lookup(new_id) is None
+
+
+@pytest.mark.django_db
+def test_preload_at_startup(sensor, django_assert_num_queries):
+    preload_identity_cache()
+    with django_assert_num_queries(0):
+        assert get_identity_cache().is_valid(sensor.id, sensor.location_id)
+
+
+@pytest.mark.django_db
+def test_receive_sensor_data_rejects_unknown_sensors(client, published, sensor):
+    reading = {
+        "time": "2025-10-10T12:00:00Z",
+        "sensor_id": str(sensor.id),
+        "location_id": str(sensor.location_id),
+        "temperature": 21.5,
+    }
+    resp = client.post("/api/data/", data=json.dumps(reading), content_type="application/json")
+    assert resp.status_code == 200
+    assert len(published) == 1
+
+    reading["sensor_id"] = str(uuid.uuid4())
+    resp = client.post("/api/data/", data=json.dumps(reading), content_type="application/json")
+    assert resp.status_code == 422
+    assert len(published) == 1
@@ -0,0 +1,68 @@
+import json
+import uuid
+
+import pytest
+
+from main.models import Location, Sensor
+from main.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    pk = uuid.uuid4()
+    cursor = encode_cursor("Sensor ä", pk)
+    assert decode_cursor(cursor) == ("Sensor ä", str(pk))
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(encode_cursor("Sensor ä", "not-a-uuid"))
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def test_pages_cover_every_sensor_once(self, client):
+        plant_a = Location.objects.create(name="Plant A")
+        plant_b = Location.objects.create(name="Plant B")
+        # equal names in two locations are ordered by id
+        for name in ["Delta", "Alpha", "Charlie", "Bravo"]:
+            Sensor.objects.create(name=name, location=plant_a)
+        Sensor.objects.create(name="Alpha", location=plant_b)
+
+        seen = []
+        url = "/api/sensors/?limit=2"
+        while True:
+            resp = client.get(url)
+            assert resp.status_code == 200
+            seen.extend(s["id"] for s in resp.json())
+            if "X-Next-Cursor" not in resp:
+                break
+            url = f"/api/sensors/?limit=2&cursor={resp['X-Next-Cursor']}"
+
+        expected = [str(pk) for pk in Sensor.objects.order_by("name", "id").values_list("id", flat=True)]
+        assert seen == expected
+
+    def test_link_header_keeps_filters(self, client):
+        loc = Location.objects.create(name="Plant A")
+        for name in ["Alpha", "Bravo", "Charlie"]:
+            Sensor.objects.create(name=name, location=loc)
+
+        resp = client.get(f"/api/sensors/?location={loc.slug}&limit=1")
+        assert "location=plant-a" in resp["Link"]
+        assert 'rel="next"' in resp["Link"]
+
+    def test_invalid_cursor_is_422(self, client):
+        assert client.get("/api/locations/?limit=2&cursor=%%%").status_code == 422
+        cursor = encode_cursor("a", "not-a-uuid")
+        assert client.get(f"/api/locations/?limit=5&cursor={cursor}").status_code == 422
+        assert client.get(f"/api/sensors/?limit=5&cursor={cursor}").status_code == 422
+
+    def test_streaming_export(self, client):
+        for name in ["Oslo", "Bergen", "Tromso"]:
+            Location.objects.create(name=name)
+
+        resp = client.get("/api/locations/?stream=true")
+        assert resp.streaming
+        data = b"".join(resp.streaming_content)
+        assert [loc["name"] for loc in json.loads(data)] == ["Bergen", "Oslo", "Tromso"]
+
+        resp = client.get("/api/sensors/?stream=true")
+        assert b"".join(resp.streaming_content) == b"[]"
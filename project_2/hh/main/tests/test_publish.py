@@ -0,0 +1,56 @@
+import pytest
+from kombu.exceptions import LimitExceeded
+
+from main.metrics import broker_wait
+from main.publish import send
+from main.tasks import forward_to_message_queue
+
+
+@pytest.fixture(autouse=True)
+def reset_wait() -> None:
+    broker_wait.reset()
+
+
+def test_send_borrows_a_producer_and_records_the_wait(published):
+    pool = forward_to_message_queue.app.producer_pool
+
+    send(forward_to_message_queue, {"temperature": 20.0})
+
+    assert published == [("main.tasks.forward_to_message_queue", ({"temperature": 20.0},))]
+    stats = broker_wait.snapshot()
+    assert stats["requests"] == 1
+    assert stats["failed"] == 0
+    # the producer went back to the pool
+    producer = pool.acquire(block=False)
+    producer.release()
+
+
+@pytest.mark.django_db
+def test_exhausted_pool_answers_503(client, monkeypatch, settings):
+    settings.INGEST_VALIDATE_IDENTITY = False
+    pool = forward_to_message_queue.app.producer_pool
+
+    def exhausted(**_kwargs):
+        raise LimitExceeded(pool.limit)
+
+    monkeypatch.setattr(pool, "acquire", exhausted)
+    resp = client.post(
+        "/api/data/",
+        {"time": "2025-10-10T12:00:00Z", "sensor_id": "s", "location_id": "l", "temperature": 22.5},
+        content_type="application/json",
+    )
+
+    assert resp.status_code == 503
+    assert resp["Retry-After"] == "1"
+    assert broker_wait.snapshot()["failed"] == 1
+
+
+@pytest.mark.django_db
+def test_pool_metrics_endpoint(client, published):
+    send(forward_to_message_queue, {})
+
+    body = client.get("/api/metrics/pools/").json()
+
+    assert body["broker"]["requests"] == 1
+    assert body["databases"]["default"]["connections_opened"] >= 1
+    assert "pool" not in body["databases"]["default"]  # no DATABASE_POOL on sqlite
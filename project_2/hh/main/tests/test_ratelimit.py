@@ -0,0 +1,187 @@
+import asyncio
+import time
+
+import pytest
+from celery.app.task import Task
+from kombu.exceptions import OperationalError
+
+from main.identity import get_identity_cache
+from main.metrics import broker_publish
+from main.models import Location, Sensor
+from main.publish import BrokerBusyError
+from main.ratelimit import AdmissionController, CacheBuckets, TokenBuckets, close_admission, get_admission
+from main.spool import close_spool, get_spool
+from main.tasks import forward_batch_to_message_queue
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_refills_at_its_rate():
+    clock = FakeClock()
+    buckets = TokenBuckets(rate=2, burst=2, max_keys=10, clock=clock)
+
+    assert buckets.take_many(["a", "a", "a", "b"]) == [0.0, 0.0, 0.5, 0.0]
+    clock.now = 0.25
+    assert buckets.take_many(["a"]) == [0.25]
+    clock.now = 0.5
+    assert buckets.take_many(["a"]) == [0.0]
+    assert buckets.stats()["limited"] == 2
+
+
+def test_least_recently_used_buckets_are_forgotten():
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2, clock=FakeClock())
+    buckets.take_many(["a", "b", "c"])
+    # a starts over with a full bucket
+    assert buckets.take_many(["a", "c"]) == [0.0, 1.0]
+
+
+def test_cache_buckets_count_per_window():
+    clock = FakeClock()
+    clock.now = 1000.5
+    buckets = CacheBuckets("test", rate=1, burst=2, alias="default", clock=clock)
+
+    assert buckets.take_many(["a", "a", "a"]) == [0.0, 0.0, 1.5]
+    clock.now = 1002.0
+    assert buckets.take_many(["a"]) == [0.0]
+    assert asyncio.run(buckets.atake_many(["a", "a"])) == [0.0, 2.0]
+
+
+def test_admission_sheds_on_queue_depth_and_publish_latency():
+    depth = [0]
+    admission = AdmissionController(max_queue_depth=10, max_publish_ms=500, interval=1, queue_depth=lambda: depth[0])
+
+    depth[0] = 11
+    admission.sample()
+    assert admission.overloaded
+    assert "11 messages" in admission.reason
+
+    depth[0] = 0
+    broker_publish.record(0.8)
+    broker_publish.record(5.0, failed=True)  # failures don't count
+    admission.sample()
+    assert admission.reason == "publishes take 800 ms"
+
+    # no publishes while shedding, the next interval admits again
+    admission.sample()
+    assert not admission.overloaded
+    admission.admit()
+
+
+@pytest.mark.django_db
+class TestIngest:
+    @pytest.fixture
+    def payload(self) -> dict:
+        loc = Location.objects.create(name="Plant A")
+        sensor = Sensor.objects.create(name="SensorA", location=loc)
+        get_identity_cache().clear()
+        return {
+            "time": "2025-10-10T12:00:00Z",
+            "sensor_id": str(sensor.id),
+            "location_id": str(loc.id),
+            "temperature": 21.5,
+        }
+
+    @pytest.fixture
+    def admission(self, settings):
+        settings.ADMISSION_MAX_QUEUE_DEPTH = 10
+        settings.ADMISSION_SAMPLE_INTERVAL = 3600
+        yield get_admission()
+        close_admission()
+
+    @pytest.mark.usefixtures("published")
+    def test_sensor_limit(self, client, settings, payload):
+        settings.RATE_LIMIT_SENSOR_RATE = 0.5
+        settings.RATE_LIMIT_SENSOR_BURST = 1
+        later = {**payload, "sensor_id": payload["sensor_id"].upper(), "time": "2025-10-10T12:00:01Z"}
+
+        assert client.post("/api/data/", payload, content_type="application/json").status_code == 200
+        resp = client.post("/api/data/", later, content_type="application/json")
+
+        assert resp.status_code == 429
+        assert resp["Retry-After"] == "2"
+        assert client.get("/api/metrics/ingest/").json()["rate_limits"]["sensor"]["limited"] == 1
+
+    @pytest.mark.usefixtures("published")
+    def test_async_ingest_counts_in_the_cache(self, client, settings, payload):
+        settings.RATE_LIMIT_BACKEND = "cache"
+        settings.RATE_LIMIT_SENSOR_RATE = 0.5
+        settings.RATE_LIMIT_SENSOR_BURST = 1
+        later = {**payload, "time": "2025-10-10T12:00:01Z"}
+
+        assert client.post("/api/async/data/", payload, content_type="application/json").status_code == 200
+        resp = client.post("/api/async/data/", later, content_type="application/json")
+
+        assert resp.status_code == 429
+        assert client.get("/api/metrics/ingest/").json()["rate_limits"]["sensor"]["backend"] == "cache"
+
+    @pytest.mark.usefixtures("published")
+    def test_client_limit(self, client, settings, payload):
+        settings.RATE_LIMIT_CLIENT_RATE = 1
+        settings.RATE_LIMIT_CLIENT_BURST = 1
+
+        assert client.post("/api/data/", payload, content_type="application/json").status_code == 200
+        assert client.post("/api/data/batch/", [payload], content_type="application/json").status_code == 429
+        other = client.post("/api/data/", payload, content_type="application/json", REMOTE_ADDR="10.0.0.2")
+        assert other.status_code == 200
+
+    def test_batch_rejects_readings_beyond_the_sensor_limit(self, client, published, settings, payload):
+        settings.RATE_LIMIT_SENSOR_RATE = 1
+        settings.RATE_LIMIT_SENSOR_BURST = 2
+        items = [{**payload, "time": f"2025-10-10T12:00:0{n}Z"} for n in range(3)]
+
+        data = client.post("/api/data/batch/", items, content_type="application/json").json()
+
+        assert [r["status"] for r in data["results"]] == ["accepted", "accepted", "rejected"]
+        assert data["results"][2]["errors"] == ["Too many readings from this sensor, retry after 1 s"]
+        assert len(published[0][1][0]) == 2
+
+    @pytest.mark.usefixtures("published")
+    def test_overload_is_shed(self, client, payload, admission):
+        admission.queue_depth = lambda: 11
+        admission.sample()
+
+        resp = client.post("/api/data/", payload, content_type="application/json")
+        assert resp.status_code == 503
+        assert resp["Retry-After"] == "3600"
+        assert client.post("/api/async/data/", payload, content_type="application/json").status_code == 503
+
+        admission.queue_depth = lambda: 0
+        admission.sample()
+        assert client.post("/api/data/", payload, content_type="application/json").status_code == 200
+        assert client.get("/api/metrics/ingest/").json()["admission"]["shed"] == 2
+
+    def test_broker_down_with_the_spool_on_is_admitted(self, client, settings, payload, monkeypatch, tmp_path):
+        settings.ADMISSION_MAX_PUBLISH_MS = 10
+        settings.ADMISSION_SAMPLE_INTERVAL = 3600
+        settings.READINGS_SPOOL_PATH = str(tmp_path / "readings.spool")
+        settings.READINGS_SPOOL_DRAIN_INTERVAL = 3600
+
+        def apply_async(self, args=None, kwargs=None, **options) -> None:
+            time.sleep(0.02)  # the publish times out
+            raise OperationalError(111, "Connection refused")
+
+        monkeypatch.setattr(Task, "apply_async", apply_async)
+        admission = get_admission()
+        try:
+            assert client.post("/api/data/", payload, content_type="application/json").status_code == 200
+            with pytest.raises(BrokerBusyError):
+                get_spool().drain(forward_batch_to_message_queue, 100)
+            admission.sample()
+            assert not admission.overloaded
+
+            # requests append to the spool, slow publishes elsewhere don't shed them
+            broker_publish.record(0.8)
+            admission.sample()
+            assert not admission.overloaded
+            later = {**payload, "time": "2025-10-10T12:00:01Z"}
+            assert client.post("/api/data/", later, content_type="application/json").status_code == 200
+            assert get_spool().pending() == 2
+        finally:
+            close_admission()
+            close_spool()
@@ -0,0 +1,62 @@
+import uuid
+from datetime import UTC, datetime
+
+import pytest
+from django.db import InterfaceError, OperationalError
+
+from main.dedup import get_storage_keys
+from main.models import Reading
+from main.storage import parse_time, readings_from_dicts, store_readings, write_readings
+from main.tasks import forward_batch_to_message_queue, forward_to_message_queue
+
+SENSOR = str(uuid.uuid4())
+LOCATION = str(uuid.uuid4())
+
+
+def reading(second: int, temperature: float = 20.0) -> dict:
+    return {
+        "time": f"2025-10-10T12:00:{second:02d}Z",
+        "sensor_id": SENSOR,
+        "location_id": LOCATION,
+        "temperature": temperature,
+    }
+
+
+def test_parse_time_defaults_to_utc():
+    assert parse_time("2025-10-10T12:00:00") == datetime(2025, 10, 10, 12, tzinfo=UTC)
+    with pytest.raises(ValueError, match="Invalid timestamp"):
+        parse_time("yesterday")
+
+
+@pytest.mark.django_db
+def test_tasks_write_before_the_message_is_acked():
+    forward_to_message_queue(reading(0))
+    assert Reading.objects.count() == 1
+
+    forward_batch_to_message_queue([reading(1), reading(2)])
+    assert Reading.objects.count() == 3
+
+    for task in (forward_to_message_queue, forward_batch_to_message_queue):
+        assert task.acks_late
+        assert task.reject_on_worker_lost
+        assert task.autoretry_for == (OperationalError, InterfaceError)
+
+
+@pytest.mark.django_db
+def test_refused_readings_are_dropped_not_retried():
+    bad = {**reading(1), "sensor_id": "sensor-1"}
+    forward_batch_to_message_queue([reading(0), bad, reading(2)])
+    assert Reading.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_malformed_and_duplicate_readings_are_skipped():
+    store_readings(readings_from_dicts([reading(0), {"time": "not a time"}, reading(1)]))
+    assert Reading.objects.count() == 2
+
+    # same (sensor, time) again, from a process that didn't write it, is ignored by the primary key
+    get_storage_keys().clear()
+    first = parse_time(reading(0)["time"])
+    write_readings([Reading(time=first, sensor_id=SENSOR, location_id=LOCATION, temperature=1)])
+    assert Reading.objects.count() == 2
+    assert Reading.objects.get(time=first).temperature == 20.0
@@ -0,0 +1,52 @@
+import json
+import uuid
+from datetime import UTC, datetime
+from decimal import Decimal
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from main.api import SensorSchema
+from main.renderers import BACKENDS, FastJSONRenderer, get_dumps, installed_backends
+
+
+def test_auto_picks_the_first_installed_backend():
+    assert installed_backends()[-1] == "json"
+    assert get_dumps("auto") is get_dumps(installed_backends()[0])
+
+
+def test_missing_backend_is_a_configuration_error():
+    missing = [name for name in BACKENDS if name not in installed_backends()]
+    with pytest.raises(ImproperlyConfigured):
+        get_dumps(missing[0] if missing else "yaml")
+
+
+@pytest.mark.parametrize("backend", installed_backends())
+def test_backends_agree(backend):
+    pk = uuid.uuid4()
+    data = [
+        {"id": pk, "name": "Sensor ä", "temperature": 21.5, "price": Decimal("1.50")},
+        SensorSchema(id=str(pk), name="Alpha", location="Plant A"),
+    ]
+
+    body = get_dumps(backend)(data)
+
+    assert isinstance(body, bytes)
+    assert b", " not in body  # compact
+    assert json.loads(body) == [
+        {"id": str(pk), "name": "Sensor ä", "temperature": 21.5, "price": "1.50"},
+        {"id": str(pk), "name": "Alpha", "location": "Plant A"},
+    ]
+
+
+@pytest.mark.parametrize("backend", installed_backends())
+def test_utc_datetimes_end_in_z(backend):
+    body = get_dumps(backend)({"time": datetime(2025, 10, 10, 12, tzinfo=UTC)})
+    assert json.loads(body)["time"].startswith("2025-10-10T12:00:00")
+    assert json.loads(body)["time"].endswith("Z")
+
+
+def test_renderer_uses_the_configured_backend(rf, settings):
+    settings.API_JSON_BACKEND = "json"
+    body = FastJSONRenderer().render(rf.get("/"), {"id": uuid.UUID(int=1)}, response_status=200)
+    assert body == b'{"id":"00000000-0000-0000-0000-000000000001"}'
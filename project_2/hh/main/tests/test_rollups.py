@@ -0,0 +1,93 @@
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from main.models import Reading, ReadingRollup1d, ReadingRollup1h, ReadingRollup1m, RollupState
+from main.rollups import STATE, refresh_rollups, rollup_for, rollup_width
+from main.storage import write_readings
+from main.timeseries import query
+
+SENSOR = uuid.uuid4()
+LOCATION = uuid.uuid4()
+T0 = datetime(2025, 10, 10, tzinfo=UTC)
+
+
+def readings(start: datetime, count: int, temperature: float = 20.0) -> list[Reading]:
+    # one reading every 30 seconds
+    return [
+        Reading(
+            time=start + timedelta(seconds=30 * i),
+            sensor_id=SENSOR,
+            location_id=LOCATION,
+            temperature=temperature + i,
+        )
+        for i in range(count)
+    ]
+
+
+def dirty_from() -> datetime | None:
+    return RollupState.objects.get(name=STATE).dirty_from
+
+
+def test_rollup_for_picks_the_coarsest_fitting_rollup():
+    assert rollup_for(30) is None
+    assert rollup_for(300) is ReadingRollup1m
+    assert rollup_for(7200) is ReadingRollup1h
+    assert rollup_for(7 * 86400) is ReadingRollup1d
+    assert rollup_width(45) == 45
+    assert rollup_width(1234) == 1260
+    assert rollup_width(5000) == 7200
+
+
+@pytest.mark.django_db
+def test_refresh_builds_every_resolution():
+    write_readings(readings(T0, 240))  # two hours
+    assert dirty_from() == T0
+
+    assert refresh_rollups() == 1
+    assert dirty_from() is None
+    assert ReadingRollup1m.objects.count() == 120
+    hours = list(ReadingRollup1h.objects.order_by("bucket"))
+    assert [(h.count, h.min_temperature, h.max_temperature) for h in hours] == [(120, 20.0, 139.0), (120, 140.0, 259.0)]
+    day = ReadingRollup1d.objects.get()
+    assert (day.bucket, day.count, day.sum_temperature) == (T0, 240, sum(20.0 + i for i in range(240)))
+
+    # nothing new, nothing to do
+    assert refresh_rollups() == 0
+
+
+@pytest.mark.django_db
+def test_refresh_only_recomputes_from_new_readings():
+    write_readings(readings(T0, 240))
+    refresh_rollups()
+    old_minute = ReadingRollup1m.objects.get(bucket=T0)
+    old_minute.count = 99  # would be overwritten if the first minute was recomputed
+    old_minute.save()
+
+    write_readings(readings(T0 + timedelta(hours=2), 2, temperature=50.0))
+    assert dirty_from() == T0 + timedelta(hours=2)
+    refresh_rollups()
+
+    assert ReadingRollup1m.objects.get(bucket=T0).count == 99
+    # the first hours weren't summed up again either, the day is rebuilt from them
+    assert ReadingRollup1h.objects.get(bucket=T0).count == 120
+    assert ReadingRollup1h.objects.get(bucket=T0 + timedelta(hours=2)).count == 2
+    assert ReadingRollup1d.objects.get().count == 242
+
+
+@pytest.mark.django_db
+def test_query_reads_rollups(django_assert_num_queries):
+    write_readings(readings(T0, 240))
+    refresh_rollups()
+    # a raw reading the rollups haven't seen yet proves which table answered
+    Reading.objects.create(
+        time=T0 + timedelta(minutes=5, seconds=1), sensor_id=SENSOR, location_id=LOCATION, temperature=0
+    )
+
+    with django_assert_num_queries(1):
+        _seconds, buckets = query(T0, T0 + timedelta(hours=2), sensor_id=SENSOR, bucket=3600)
+    assert [b.count for b in buckets] == [120, 120]
+
+    _seconds, buckets = query(T0, T0 + timedelta(hours=2), sensor_id=SENSOR, bucket=30)
+    assert sum(b.count for b in buckets) == 241
@@ -3,6 +3,8 @@ import uuid
 import pytest
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
+from django.db.models import Value
+from django.db.models.functions import Lower
 
 from main.models import Location, Sensor
 
@@ -55,3 +57,14 @@ def test_sensor_name_length_constraints():
     sens = Sensor(name="S" * 41)
     with pytest.raises(ValidationError):
         sens.full_clean()
+
+
+@pytest.mark.django_db
+def test_sensor_name_lookups_use_lower_name_indexes():
+    loc = Location.objects.create(name="Stockholm")
+    Sensor.objects.create(name="SensorA", location=loc)
+    by_name = Sensor.objects.alias(name_lower=Lower("name")).filter(name_lower=Lower(Value("sensora")))
+
+    assert [s.name for s in by_name] == ["SensorA"]
+    assert "sensor_name_lower_idx" in by_name.explain()
+    assert "sensor_location_name_lower_idx" in by_name.filter(location__slug="stockholm").explain()
@@ -0,0 +1,85 @@
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from django.test import override_settings
+
+from main.models import Location, Reading
+from main.routers import ReadingRouter
+from main.sharding import fan_out, merge_by_time, shard_for, shard_for_reading, shards_for
+
+SHARDS = ["timescale1", "timescale2"]
+T0 = datetime(2025, 10, 10, tzinfo=UTC)
+
+
+def make_reading(seconds: int, location_id: uuid.UUID | None = None) -> Reading:
+    return Reading(
+        time=T0 + timedelta(seconds=seconds),
+        sensor_id=uuid.uuid4(),
+        location_id=location_id or uuid.uuid4(),
+        temperature=20.0,
+    )
+
+
+def test_unsharded_everything_goes_to_default():
+    assert shard_for(uuid.uuid4()) == "default"
+    assert shards_for(sensor_id=uuid.uuid4()) == ["default"]
+
+
+@override_settings(READINGS_SHARDS=SHARDS, READINGS_SHARD_KEY="location_id")
+def test_shard_is_stable_and_spread():
+    keys = [uuid.uuid4() for _ in range(200)]
+    picked = [shard_for(key) for key in keys]
+
+    # the same key always maps to the same node, str or UUID
+    assert picked == [shard_for(str(key)) for key in keys]
+    # and both nodes get a fair share
+    assert 60 < picked.count("timescale1") < 140
+
+
+@override_settings(READINGS_SHARDS=SHARDS, READINGS_SHARD_KEY="sensor_id")
+def test_keys_that_arent_uuids_still_get_a_node():
+    reading = make_reading(0)
+    reading.sensor_id = "sensor-1"
+
+    assert shard_for("sensor-1") in SHARDS
+    assert shard_for_reading(reading) == shard_for("sensor-1")
+
+
+@override_settings(READINGS_SHARDS=SHARDS, READINGS_SHARD_KEY="location_id")
+def test_queries_on_the_shard_key_hit_one_node():
+    location_id = uuid.uuid4()
+    assert shards_for(location_id=location_id) == [shard_for(location_id)]
+    # sensor queries can't know the node when sharding by location
+    assert shards_for(sensor_id=uuid.uuid4()) == SHARDS
+
+
+@override_settings(READINGS_SHARDS=SHARDS, READINGS_SHARD_KEY="location_id")
+def test_router_places_readings_on_their_shard():
+    router = ReadingRouter()
+    reading = make_reading(0)
+
+    assert router.db_for_write(Reading, instance=reading) == shard_for_reading(reading)
+    assert router.db_for_write(Location) is None
+    assert router.allow_migrate("timescale1", "main", model_name="reading") is True
+    assert router.allow_migrate("timescale1", "main", model_name="location") is False
+    assert router.allow_migrate("default", "main", model_name="reading") is False
+    assert router.allow_migrate("default", "auth", model_name="user") is True
+
+
+def test_fan_out_runs_every_node_and_merges_by_time():
+    location_id = uuid.uuid4()
+    node_a = [make_reading(0, location_id), make_reading(20, location_id)]
+    node_b = [make_reading(10, location_id), make_reading(30, location_id)]
+
+    # results come back in the order of the aliases, whichever thread finishes first
+    assert fan_out(lambda alias: alias.upper(), ["default", "default"]) == ["DEFAULT", "DEFAULT"]
+
+    merged = merge_by_time([node_a, node_b])
+    assert [(r.time - T0).seconds for r in merged] == [0, 10, 20, 30]
+
+
+@pytest.mark.django_db
+def test_fan_out_single_node_runs_inline():
+    Reading.objects.create(time=T0, sensor_id=uuid.uuid4(), location_id=uuid.uuid4(), temperature=1.0)
+    assert fan_out(lambda alias: Reading.objects.using(alias).count(), ["default"]) == [1]
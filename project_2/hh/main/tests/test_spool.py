@@ -0,0 +1,199 @@
+import fcntl
+
+import pytest
+from celery.app.task import Task
+from kombu.exceptions import OperationalError
+
+from main.identity import get_identity_cache
+from main.models import Location, Sensor
+from main.publish import BrokerBusyError
+from main.spool import HEADER, RECORD, Spool, SpoolFullError, close_spool, forward, get_spool
+from main.tasks import forward_batch_to_message_queue, forward_to_message_queue
+
+
+def reading(n: int) -> dict:
+    return {"time": "2025-10-10T12:00:00Z", "sensor_id": "s", "location_id": "l", "temperature": float(n)}
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = Spool(tmp_path / "readings.spool", 4096)
+    yield spool
+    spool.close()
+
+
+@pytest.fixture
+def broker_down(monkeypatch) -> tuple[list[bool], list[tuple[str, tuple]]]:
+    # publishes fail like they do with RabbitMQ unreachable, until the test clears down
+    down = [True]
+    sent: list[tuple[str, tuple]] = []
+
+    def apply_async(self, args=None, kwargs=None, **options) -> None:
+        if down:
+            raise OperationalError(111, "Connection refused")
+        sent.append((self.name, tuple(args or ())))
+
+    monkeypatch.setattr(Task, "apply_async", apply_async)
+    return down, sent
+
+
+@pytest.fixture
+def process_spool(settings, tmp_path):
+    # the process wide spool, its drainer left to the test
+    settings.READINGS_SPOOL_PATH = str(tmp_path / "readings.spool")
+    settings.READINGS_SPOOL_DRAIN_INTERVAL = 3600
+    yield get_spool()
+    close_spool()
+
+
+def test_records_are_read_in_order_and_the_file_is_reused(spool):
+    spool.append([reading(1)])
+    spool.append([reading(2), reading(3)])
+
+    readings, nbytes, count = spool.peek(10)
+    assert [r["temperature"] for r in readings] == [1.0, 2.0, 3.0]
+    assert count == spool.pending() == 2
+
+    spool.consume(nbytes, count)
+    assert spool.pending() == 0
+    assert spool.used_bytes() == 0
+
+
+def test_peek_stops_at_the_batch_size(spool):
+    for n in range(5):
+        spool.append([reading(n)])
+    _, nbytes, count = spool.peek(2)
+    assert count == 2
+    spool.consume(nbytes, count)
+    assert [r["temperature"] for r in spool.peek(10)[0]] == [2.0, 3.0, 4.0]
+
+
+def test_full_spool_refuses_and_moves_records_to_the_front(spool):
+    record_size = RECORD.size + len(
+        b'[{"time":"2025-10-10T12:00:00Z","sensor_id":"s","location_id":"l","temperature":0.0}]'
+    )
+    fits = (spool.size - HEADER.size) // record_size
+    for n in range(fits):
+        spool.append([reading(n)])
+    with pytest.raises(SpoolFullError):
+        spool.append([reading(0)])
+    assert spool.refused == 1
+
+    # consuming the oldest record makes room at the front
+    _, nbytes, count = spool.peek(1)
+    spool.consume(nbytes, count)
+    spool.append([reading(99)])
+    readings, _, count = spool.peek(1000)
+    assert count == fits
+    assert readings[0]["temperature"] == 1.0
+    assert readings[-1]["temperature"] == 99.0
+
+
+def test_records_survive_reopening(spool):
+    spool.append([reading(7)])
+    reopened = Spool(spool.path, 4096)
+    try:
+        assert reopened.pending() == 1
+        assert reopened.peek(10)[0] == [reading(7)]
+    finally:
+        reopened.close()
+
+
+def test_torn_record_is_dropped(spool):
+    spool.append([reading(1)])
+    spool.append([reading(2)])
+    # corrupt the second record's payload
+    _, nbytes, _ = spool.peek(1)
+    spool._map[HEADER.size + nbytes + RECORD.size] = ord("X")
+
+    readings, _, count = spool.peek(10)
+
+    assert count == 1
+    assert readings == [reading(1)]
+    assert spool.pending() == 1
+
+
+def test_drain_replays_in_batches_once_the_broker_is_back(spool, broker_down):
+    down, sent = broker_down
+    for n in range(5):
+        spool.append([reading(n)])
+
+    with pytest.raises(BrokerBusyError):
+        spool.drain(forward_batch_to_message_queue, 2)
+    assert spool.pending() == 5
+
+    down.clear()
+    assert spool.drain(forward_batch_to_message_queue, 2) == 5
+    assert [len(args[0]) for _, args in sent] == [2, 2, 1]
+    assert spool.pending() == 0
+
+
+def test_one_drainer_at_a_time(spool, broker_down):
+    broker_down[0].clear()
+    spool.append([reading(1)])
+    other = Spool(spool.path, 4096)
+    try:
+        fcntl.flock(other._drain_fd, fcntl.LOCK_EX)
+        assert spool.drain(forward_batch_to_message_queue, 10) == 0
+        fcntl.flock(other._drain_fd, fcntl.LOCK_UN)
+        assert spool.drain(forward_batch_to_message_queue, 10) == 1
+    finally:
+        other.close()
+
+
+def test_forward_spools_while_the_broker_is_down(process_spool, broker_down, monkeypatch):
+    down, sent = broker_down
+
+    assert forward(forward_to_message_queue, reading(1), [reading(1)]) is False
+    assert process_spool.pending() == 1
+
+    # with readings waiting the broker isn't tried
+    attempts = []
+    with monkeypatch.context() as patch:
+        patch.setattr("main.spool.send", lambda *args: attempts.append(args))
+        assert forward(forward_to_message_queue, reading(2), [reading(2)]) is False
+    assert attempts == []
+
+    down.clear()
+    assert process_spool.drain(forward_batch_to_message_queue, 100) == 2
+    assert sent == [("main.tasks.forward_batch_to_message_queue", ([reading(1), reading(2)],))]
+    assert forward(forward_to_message_queue, reading(3), [reading(3)]) is True
+    assert process_spool.stats()["appended"] == 2
+
+
+@pytest.mark.django_db
+class TestIngest:
+    @pytest.fixture
+    def payload(self) -> dict:
+        loc = Location.objects.create(name="Plant A")
+        sensor = Sensor.objects.create(name="SensorA", location=loc)
+        get_identity_cache().clear()
+        return {
+            "time": "2025-10-10T12:00:00Z",
+            "sensor_id": str(sensor.id),
+            "location_id": str(loc.id),
+            "temperature": 1,
+        }
+
+    @pytest.mark.usefixtures("broker_down")
+    def test_without_spool_the_request_fails(self, client, payload):
+        resp = client.post("/api/data/", payload, content_type="application/json")
+        assert resp.status_code == 503
+
+    @pytest.mark.usefixtures("broker_down")
+    def test_readings_are_spooled(self, client, payload, process_spool):
+        resp = client.post("/api/data/", payload, content_type="application/json")
+        later = [{**payload, "time": f"2025-10-10T12:00:0{n}Z"} for n in (1, 2)]
+        batch = client.post("/api/data/batch/", later, content_type="application/json")
+
+        assert resp.status_code == 200
+        assert batch.status_code == 200
+        assert len(process_spool.peek(100)[0]) == 3
+        assert client.get("/api/metrics/spool/").json()["records"] == 2
+
+    @pytest.mark.usefixtures("broker_down")
+    def test_full_spool_answers_503(self, client, payload, process_spool, monkeypatch):
+        monkeypatch.setattr(process_spool, "size", HEADER.size)
+        resp = client.post("/api/data/", payload, content_type="application/json")
+        assert resp.status_code == 503
+        assert resp["Retry-After"] == "1"
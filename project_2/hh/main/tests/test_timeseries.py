@@ -0,0 +1,116 @@
+import math
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from main.models import Reading
+from main.rollups import refresh_rollups
+from main.storage import write_readings
+from main.timescale import EpochBucket
+from main.timeseries import Bucket, lttb, merge_buckets, parse_bucket, query
+
+SENSOR = uuid.uuid4()
+LOCATION = uuid.uuid4()
+T0 = datetime(2025, 10, 10, tzinfo=UTC)
+
+
+@pytest.fixture
+def readings():
+    # one reading per minute for two hours, 20.0 .. 139.0
+    write_readings(
+        [
+            Reading(time=T0 + timedelta(minutes=i), sensor_id=SENSOR, location_id=LOCATION, temperature=20.0 + i)
+            for i in range(120)
+        ]
+    )
+    refresh_rollups()
+
+
+@pytest.mark.django_db
+def test_timescale_buckets_count_from_the_unix_epoch(monkeypatch):
+    monkeypatch.setattr("main.timescale.is_timescale", lambda _connection: True)
+    sql = str(Reading.objects.annotate(bucket=EpochBucket("time", 1260)).values("bucket").query)
+    assert "origin => TIMESTAMPTZ '1970-01-01 00:00:00+00'" in sql
+
+
+def test_parse_bucket():
+    assert parse_bucket(300) == 300
+    assert parse_bucket("5m") == 300
+    assert parse_bucket("1d") == 86400
+    with pytest.raises(ValueError, match="Invalid bucket"):
+        parse_bucket("0h")
+
+
+def test_merge_buckets_from_several_shards():
+    a = [Bucket(T0, 1.0, 3.0, 4.0, 2)]
+    b = [Bucket(T0, 0.0, 2.0, 2.0, 1), Bucket(T0 + timedelta(hours=1), 5.0, 5.0, 5.0, 1)]
+    merged = merge_buckets([a, b])
+    assert [(m.min, m.max, m.count, m.avg) for m in merged] == [(0.0, 3.0, 3, 2.0), (5.0, 5.0, 1, 5.0)]
+
+
+def test_lttb_keeps_ends_and_peaks():
+    # a sine wave with a single spike, the spike must survive downsampling
+    buckets = [Bucket(T0 + timedelta(minutes=i), 0, 0, math.sin(i / 10), 1) for i in range(1000)]
+    buckets[500].sum = 50.0
+    kept = lttb(buckets, 50)
+    assert len(kept) == 50
+    assert kept[0] is buckets[0]
+    assert kept[-1] is buckets[-1]
+    assert buckets[500] in kept
+    assert lttb(buckets[:10], 50) == buckets[:10]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("readings")
+def test_query_buckets():
+    seconds, buckets = query(T0, T0 + timedelta(hours=2), sensor_id=SENSOR, bucket=3600)
+    assert seconds == 3600
+    assert [b.time for b in buckets] == [T0, T0 + timedelta(hours=1)]
+    first = buckets[0]
+    assert (first.min, first.max, first.count, first.avg) == (20.0, 79.0, 60, 49.5)
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("readings")
+def test_query_downsamples_to_points():
+    _seconds, buckets = query(T0, T0 + timedelta(hours=2), location_id=LOCATION, points=10)
+    assert len(buckets) == 10
+    assert sum(b.count for b in buckets) < 120
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("readings")
+class TestReadEndpoint:
+    def test_bucketed(self, client):
+        resp = client.get(
+            "/api/data/",
+            {"sensor_id": str(SENSOR), "start": "2025-10-10T00:00:00Z", "end": "2025-10-10T02:00:00Z", "bucket": "30m"},
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["bucket"] == 1800
+        assert [p["count"] for p in body["points"]] == [30, 30, 30, 30]
+        assert body["points"][0]["avg"] == 34.5
+
+    def test_points_and_naive_times(self, client):
+        resp = client.get(
+            "/api/data/",
+            {"location_id": str(LOCATION), "start": "2025-10-10T00:00:00", "end": "2025-10-10T02:00:00", "points": 20},
+        )
+        assert resp.status_code == 200
+        assert len(resp.json()["points"]) == 20
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {},
+            {"sensor_id": str(SENSOR), "location_id": str(LOCATION)},
+            {"sensor_id": str(SENSOR), "bucket": "1h", "points": 10},
+            {"sensor_id": str(SENSOR), "bucket": "soon"},
+            {"sensor_id": str(SENSOR), "bucket": "1s"},
+            {"sensor_id": str(SENSOR), "start": "2025-10-10T02:00:00Z", "end": "2025-10-10T00:00:00Z"},
+        ],
+    )
+    def test_invalid_requests(self, client, params):
+        assert client.get("/api/data/", params).status_code == 422
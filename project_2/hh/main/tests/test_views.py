@@ -0,0 +1,37 @@
+import pytest
+from django.urls import reverse
+
+from main.models import Location, Sensor
+
+
+def make_fleet(locations: int, sensors_per_location: int) -> None:
+    for i in range(locations):
+        loc = Location.objects.create(name=f"Location {i}")
+        Sensor.objects.bulk_create(Sensor(name=f"Sensor {j}", location=loc) for j in range(sensors_per_location))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("fleet_size", [(1, 1), (20, 25)])
+@pytest.mark.parametrize("htmx", [False, True])
+def test_sensors_page_queries_do_not_grow_with_the_fleet(client, django_assert_num_queries, fleet_size, htmx):
+    make_fleet(*fleet_size)
+    headers = {"HX-Request": "true"} if htmx else {}
+
+    with django_assert_num_queries(1):
+        resp = client.get(reverse("sensors"), headers=headers)
+
+    assert resp.status_code == 200
+    assert 'Sensor 0 — <span sse-swap="location-name-' in resp.content.decode()
+    assert ">Location 0</span>" in resp.content.decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("fleet_size", [(1, 0), (50, 0)])
+def test_locations_page_queries_do_not_grow_with_the_fleet(client, django_assert_num_queries, fleet_size):
+    make_fleet(*fleet_size)
+
+    with django_assert_num_queries(1):
+        resp = client.get(reverse("locations"))
+
+    assert resp.status_code == 200
+    assert "Location 0" in resp.content.decode()
@@ -0,0 +1,59 @@
+import math
+from datetime import UTC, datetime
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import BigIntegerField, Func
+from django.db.models.sql.compiler import SQLCompiler
+
+# Time buckets, in SQL that differs between Timescale, plain Postgres and SQLite (tests)
+
+_timescale: dict[str, bool] = {}
+
+
+def is_timescale(connection: BaseDatabaseWrapper) -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    if connection.alias not in _timescale:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+            _timescale[connection.alias] = cursor.fetchone() is not None
+    return _timescale[connection.alias]
+
+
+class EpochBucket(Func):
+    """Start of the bucket a timestamp falls in, as unix seconds."""
+
+    output_field = BigIntegerField()
+
+    def __init__(self, expression: str, seconds: int) -> None:
+        super().__init__(expression)
+        self.seconds = int(seconds)
+
+    def as_sql(self, compiler: SQLCompiler, connection: BaseDatabaseWrapper, **extra) -> tuple[str, list]:
+        # the bucket width is an int, safe to inline
+        extra["size"] = self.seconds
+        if is_timescale(connection):
+            # time_bucket counts from 2000-01-03 by default, the other backends and
+            # floor_time/ceil_time from the unix epoch, which only agree on widths dividing a day
+            template = (
+                "CAST(extract(epoch FROM time_bucket(make_interval(secs => %(size)s), %(expressions)s,"
+                " origin => TIMESTAMPTZ '1970-01-01 00:00:00+00')) AS bigint)"
+            )
+        elif connection.vendor == "postgresql":
+            template = "CAST(floor(extract(epoch FROM %(expressions)s) / %(size)s) AS bigint) * %(size)s"
+        else:
+            # SQLite: julian day to unix seconds, then integer division
+            template = (
+                "(CAST(ROUND((julianday(%(expressions)s) - 2440587.5) * 86400) AS INTEGER) / %(size)s) * %(size)s"
+            )
+        return super().as_sql(compiler, connection, template=template, **extra)
+
+
+def floor_time(moment: datetime, seconds: int) -> datetime:
+    epoch = math.floor(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, UTC)
+
+
+def ceil_time(moment: datetime, seconds: int) -> datetime:
+    epoch = math.ceil(moment.timestamp())
+    return datetime.fromtimestamp(epoch + -epoch % seconds, UTC)
@@ -0,0 +1,190 @@
+import math
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.db.models import Count, Max, Min, Sum
+
+from .models import Reading
+from .rollups import rollup_for, rollup_width
+from .sharding import fan_out, shards_for
+from .timescale import EpochBucket, ceil_time, floor_time
+
+# Reading back sensor data
+# Nobody charts millions of raw readings, so queries are answered in two steps:
+# 1. the database groups readings into fixed time buckets (min/max/sum/count per
+#    bucket) - Timescale's time_bucket, plain SQL arithmetic on the epoch elsewhere.
+#    Buckets that are a multiple of a minute, hour or day are summed up from the
+#    matching rollup (main.rollups) instead of the raw readings
+# 2. optionally LTTB (Largest Triangle Three Buckets) picks the buckets that
+#    keep the visual shape of the series when even that is too many points
+# Buckets carry sum and count rather than avg so results from several shards
+# can be merged exactly.
+
+BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+OVERSAMPLE = 4  # buckets fetched per point before LTTB picks the final points
+
+
+def parse_bucket(value: str | int) -> int:
+    """Bucket width in seconds from 300, "300s", "5m", "1h" or "1d"."""
+    match = re.fullmatch(r"(\d+)([smhd]?)", str(value).strip())
+    if match is None or int(match[1]) == 0:
+        msg = f"Invalid bucket '{value}', use seconds or a number with s/m/h/d"
+        raise ValueError(msg)
+    return int(match[1]) * BUCKET_UNITS[match[2] or "s"]
+
+
+@dataclass
+class Bucket:
+    time: datetime
+    min: float
+    max: float
+    sum: float
+    count: int
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count
+
+    def merge(self, other: "Bucket") -> None:
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sum += other.sum
+        self.count += other.count
+
+
+def aggregate_shard(  # noqa: PLR0913
+    alias: str,
+    seconds: int,
+    start: datetime,
+    end: datetime,
+    *,
+    sensor_id: uuid.UUID | None = None,
+    location_id: uuid.UUID | None = None,
+) -> list[Bucket]:
+    # the coarsest rollup that adds up to the bucket, raw readings otherwise
+    rollup = rollup_for(seconds)
+    if rollup is None:
+        rows = Reading.objects.using(alias).filter(time__gte=start, time__lt=end)
+        column = "time"
+        aggregates = {
+            "t_min": Min("temperature"),
+            "t_max": Max("temperature"),
+            "t_sum": Sum("temperature"),
+            "t_count": Count("*"),
+        }
+    else:
+        rows = rollup.objects.using(alias).filter(bucket__gte=start, bucket__lt=end)
+        column = "bucket"
+        aggregates = {
+            "t_min": Min("min_temperature"),
+            "t_max": Max("max_temperature"),
+            "t_sum": Sum("sum_temperature"),
+            "t_count": Sum("count"),
+        }
+    if sensor_id is not None:
+        rows = rows.filter(sensor_id=sensor_id)
+    if location_id is not None:
+        rows = rows.filter(location_id=location_id)
+
+    rows = rows.annotate(b=EpochBucket(column, seconds)).values("b").annotate(**aggregates).order_by("b")
+    return [Bucket(datetime.fromtimestamp(r["b"], UTC), r["t_min"], r["t_max"], r["t_sum"], r["t_count"]) for r in rows]
+
+
+def merge_buckets(results: list[list[Bucket]]) -> list[Bucket]:
+    merged: dict[datetime, Bucket] = {}
+    for buckets in results:
+        for bucket in buckets:
+            if bucket.time in merged:
+                merged[bucket.time].merge(bucket)
+            else:
+                merged[bucket.time] = bucket
+    return [merged[t] for t in sorted(merged)]
+
+
+def aggregate(
+    seconds: int,
+    start: datetime,
+    end: datetime,
+    *,
+    sensor_id: uuid.UUID | None = None,
+    location_id: uuid.UUID | None = None,
+) -> list[Bucket]:
+    """
+    Buckets of `seconds` covering [start, end), queried on every shard that can hold matching readings.
+    Only whole buckets are returned, start and end are widened to bucket boundaries.
+    """
+    start, end = floor_time(start, seconds), ceil_time(end, seconds)
+    aliases = shards_for(sensor_id=sensor_id, location_id=location_id)
+    results = fan_out(
+        lambda alias: aggregate_shard(alias, seconds, start, end, sensor_id=sensor_id, location_id=location_id),
+        aliases,
+    )
+    return merge_buckets(results)
+
+
+def bucket_for_points(start: datetime, end: datetime, points: int) -> int:
+    # oversample so LTTB has some choice left, rounded up so a rollup can answer it
+    return rollup_width(max(1, math.ceil((end - start).total_seconds() / (points * OVERSAMPLE))))
+
+
+def lttb(buckets: list[Bucket], threshold: int) -> list[Bucket]:
+    """
+    Largest Triangle Three Buckets downsampling on (time, avg).
+    Keeps the first and last point and from every bucket in between the point forming
+    the largest triangle with the previously kept point and the average of the next bucket.
+    """
+    if threshold >= len(buckets) or threshold < 3:  # noqa: PLR2004
+        return buckets
+
+    xs = [b.time.timestamp() for b in buckets]
+    ys = [b.avg for b in buckets]
+    every = (len(buckets) - 2) / (threshold - 2)
+
+    kept = [buckets[0]]
+    a = 0
+    for i in range(threshold - 2):
+        # average point of the next bucket
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(buckets))
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        # point in the current bucket with the largest triangle area
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(buckets[best])
+        a = best
+
+    kept.append(buckets[-1])
+    return kept
+
+
+def query(  # noqa: PLR0913
+    start: datetime,
+    end: datetime,
+    *,
+    sensor_id: uuid.UUID | None = None,
+    location_id: uuid.UUID | None = None,
+    bucket: int | None = None,
+    points: int | None = None,
+) -> tuple[int, list[Bucket]]:
+    """
+    Aggregated readings for a sensor or location, returns (bucket seconds, buckets).
+    With an explicit bucket every bucket is returned, otherwise the range is
+    bucketed for `points` and downsampled to that many points with LTTB.
+    """
+    if bucket is not None:
+        return bucket, aggregate(bucket, start, end, sensor_id=sensor_id, location_id=location_id)
+
+    points = points or settings.DATA_DEFAULT_POINTS
+    seconds = bucket_for_points(start, end, points)
+    buckets = aggregate(seconds, start, end, sensor_id=sensor_id, location_id=location_id)
+    return seconds, lttb(buckets, points)
@@ -6,4 +6,5 @@ urlpatterns = [
     path("", views.main, name="main"),
     path("locations", views.locations, name="locations"),
     path("sensors", views.sensors, name="sensors"),
+    path("events", views.events, name="events"),
 ]
@@ -1,7 +1,14 @@
 # Create your views here.
-from django.http import HttpResponse
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
 
+from .events import TOPICS, Event, Subscription, get_event_bus
 from .models import Location, Sensor
 
 
@@ -13,8 +20,15 @@ def main(request) -> HttpResponse:
 
 
 def locations(request) -> HttpResponse:
-    locations = Location.objects.all()
-    context = {"title": "Locations", "items": locations}
+    locations = Location.objects.only("name")
+    items = [{"id": str(loc.id), "name": loc.name} for loc in locations]
+    context = {
+        "title": "Locations",
+        "items": items,
+        "kind": "location",
+        "row_template": "rows/location.html",
+        "topics": "locations",
+    }
 
     if request.htmx:
         return render(request, "list_inner.html", context)
@@ -22,10 +36,98 @@ def locations(request) -> HttpResponse:
 
 
 def sensors(request) -> HttpResponse:
-    sensors = Sensor.objects.all()
-    items = [f"{s.name} — {s.location.name}" for s in sensors]
-    context = {"title": "Sensors", "items": items}
+    # one query with the location joined in, whatever the size of the fleet
+    sensors = Sensor.objects.select_related("location").only("name", "location__name")
+    items = [
+        {"id": str(s.id), "name": s.name, "location_id": str(s.location_id), "location": s.location.name}
+        for s in sensors
+    ]
+    context = {
+        "title": "Sensors",
+        "items": items,
+        "kind": "sensor",
+        "row_template": "rows/sensor.html",
+        "topics": "sensors,locations,readings",
+    }
 
     if request.htmx:
         return render(request, "list_inner.html", context)
     return render(request, "list.html", context)
+
+
+# Live updates of the list pages over Server-Sent Events (main.events)
+# Each event is an htmx sse-swap: the name picks the element, the data is its new
+# HTML (empty removes it), so only the changed rows are swapped in the browser.
+#   sensor-<id> / location-<id>    the row, replaced or removed
+#   sensor-created / location-created   a new row, appended to the list
+#   location-name-<id>             the location name shown in sensor rows
+#   reading-<sensor id>            the latest reading of a sensor
+
+
+def sse_messages(event: Event) -> str:
+    if event.message is None:
+        event.message = "".join(_sse(name, html, event.id) for name, html in _swaps(event))
+    return event.message
+
+
+def _sse(name: str, html: str, event_id: int) -> str:
+    data = "".join(f"data: {line}\n" for line in html.splitlines() or [""])
+    return f"id: {event_id}\nevent: {name}\n{data}\n"
+
+
+def _swaps(event: Event) -> list[tuple[str, str]]:
+    data = event.data
+    if event.topic == "readings":
+        return [(f"reading-{data['sensor_id']}", render_to_string("rows/reading.html", {"reading": data}))]
+
+    kind = event.topic.removesuffix("s")
+    if data["deleted"]:
+        return [(f"{kind}-{data['id']}", "")]
+    html = render_to_string(f"rows/{kind}.html", {"row": data})
+    swaps = [(f"{kind}-created" if data["created"] else f"{kind}-{data['id']}", html)]
+    if kind == "location" and not data["created"]:
+        swaps.append((f"location-name-{data['id']}", render_to_string("rows/location_name.html", data)))
+    return swaps
+
+
+def _coalesce(events: list[Event]) -> list[Event]:
+    # of several readings of one sensor waiting in the queue only the latest is sent
+    latest = {e.data["sensor_id"]: e for e in events if e.topic == "readings"}
+    return [e for e in events if e.topic != "readings" or latest[e.data["sensor_id"]] is e]
+
+
+def _stream(subscription: Subscription) -> Iterator[str]:
+    bus = get_event_bus()
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        while True:
+            events = subscription.get(wait=settings.EVENTS_HEARTBEAT)
+            # a comment line keeps proxies from closing an idle stream
+            yield "".join(sse_messages(e) for e in _coalesce(events)) if events else ": ping\n\n"
+    finally:
+        bus.unsubscribe(subscription)
+
+
+async def _astream(topics: list[str]) -> AsyncIterator[str]:
+    bus = get_event_bus()
+    subscription = bus.subscribe(topics, loop=asyncio.get_running_loop())
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        while True:
+            events = await subscription.aget(wait=settings.EVENTS_HEARTBEAT)
+            yield "".join(sse_messages(e) for e in _coalesce(events)) if events else ": ping\n\n"
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def events(request) -> StreamingHttpResponse:
+    """
+    Server-Sent Events of the given topics (?topics=sensors,readings), all of them by default.
+    Under ASGI the stream is a coroutine on the event loop, under WSGI it holds a worker thread.
+    """
+    topics = [t for t in request.GET.get("topics", "").split(",") if t in TOPICS] or list(TOPICS)
+    stream = _astream(topics) if isinstance(request, ASGIRequest) else _stream(get_event_bus().subscribe(topics))
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: pass events on as they come
+    return response